@@ -5,6 +5,7 @@ import os.path
 import streamlit as st
 
 # Local.
+from util.profiling import show_profile_panel, start_profile
 from util.texts import ABOUT_HOMEPAGE
 
 # Setup.
@@ -14,11 +15,13 @@ st.session_state.demo_data = {
     "taz": os.path.join(".", "demo_data", "geojson_files", "traffic_analysis_zones.geojson"),
     "od_matrix_dir": os.path.join(".", "demo_data", "od_matrix"),  # To traverse all sample files.
     "edge_csv": os.path.join(".", "demo_data", "xml_files", "edge_data_3600.csv"),
-    "edge_xml": os.path.join(".", "demo_data", "xml_files", "edge_data_3600.xml"),  # Unused.
+    "edge_xml": os.path.join(".", "demo_data", "xml_files", "edge_data_3600.xml"),
     "routes": os.path.join(".", "demo_data", "xml_files", "routes_sample.xml"),
     "trips": os.path.join(".", "demo_data", "xml_files", "trips.trips.xml"),
 }
 
+start_profile("Home")
+
 # The actual streamlit page!
 # Set a page title.
 st.set_page_config(
@@ -34,3 +37,5 @@ with st.container():
 
 # Homepage info.
 st.write(ABOUT_HOMEPAGE)
+
+show_profile_panel()
@@ -0,0 +1,434 @@
+"""
+Benchmark the loaders and page computations of the dashboard on synthetic SUMO files.
+
+The inputs (an O/D matrix, trips, routes, edge data and network/TAZ GeoJSON files) are generated
+from a fixed seed, at a size that grows linearly with `--scale`. Every benchmark runs in a fresh
+process, which records its wall time (per repeat) and its peak memory (RSS). The results are
+written as JSON lines, together with the versions of the dependencies, so that runs (e.g. before
+and after an upgrade of pandas or Streamlit) can be compared with `--compare`.
+
+Usage (from the root folder of this project):
+    python ./src/benchmark.py --scale 1 --output ./benchmarks.jsonl
+"""
+
+# Standard library.
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from importlib import metadata
+from multiprocessing import get_context
+
+# Dependencies.
+import numpy as np
+from lxml import etree
+
+# Local.
+from util.disk_cache import read_edge_csv, read_routes_header
+from util.edge_data import EdgeDataCube
+from util.ingest import read_geo_file
+from util.map_payload import GeometryPayload
+from util.od_heatmap import HeatmapGrid, render_heatmap
+from util.routes_index import RoutesIndex
+from util.sumo_conversions import ODMatrix, Trip
+from util.trip_cube import TripCube
+from util.xml_streaming import read_edge_data_dataframe, read_trips_dataframe
+from util.zones import ZoneLayer
+
+# The size of the synthetic inputs at scale 1 (everything grows linearly with the scale).
+SCALE_ZONES = 100
+SCALE_OD_PAIRS = 5_000
+SCALE_TRIPS = 50_000
+SCALE_VEHICLES = 5_000
+SCALE_EDGES = 2_000
+# The synthetic scenario covers 05:00 - 10:00, like the demo data.
+SCENARIO_BEGIN = 18_000
+SCENARIO_END = 36_000
+EDGE_DATA_INTERVAL = 3_600
+# The area of the synthetic network and zones (longitude/latitude, around Munich).
+AREA_ORIGIN = (11.4, 48.0)
+AREA_SIZE = 0.3
+# The dependencies whose versions are recorded with every result.
+RECORDED_PACKAGES = ("numpy", "pandas", "geopandas", "shapely", "lxml", "pyarrow", "streamlit")
+
+
+def _write_lines(path: str, lines: list[str]):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as wf:
+        wf.write("\n".join(lines))
+        wf.write("\n")
+
+
+def generate_scenario(out_dir: os.PathLike | str, scale: float = 1.0, seed: int = 0) -> dict:
+    """
+    Generate a synthetic scenario, laid out like `demo_data`.
+
+    Parameters
+    ----------
+    out_dir
+      The directory to write the files to.
+    scale
+      The size of the scenario, relative to `SCALE_ZONES`, `SCALE_TRIPS`, etc.
+    seed
+      The seed of the random generator, so the same scale and seed always give the same files.
+
+    Returns
+    -------
+    dict
+      The paths of the files, keyed like the demo data in `Home.py`.
+    """
+    rng = np.random.default_rng(seed)
+    zone_count = max(2, round(SCALE_ZONES * scale))
+    edge_count = max(2, round(SCALE_EDGES * scale))
+    zones = 9_162_000 + np.arange(zone_count)
+    edges = np.array([f"e{i}" for i in range(edge_count)])
+    paths = {
+        "od_matrix": os.path.join(out_dir, "od_matrix", "MR_5.0_6.0.txt"),
+        "trips": os.path.join(out_dir, "xml_files", "trips.trips.xml"),
+        "routes": os.path.join(out_dir, "xml_files", "routes.rou.xml"),
+        "edge_csv": os.path.join(out_dir, "xml_files", "edge_data.csv"),
+        "edge_xml": os.path.join(out_dir, "xml_files", "edge_data.xml"),
+        "network": os.path.join(out_dir, "geojson_files", "network.geojson"),
+        "taz": os.path.join(out_dir, "geojson_files", "traffic_analysis_zones.geojson"),
+    }
+
+    # O/D matrix: unique (origin, destination) pairs with a count each.
+    pair_count = min(max(1, round(SCALE_OD_PAIRS * scale)), zone_count**2)
+    pairs = np.sort(rng.choice(zone_count**2, size=pair_count, replace=False))
+    origins, destinations = np.divmod(pairs, zone_count)
+    counts = rng.geometric(0.05, size=pair_count)
+    header = ["$OR;D2 ", "* From-Time  To-Time ", "05.00 6.00 ", "* Factor ", "1.00"]
+    rows = [f"{o} {d} {c}" for o, d, c in zip(zones[origins], zones[destinations], counts.tolist())]
+    _write_lines(paths["od_matrix"], header + rows)
+
+    # Trips, sorted by departure time.
+    trip_count = max(1, round(SCALE_TRIPS * scale))
+    departs = np.sort(rng.uniform(SCENARIO_BEGIN, SCENARIO_END, size=trip_count))
+    trip_edges = rng.integers(edge_count, size=(trip_count, 2))
+    trip_zones = rng.integers(zone_count, size=(trip_count, 2))
+    rows = [
+        f'    <trip id="{i}" depart="{depart:.2f}" from="{edges[f]}" to="{edges[t]}" '
+        f'fromTaz="{zones[fz]}" toTaz="{zones[tz]}" departLane="best" departSpeed="max"/>'
+        for i, (depart, (f, t), (fz, tz)) in enumerate(zip(departs, trip_edges, trip_zones))
+    ]
+    _write_lines(
+        paths["trips"], ['<?xml version="1.0" encoding="UTF-8"?>', "<routes>", *rows, "</routes>"]
+    )
+
+    # Routes: vehicles with one or (when rerouted) two routes of 5-30 edges.
+    vehicle_count = max(1, round(SCALE_VEHICLES * scale))
+    departs = np.sort(rng.uniform(SCENARIO_BEGIN, SCENARIO_END, size=vehicle_count))
+    rows = ['<?xml version="1.0" encoding="UTF-8"?>', "<routes>"]
+    for i, depart in enumerate(departs):
+        from_taz, to_taz = zones[rng.integers(zone_count, size=2)]
+        rows.append(
+            f'    <vehicle id="{i}" depart="{depart:.2f}" departLane="free" '
+            f'departSpeed="{rng.uniform(20, 50):.2f}" fromTaz="{from_taz}" toTaz="{to_taz}" '
+            f'speedFactor="{rng.uniform(0.8, 1.2):.2f}" arrival="{depart + 600:.2f}">'
+        )
+        for _ in range(1 + int(rng.random() < 0.1)):
+            route = " ".join(edges[rng.integers(edge_count, size=rng.integers(5, 31))])
+            rows.append(f'        <route edges="{route}"/>')
+        rows.append("    </vehicle>")
+    rows.append("</routes>")
+    _write_lines(paths["routes"], rows)
+
+    # Edge data: every edge in every interval, as XML and as converted CSV.
+    measurements = ("sampledSeconds", "traveltime", "density", "occupancy", "speed", "entered")
+    csv_rows = [
+        ";".join(["interval_begin", "interval_end", "interval_id", "edge_id"])
+        + "".join(f";edge_{name}" for name in measurements)
+    ]
+    xml_rows = ['<?xml version="1.0" encoding="UTF-8"?>', "<meandata>"]
+    for begin in range(SCENARIO_BEGIN, SCENARIO_END, EDGE_DATA_INTERVAL):
+        end = begin + EDGE_DATA_INTERVAL
+        xml_rows.append(f'    <interval begin="{begin:.2f}" end="{end:.2f}" id="edgedata">')
+        values = np.round(rng.uniform(0, 50, size=(edge_count, len(measurements))), 2)
+        for edge, edge_values in zip(edges, values.tolist()):
+            csv_rows.append(
+                f"{begin:.2f};{end:.2f};edgedata;{edge};" + ";".join(map(str, edge_values))
+            )
+            attributes = " ".join(f'{k}="{v}"' for k, v in zip(measurements, edge_values))
+            xml_rows.append(f'        <edge id="{edge}" {attributes}/>')
+        xml_rows.append("    </interval>")
+    xml_rows.append("</meandata>")
+    _write_lines(paths["edge_csv"], csv_rows)
+    _write_lines(paths["edge_xml"], xml_rows)
+
+    # Network: random polylines of 2-8 vertices.
+    features = []
+    for edge in edges:
+        start = np.array(AREA_ORIGIN) + rng.uniform(0, AREA_SIZE, size=2)
+        steps = rng.normal(0, 0.0005, size=(rng.integers(1, 8), 2))
+        line = np.vstack([start, start + np.cumsum(steps, axis=0)])
+        features.append(
+            {
+                "type": "Feature",
+                "properties": {"id": str(edge), "type": "highway.primary"},
+                "geometry": {"type": "LineString", "coordinates": line.round(7).tolist()},
+            }
+        )
+    _write_geojson(paths["network"], features)
+
+    # Zones: a grid of squares that covers the network.
+    side = int(np.ceil(np.sqrt(zone_count)))
+    size = AREA_SIZE / side
+    features = []
+    for i, zone in enumerate(zones.tolist()):
+        x, y = AREA_ORIGIN[0] + (i % side) * size, AREA_ORIGIN[1] + (i // side) * size
+        ring = [[x, y], [x + size, y], [x + size, y + size], [x, y + size], [x, y]]
+        features.append(
+            {
+                "type": "Feature",
+                "properties": {"NO": zone, "NAME": f"Zone {zone}"},
+                "geometry": {"type": "Polygon", "coordinates": [ring]},
+            }
+        )
+    _write_geojson(paths["taz"], features)
+    return paths
+
+
+def _write_geojson(path: str, features: list[dict]):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as wf:
+        json.dump({"type": "FeatureCollection", "features": features}, wf)
+
+
+# Benchmarks. Each one has a setup (which is not timed) and a run, which returns the amount of
+#  rows (or objects) it produced. The setup gets the paths of `generate_scenario`.
+def _load_od(paths: dict) -> ODMatrix:
+    od_matrix = ODMatrix()
+    od_matrix.load_from_filepath(paths["od_matrix"])
+    return od_matrix
+
+
+def _read_od(path: str, bulk: bool) -> int:
+    od_matrix = ODMatrix()
+    od_matrix.load_from_filepath(path, bulk=bulk)
+    return od_matrix.get_row_count()
+
+
+def _read_trip_objects(path: str) -> int:
+    n = 0
+    for _, trip in etree.iterparse(path, events=("end",), tag="trip"):
+        Trip.from_xml_element(trip)
+        trip.clear(keep_tail=True)
+        n += 1
+    return n
+
+
+def _build_congestion_frames(traffic_df, network) -> int:
+    """Build the cube of the Congestion page, and select every interval (as the slider does)."""
+    cube = EdgeDataCube(traffic_df, network)
+    column = cube.columns[0]
+    frames = [cube.get_frame(network, column, interval) for interval in range(cube.interval_count)]
+    return sum(len(frame) for frame in frames)
+
+
+def _build_heatmap(od_matrix: ODMatrix) -> int:
+    return int(np.count_nonzero(HeatmapGrid(od_matrix).grid))
+
+
+def _render_heatmap(grid: HeatmapGrid) -> int:
+    fig = render_heatmap(grid, "Benchmark")
+    fig.savefig(io.BytesIO(), format="png")  # Like `st.pyplot` does.
+    return len(grid.row_zones)
+
+
+BENCHMARKS: dict[str, tuple[Callable[[dict], tuple], Callable[..., int]]] = {
+    "od_read_matrix": (lambda p: (p["od_matrix"], True), _read_od),
+    "od_read_matrix_rows": (lambda p: (p["od_matrix"], False), _read_od),
+    "trips_from_xml_element": (lambda p: (p["trips"],), _read_trip_objects),
+    "trips_dataframe": (lambda p: (p["trips"],), lambda path: len(read_trips_dataframe(path))),
+    "trips_cube": (
+        lambda p: (read_trips_dataframe(p["trips"]),),
+        lambda df: TripCube(df).trip_count,
+    ),
+    "routes_read_xml": (lambda p: (p["routes"],), lambda path: len(read_routes_header(path))),
+    "routes_index": (lambda p: (p["routes"],), lambda path: len(RoutesIndex(path))),
+    "edge_data_csv": (lambda p: (p["edge_csv"],), lambda path: len(read_edge_csv(path))),
+    "edge_data_xml": (lambda p: (p["edge_xml"],), lambda path: len(read_edge_data_dataframe(path))),
+    "network_geojson": (lambda p: (p["network"],), lambda path: len(read_geo_file(path))),
+    "network_payload": (
+        lambda p: (read_geo_file(p["network"]),),
+        lambda network: len(GeometryPayload(network).levels[0]),
+    ),
+    "taz_geojson": (
+        lambda p: (p["taz"],),
+        lambda path: len(ZoneLayer.from_file(path).geojson["features"]),
+    ),
+    "congestion_frames": (
+        lambda p: (read_edge_csv(p["edge_csv"]), read_geo_file(p["network"])),
+        _build_congestion_frames,
+    ),
+    "heatmap_grid": (lambda p: (_load_od(p),), _build_heatmap),
+    "heatmap_render": (lambda p: (HeatmapGrid(_load_od(p)),), _render_heatmap),
+}
+
+
+def _get_peak_rss() -> int:
+    """Get the peak RSS of the current process, in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # Linux reports kilobytes.
+
+
+def run_benchmark(name: str, paths: dict, repeats: int) -> dict:
+    """
+    Run a benchmark `repeats` times. Defined on module level such that a worker process can run it.
+
+    Returns
+    -------
+    dict
+      The wall time of every repeat (in seconds), the amount of rows produced, and the peak RSS
+      of the process before and after running the benchmark (in bytes).
+    """
+    setup, run = BENCHMARKS[name]
+    args = setup(paths)
+    setup_rss = _get_peak_rss()
+    seconds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        rows = run(*args)
+        seconds.append(time.perf_counter() - start)
+    return {"seconds": seconds, "rows": rows, "setup_rss": setup_rss, "peak_rss": _get_peak_rss()}
+
+
+def get_environment() -> dict:
+    """Get the versions of Python and of the dependencies that affect the results."""
+    versions = {}
+    for package in RECORDED_PACKAGES:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "versions": versions,
+    }
+
+
+def benchmark(
+    data_dir: os.PathLike | str,
+    scale: float = 1.0,
+    seed: int = 0,
+    repeats: int = 3,
+    names: list[str] | None = None,
+) -> list[dict]:
+    """
+    Generate a synthetic scenario, and run the benchmarks on it (each in a fresh process).
+
+    Parameters
+    ----------
+    data_dir
+      The directory to generate the scenario in.
+    scale
+      The size of the scenario, see `generate_scenario`.
+    seed
+      The seed of the scenario.
+    repeats
+      How often each benchmark is timed. The first repeat includes e.g. imports and warm-up.
+    names
+      The benchmarks to run (see `BENCHMARKS`), all if None.
+
+    Returns
+    -------
+    list[dict]
+      One result per benchmark, which can be serialised as JSON.
+    """
+    paths = generate_scenario(data_dir, scale, seed)
+    input_bytes = {key: os.path.getsize(path) for key, path in paths.items()}
+    common = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "scale": scale,
+        "seed": seed,
+        "repeats": repeats,
+        **get_environment(),
+    }
+    results = []
+    for name in names or BENCHMARKS:
+        # A fresh (spawned) process per benchmark, so the peak RSS is not shared between them.
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+            measured = executor.submit(run_benchmark, name, paths, repeats).result()
+        results.append(
+            {
+                "benchmark": name,
+                "rows": measured["rows"],
+                "min_seconds": min(measured["seconds"]),
+                "median_seconds": statistics.median(measured["seconds"]),
+                "seconds": measured["seconds"],
+                "setup_rss_bytes": measured["setup_rss"],
+                "peak_rss_bytes": measured["peak_rss"],
+                "input_bytes": input_bytes,
+                **common,
+            }
+        )
+    return results
+
+
+def compare(results: list[dict], baseline: list[dict]) -> list[str]:
+    """
+    Compare results with earlier results of the same benchmarks (and scale).
+
+    Returns
+    -------
+    list[str]
+      One line per benchmark in both, with the ratios of the median wall time and the peak RSS.
+    """
+    # The latest earlier result of each benchmark (the files are appended to, so later is newer).
+    previous = {(r["benchmark"], r["scale"]): r for r in baseline}
+    lines = []
+    for result in results:
+        before = previous.get((result["benchmark"], result["scale"]))
+        if before is None:
+            continue
+        time_ratio = result["median_seconds"] / before["median_seconds"]
+        rss_ratio = result["peak_rss_bytes"] / before["peak_rss_bytes"]
+        lines.append(f"{result['benchmark']}: time x{time_ratio:.2f}, peak RSS x{rss_ratio:.2f}")
+    return lines
+
+
+def read_results(path: os.PathLike | str) -> list[dict]:
+    """Read the results of an earlier run, as written with `--output`."""
+    with open(path, encoding="utf-8") as rf:
+        return [json.loads(line) for line in rf if line.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="The size of the synthetic inputs (1)."
+    )
+    parser.add_argument("--seed", type=int, default=0, help="The seed of the synthetic inputs.")
+    parser.add_argument("--repeats", type=int, default=3, help="How often to time each benchmark.")
+    parser.add_argument(
+        "--only", nargs="+", choices=list(BENCHMARKS), help="Only run these benchmarks."
+    )
+    parser.add_argument(
+        "--data-dir", help="Where to keep the synthetic inputs (a temporary directory by default)."
+    )
+    parser.add_argument("--output", help="Append the results to this JSON lines file.")
+    parser.add_argument("--compare", help="Compare the results with an earlier JSON lines file.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        bench_results = benchmark(
+            args.data_dir or temp_dir, args.scale, args.seed, args.repeats, args.only
+        )
+    for bench_result in bench_results:
+        print(json.dumps(bench_result))
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as af:
+            af.writelines(json.dumps(bench_result) + "\n" for bench_result in bench_results)
+    if args.compare:
+        comparison = compare(bench_results, read_results(args.compare))
+        print("\n".join(comparison) or f"No results with scale {args.scale} in {args.compare}")
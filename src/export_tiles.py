@@ -0,0 +1,62 @@
+"""
+Export GeoJSON files (e.g. the network and the TAZs) to vector tiles that the dashboard can show.
+
+Usage (from the root folder of this project):
+    python ./src/export_tiles.py ./demo_data/geojson_files
+"""
+
+# Standard library.
+import argparse
+import os
+import time
+
+# Local.
+from util.ingest import strip_compression_suffix
+from util.vector_tiles import DEFAULT_TILE_DIR, export_tiles
+
+
+def find_geojson_files(paths: list[str]) -> list[str]:
+    """
+    Get the GeoJSON files in a list of files and directories (which are searched recursively).
+
+    Parameters
+    ----------
+    paths
+      The files and directories to search.
+
+    Returns
+    -------
+    list[str]
+      The paths of all GeoJSON files.
+    """
+    filepaths = []
+    for path in paths:
+        if os.path.isfile(path):
+            filepaths.append(path)
+            continue
+        for dir_path, _, filenames in os.walk(path):
+            for filename in sorted(filenames):
+                if strip_compression_suffix(filename.lower()).endswith(".geojson"):
+                    filepaths.append(os.path.join(dir_path, filename))
+    return filepaths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="The GeoJSON files, or directories with them.")
+    parser.add_argument("--tile-dir", default=DEFAULT_TILE_DIR, help="Where to store the tiles.")
+    parser.add_argument("--min-zoom", type=int, default=8, help="The lowest zoom level.")
+    parser.add_argument("--max-zoom", type=int, default=14, help="The highest zoom level.")
+    parser.add_argument(
+        "--workers", type=int, default=None, help="The amount of processes (default: all CPUs)."
+    )
+    args = parser.parse_args()
+    for filepath in find_geojson_files(args.paths):
+        start = time.perf_counter()
+        tileset = export_tiles(
+            filepath, args.tile_dir, args.min_zoom, args.max_zoom, max_workers=args.workers
+        )
+        print(
+            f"{filepath}: {tileset['tile_count']} tiles (zoom {tileset['minzoom']}-"
+            f"{tileset['maxzoom']}) in {time.perf_counter() - start:.2f}s"
+        )
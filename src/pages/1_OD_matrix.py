@@ -1,27 +1,35 @@
 # Standard library.
 from os import listdir
 import os.path
-from collections import Counter
 
 # Dependencies.
-import matplotlib.pyplot as plt
-import pandas as pd
-import seaborn as sns
 import streamlit as st
-from matplotlib.colors import LogNorm
 from streamlit.runtime.uploaded_file_manager import UploadedFile  # For type checking.
 
 # Local.
+from util.caching import LRUCache, hash_file, hash_source
+from util.ingest import COMPRESSED_EXTENSIONS
+from util.od_heatmap import HeatmapGrid, render_heatmap
+from util.od_timeseries import ODTimeSeries, load_cached_od_matrix
+from util.profiling import cached_loader, profile_stage, show_profile_panel, start_profile
 from util.sumo_conversions import ODMatrix
 from util.texts import ABOUT_INPUT_PAGE, UPLOAD_INFO_OD, INFO_ICON
 
+# Maximum amount of memory (in bytes) that all cached O/D matrices may take up together.
+OD_CACHE_MAX_BYTES = 512 * 1024**2
+
+
+@st.cache_resource
+def get_od_cache() -> LRUCache:
+    """Get the O/D matrix cache, which is shared across reruns and sessions."""
+    return LRUCache(max_bytes=OD_CACHE_MAX_BYTES)
+
 
-# ISSUE: Caching data does not work, likely because it is a custom data type.
-# @st.cache_data
 def load_user_od(file: UploadedFile) -> ODMatrix:
     """
     Create an O/D Matrix object and fill it based on the file input.
-    Basically wraps the logic into a function such that it can be cached.
+    The result is cached on the content hash of the file (in memory and on disk),
+    so identical uploads are parsed once. This hash also identifies the matrix in other caches.
 
     Parameters
     ----------
@@ -33,16 +41,22 @@ def load_user_od(file: UploadedFile) -> ODMatrix:
     ODMatrix
       An ODMatrix object, which can provide several statistics related to the O/D Matrix.
     """
-    to_return = ODMatrix()
-    to_return.load_from_streamlit_file(file)
+    with profile_stage("load_user_od", "loader") as record:
+        od_cache = get_od_cache()
+        cache_key = hash_source(file)
+        to_return = od_cache.get(cache_key)
+        record.cache = "miss" if to_return is None else "hit"
+        if to_return is None:
+            to_return = load_cached_od_matrix(file, source_hash=cache_key)
+            od_cache.put(cache_key, to_return, to_return.nbytes)
+        record.rows = to_return.get_row_count()
     return to_return
 
 
-# @st.cache_data
 def load_config_od(filepath: os.PathLike | str) -> ODMatrix:
     """
     Create an O/D Matrix object and fill it based on the file input.
-    Basically wraps the logic into a function such that it can be cached.
+    The result is cached on the content hash of the file, so edits to the file are picked up.
 
     Parameters
     ----------
@@ -54,13 +68,65 @@ def load_config_od(filepath: os.PathLike | str) -> ODMatrix:
     ODMatrix
       An ODMatrix object, which can provide several statistics related to the O/D Matrix.
     """
-    to_return = ODMatrix()
-    to_return.load_from_filepath(filepath)
+    with profile_stage("load_config_od", "loader") as record:
+        od_cache = get_od_cache()
+        cache_key = hash_file(filepath)
+        to_return = od_cache.get(cache_key)
+        record.cache = "miss" if to_return is None else "hit"
+        if to_return is None:
+            to_return = load_cached_od_matrix(filepath, source_hash=cache_key)
+            od_cache.put(cache_key, to_return, to_return.nbytes)
+        record.rows = to_return.get_row_count()
     return to_return
 
 
+@cached_loader(st.cache_data)
+def load_config_od_series(od_dir: os.PathLike | str) -> ODTimeSeries:
+    """
+    Load all O/D Matrix files in a directory into one time series (parsed in parallel).
+
+    Parameters
+    ----------
+    od_dir
+      The directory with one O/D Matrix file per period.
+
+    Returns
+    -------
+    ODTimeSeries
+      An ODTimeSeries object, which can provide statistics across all periods.
+    """
+    return ODTimeSeries.from_directory(od_dir)
+
+
+@cached_loader(st.cache_data(hash_funcs={ODMatrix: ODMatrix.content_hash}, max_entries=32))
+def get_heatmap_grid(
+    od_obj: ODMatrix,
+    row_range: tuple[int, int] | None = None,
+    col_range: tuple[int, int] | None = None,
+) -> HeatmapGrid:
+    """
+    Aggregate an O/D Matrix into a heatmap grid of a bounded size.
+
+    Parameters
+    ----------
+    od_obj
+      The O/D Matrix to aggregate. It is cached on its content hash.
+    row_range
+      Optional range of origins to zoom in on (see `HeatmapGrid`).
+    col_range
+      Optional range of destinations to zoom in on (see `HeatmapGrid`).
+
+    Returns
+    -------
+    HeatmapGrid
+      The aggregated O/D Matrix.
+    """
+    return HeatmapGrid(od_obj, row_range=row_range, col_range=col_range)
+
+
 # Streamlit.
 state = st.session_state
+start_profile("OD matrix")
 
 with st.container():
     st.title("Origin-Destination matrix inspection")
@@ -87,7 +153,9 @@ else:
     with st.container():
         st.header("File upload")
         st.write("Please upload the Origin-Destination Matrix (OD-Matrix) to inspect!")
-        od_file = st.file_uploader("Upload your trips file here", type="txt")
+        od_file = st.file_uploader(
+            "Upload your trips file here", type=["txt", *COMPRESSED_EXTENSIONS]
+        )
 
     if od_file:  # Load the file class
         od_obj = load_user_od(od_file)
@@ -105,35 +173,71 @@ if od_obj:
 
     # Try to display most common and least common trips.
     with st.expander("10 most common origin-destination pairs"):
-        test_counter = Counter(od_obj.counts)
-        test_df = pd.DataFrame(
-            (
-                (from_taz, to_taz, count)
-                for (from_taz, to_taz), count in test_counter.most_common(10)
-            ),
-            columns=["Origin TAZ", "Destination TAZ", "Trip count"],
-        )
+        test_df = od_obj.get_top_pairs(10)
         st.dataframe(test_df.style.format(thousands=None, precision=0))
 
-    # Make a heatmap.
-    # Transform the data to something Seaborn-friendly.
-    # Thanks to: https://stackoverflow.com/a/33712480
-    fig: plt.Figure = plt.figure(figsize=(9, 7))
-    ser = pd.Series(
-        list(od_obj.counts.values()), index=pd.MultiIndex.from_tuples(od_obj.counts.keys())
-    )
-    df: pd.DataFrame = ser.unstack().fillna(0)
-    # Configure colour to deal with empty slots.
-    # With the help of: https://stackoverflow.com/a/58185087
-    colour = plt.get_cmap()
-    colour.set_bad("black")  # If the value is bad, the colour will be black instead of transparent.
-    # Set the heatmap itself
-    plt.title("Origin-Destination Heatmap")
-    ax = sns.heatmap(df, norm=LogNorm(), cmap=colour)
-    # Now, display it in Streamlit.
+    # Make a heatmap. Large matrices are aggregated into blocks of TAZs to keep it readable.
+    heatmap_grid = get_heatmap_grid(od_obj)
     with st.container():
         st.subheader("Origin-Destination Heatmap")
-        st.pyplot(fig)
+        if heatmap_grid.is_aggregated:
+            st.write(
+                "This matrix has too many zones to show individually, so the zones are grouped "
+                "into blocks. Select an origin and/or destination block below to zoom in on it."
+            )
+            row_labels = heatmap_grid.get_row_labels()
+            col_labels = heatmap_grid.get_col_labels()
+            col1, col2 = st.columns(2)
+            row_bin = col1.selectbox(
+                "Origin block",
+                options=[None, *range(len(row_labels))],
+                format_func=lambda i: "All" if i is None else row_labels[i],
+            )
+            col_bin = col2.selectbox(
+                "Destination block",
+                options=[None, *range(len(col_labels))],
+                format_func=lambda i: "All" if i is None else col_labels[i],
+            )
+            if row_bin is not None or col_bin is not None:
+                row_range = None if row_bin is None else heatmap_grid.get_row_range(row_bin)
+                col_range = None if col_bin is None else heatmap_grid.get_col_range(col_bin)
+                heatmap_grid = get_heatmap_grid(od_obj, row_range=row_range, col_range=col_range)
+        with profile_stage("Heatmap render"):
+            fig = render_heatmap(heatmap_grid, "Origin-Destination Heatmap")
+            st.pyplot(fig)
 
 else:
     st.info("Please select a file above to see the rest!", icon=INFO_ICON)
+
+# The full-day overview needs a directory with several O/D matrices, which the demo data has.
+if use_demo_files_1:
+    od_series = load_config_od_series(st.session_state.demo_data["od_matrix_dir"])
+    period_labels = od_series.get_period_labels()
+    period_totals = od_series.get_period_totals()
+    peak_period = od_series.get_peak_period()
+    with profile_stage("Full-day overview"), st.container():
+        st.header("Full-day overview")
+        st.write("The statistics below combine all O/D matrices in the directory.")
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Periods", od_series.period_count)
+        col2.metric("Total movements", int(period_totals.sum()))
+        col3.metric("Peak period", period_labels[peak_period])
+        st.write("Movements per period")
+        st.bar_chart(period_totals)
+
+    with st.expander("Compare two periods"):
+        period_a, period_b = st.select_slider(
+            "Periods to compare",
+            options=range(od_series.period_count),
+            value=(0, peak_period),
+            format_func=lambda p: period_labels[p],
+        )
+        st.write(
+            f"The origin-destination pairs that changed most from {period_labels[period_a]} "
+            f"to {period_labels[period_b]}:"
+        )
+        with profile_stage("Period comparison"):
+            diff_df = od_series.get_diff(period_a, period_b).head(10)
+        st.dataframe(diff_df.style.format(thousands=None, precision=0))
+
+show_profile_panel()
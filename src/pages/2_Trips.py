@@ -1,77 +1,113 @@
 # Standard library.
 import datetime as dt
-import json
+import os
 
 # Dependencies
 import matplotlib.pyplot as plt  # Needed to create density plot.
 import pandas as pd
-import geopandas as gpd
 import plotly.graph_objects as p_go
 import seaborn as sns  # Needed to create density plot.
 import streamlit as st
 from streamlit.runtime.uploaded_file_manager import UploadedFile  # For type checking.
 
 # Local.
-from util.geo_bounds import get_gdf_centroid
-from util.texts import INFO_ICON, UPLOAD_INFO, XML_SLOW_INFO, ABOUT_TRIPS_PAGE
+from util.departure_density import DepartureDensity
+from util.disk_cache import load_cached_frame
+from util.geo_bounds import get_gdf_centroid, get_zoom_level
+from util.ingest import COMPRESSED_EXTENSIONS
+from util.od_timeseries import load_cached_od_matrix
+from util.profiling import cached_loader, profile_stage, show_profile_panel, start_profile
+from util.sumo_conversions import ODMatrix
+from util.texts import (
+    ABOUT_TRIPS_PAGE,
+    ERROR_ICON,
+    INFO_ICON,
+    UPLOAD_INFO,
+    WARNING_ICON,
+    XML_SLOW_INFO,
+)
+from util.trip_cube import OD_TIME_UNIT, TripCube, load_cached_trip_cube
+from util.zones import ZoneLayer
 
 
 # Functions.
-@st.cache_data
+@cached_loader(st.cache_data)
 def get_trips_xml_from_config() -> pd.DataFrame:
     """Load the config's xml file into a DataFrame"""
     demo_paths_dict = st.session_state.demo_data
     fp = demo_paths_dict["trips"]
-    df_to_return = pd.read_xml(fp)
+    df_to_return = load_cached_frame(fp, "trips-v2")
     return df_to_return
 
 
-@st.cache_data
+@cached_loader(st.cache_data)
 def get_trips_xml_from_upload(file: UploadedFile) -> pd.DataFrame:
     """Get the Trips from a user-uploaded xml file, then put it in a DataFrame"""
-    df_to_return = pd.read_xml(file)
+    df_to_return = load_cached_frame(file, "trips-v2")
     return df_to_return
 
 
-@st.cache_data
-def get_geojson_from_file(file: UploadedFile) -> dict:
-    geo_dict = json.load(file)
-    return geo_dict
+# The densities are cached as resources, such that each remembers the curves of its bandwidths.
+@cached_loader(st.cache_resource)
+def get_density_from_config() -> DepartureDensity:
+    return DepartureDensity.from_values(get_trips_xml_from_config().depart)
 
 
-@st.cache_data
-def get_geojson_from_config() -> dict:
+@cached_loader(st.cache_resource)
+def get_density_from_upload(file: UploadedFile) -> DepartureDensity:
+    return DepartureDensity.from_values(get_trips_xml_from_upload(file).depart)
+
+
+# The cube holds all TAZ statistics of the trips; it is counted once per trips file.
+@cached_loader(st.cache_resource)
+def get_cube_from_config() -> TripCube:
     demo_paths_dict = st.session_state.demo_data
-    with open(demo_paths_dict["taz"]) as geo_f:
-        geo_dict = json.load(geo_f)
-    return geo_dict
+    return load_cached_trip_cube(demo_paths_dict["trips"])
+
+
+@cached_loader(st.cache_resource)
+def get_cube_from_upload(file: UploadedFile) -> TripCube:
+    return load_cached_trip_cube(file)
+
+
+@cached_loader(st.cache_resource)
+def get_od_from_config(filepath: os.PathLike | str) -> ODMatrix:
+    return load_cached_od_matrix(filepath)
+
 
+@cached_loader(st.cache_resource)
+def get_od_from_upload(file: UploadedFile) -> ODMatrix:
+    return load_cached_od_matrix(file)
 
-@st.cache_data
-def get_zones_from_file(file: UploadedFile) -> gpd.GeoDataFrame:
-    geo_df = gpd.read_file(file)
-    return geo_df
 
+# The zones are cached as resources (rather than copied on every rerun),
+#  such that their GeoJSON dict is only derived once.
+@cached_loader(st.cache_resource)
+def get_zones_from_file(file: UploadedFile) -> ZoneLayer:
+    return ZoneLayer.from_file(file)
 
-@st.cache_data
-def get_zones_from_config() -> gpd.GeoDataFrame:
+
+@cached_loader(st.cache_resource)
+def get_zones_from_config() -> ZoneLayer:
     demo_paths_dict = st.session_state.demo_data
-    geo_df = gpd.read_file(demo_paths_dict["taz"])
-    return geo_df
+    return ZoneLayer.from_file(demo_paths_dict["taz"])
 
 
-def get_map_obj(series: pd.Series, geo_df: gpd.GeoDataFrame, geojson: dict) -> p_go.Figure:
+@cached_loader(st.cache_data(hash_funcs={ZoneLayer: ZoneLayer.content_hash}, max_entries=16))
+def get_map_obj(from_counts: pd.Series, to_counts: pd.Series, zones: ZoneLayer) -> p_go.Figure:
     """
-    Create a map for the TAZ volume
+    Create a map for the TAZ volume, which can switch between the origin, destination and net flow.
+
+    The zones are embedded in the figure only once; the buttons on the map only swap the values.
 
     Parameters
     ----------
-    series
-        The volume data by TAZ, with as keys the TAZ IDs, and as value the volume.
-    geo_df
-        A GeoDataFrame containing the TAZs. Used to find a central point.
-    geojson
-        The original Geojson dictionary for the TAZs. Used for creating the map itself.
+    from_counts
+        The amount of trips that start in each TAZ, with as keys the TAZ IDs.
+    to_counts
+        The amount of trips that end in each TAZ, with as keys the TAZ IDs.
+    zones
+        The TAZs. Their GeoJSON dict is used for the map, their GeoDataFrame to find its centre.
 
     Returns
     -------
@@ -79,12 +115,22 @@ def get_map_obj(series: pd.Series, geo_df: gpd.GeoDataFrame, geojson: dict) -> p
         a Choropleth map compatible with the Streamlit Mapbox functionality.
 
     """
+    # All modes share the same locations (every TAZ with at least one trip).
+    taz_ids = from_counts.index.union(to_counts.index)
+    origin_z = from_counts.reindex(taz_ids, fill_value=0).to_numpy()
+    destination_z = to_counts.reindex(taz_ids, fill_value=0).to_numpy()
+    # Mode name: (values, colour scale, midpoint of the colour scale).
+    modes = {
+        "Origin": (origin_z, "sunset", None),
+        "Destination": (destination_z, "sunset", None),
+        "Net flow (destination - origin)": (destination_z - origin_z, "RdBu", 0),
+    }
     ret_fig = p_go.Figure(
         p_go.Choroplethmapbox(
-            geojson=geojson,
-            locations=series.index,  # The index of the values in the series.
-            z=series.values,  # The values in the series to plot
-            featureidkey="properties.NO",
+            geojson=zones.geojson,
+            locations=taz_ids,  # The TAZ IDs of the values.
+            z=origin_z,  # The values to plot; swapped by the buttons.
+            featureidkey=zones.featureidkey,
             colorscale="sunset",
             # zmin=0,
             # zmax=500000,
@@ -92,13 +138,28 @@ def get_map_obj(series: pd.Series, geo_df: gpd.GeoDataFrame, geojson: dict) -> p
             marker_line_width=0,
         )
     )
-    x_coor, y_coor = get_gdf_centroid(geo_df)
+    buttons = [
+        {
+            "label": name,
+            "method": "restyle",
+            "args": [{"z": [z], "colorscale": [cs], "zmid": [mid]}],
+        }
+        for name, (z, cs, mid) in modes.items()
+    ]
+    # Both are derived from the bounds of the zones (and remembered, so this is cheap).
+    width, height = 800, 1000
+    with profile_stage("get_gdf_centroid"):
+        x_coor, y_coor = get_gdf_centroid(zones.geo_df)
+        zoom = get_zoom_level(zones.geo_df, width, height)
     ret_fig.update_layout(
         mapbox_style="carto-positron",
-        mapbox_zoom=9,  # TODO: Find a way to automatically determine zoom level.
+        mapbox_zoom=zoom,
         mapbox_center={"lat": y_coor, "lon": x_coor},
-        width=800,
-        height=1000,
+        width=width,
+        height=height,
+        updatemenus=[
+            {"type": "buttons", "direction": "right", "x": 0, "y": 1.05, "buttons": buttons}
+        ],
     )
     return ret_fig
 
@@ -108,6 +169,7 @@ sns.set_style("whitegrid")
 
 # Streamlit.
 state = st.session_state
+start_profile("Trips")
 
 with st.container():
     st.title("SUMO Trip analysis")
@@ -115,8 +177,9 @@ with st.container():
 # Try to visualise xml file.
 # Columns: id, depart, departLane, departSpeed, from, fromTaz, to, toTaz
 xml_df: pd.DataFrame | None = None
-taz_gdf: gpd.GeoDataFrame | None = None
-geojson_dict: dict | None = None
+density: DepartureDensity | None = None
+cube: TripCube | None = None
+zones: ZoneLayer | None = None
 
 # Allow the user to upload their own files, if they want to.
 # Otherwise, use the default files (in the config) for demo purposes.
@@ -128,21 +191,29 @@ with st.container():
 
 if use_demo_files_2:  # Use config! Config is embedded into the session state.
     xml_df = get_trips_xml_from_config()
-    geojson_dict = get_geojson_from_config()
-    taz_gdf = get_zones_from_config()
+    density = get_density_from_config()
+    cube = get_cube_from_config()
+    zones = get_zones_from_config()
 else:  # User files needed.
     st.header("File upload")
     st.write("Please select the files you want to visualise.")
     st.info(XML_SLOW_INFO, icon=INFO_ICON)
-    xml_file: UploadedFile = st.file_uploader("Upload your trips file here", type="xml")
+    xml_file: UploadedFile = st.file_uploader(
+        "Upload your trips file here", type=["xml", *COMPRESSED_EXTENSIONS]
+    )
     geojson_file: UploadedFile = st.file_uploader(
-        "Upload your **TAZ** `.geojson` file here", type="geojson"
+        "Upload your **TAZ** `.geojson` file here", type=["geojson", *COMPRESSED_EXTENSIONS]
     )
     if xml_file:
-        xml_df = get_trips_xml_from_upload(xml_file)
+        try:
+            xml_df = get_trips_xml_from_upload(xml_file)
+            density = get_density_from_upload(xml_file)
+            cube = get_cube_from_upload(xml_file)
+        except ValueError as e:  # E.g. a file without trips.
+            st.error(f"Could not read `{xml_file.name}`: {e}", icon=ERROR_ICON)
+            xml_df = None
     if geojson_file:
-        geojson_dict = get_geojson_from_file(geojson_file)
-        taz_gdf = get_zones_from_file(geojson_file)
+        zones = get_zones_from_file(geojson_file)
 
 
 if xml_df is not None:
@@ -159,8 +230,8 @@ if xml_df is not None:
         st.subheader("Summary data")
         st.write("Timeframe")
         col1, col2, col3 = st.columns(3)
-        first_t = xml_df.depart.min()
-        last_t = xml_df.depart.max()
+        first_t = cube.first_depart
+        last_t = cube.last_depart
         # int() rounds down the value; +1 forces a round-up.
         total_seconds = int(last_t - first_t) + 1
         col1.metric("Duration", str(dt.timedelta(seconds=total_seconds)))
@@ -170,8 +241,8 @@ if xml_df is not None:
         st.write("Trip dimensions")
         col1, col2, col3 = st.columns(3)
         col1.metric("Trip count", len(xml_df))
-        col2.metric("Origin TAZs", xml_df.fromTaz.nunique())
-        col3.metric("Destination TAZs", xml_df.toTaz.nunique())
+        col2.metric("Origin TAZs", cube.get_origin_zone_count())
+        col3.metric("Destination TAZs", cube.get_destination_zone_count())
 
     # Departure density.
     with st.container():
@@ -179,38 +250,77 @@ if xml_df is not None:
         st.subheader("Departure time density plot")
         st.write("Use the slider below to adjust the bandwidth.")
         bw: float = st.slider(label="Bandwidth", min_value=0.01, max_value=5.0, value=2.5)
-        plt.title("Departure time density")
-        density_plot = sns.kdeplot(xml_df.depart, bw_adjust=bw)
-        st.pyplot(fig)
+        with profile_stage("Departure density"):
+            density_x, density_y = density.evaluate(bw_adjust=bw)
+            plt.title("Departure time density")
+            # Like `sns.kdeplot(xml_df.depart, bw_adjust=bw)`, but from a histogram of departures.
+            density_plot = sns.lineplot(x=density_x, y=density_y)
+            density_plot.set(xlabel="depart", ylabel="Density")
+            st.pyplot(fig)
+            plt.close(fig)  # Else pyplot keeps every figure of every rerun.
 
     # TAZ analysis.
     with st.container():
         st.subheader("TAZ counts")
         # do_sort: bool = st.checkbox("Sort by count", value=False)
         st.write("By origin")
-        from_counts: pd.Series = xml_df.fromTaz.value_counts()
-        st.bar_chart(from_counts)
-        st.write("By destination")
-        to_counts: pd.Series = xml_df.toTaz.value_counts()
-        st.bar_chart(to_counts)
+        with profile_stage("TAZ counts"):
+            from_counts: pd.Series = cube.get_origin_counts()
+            st.bar_chart(from_counts)
+            st.write("By destination")
+            to_counts: pd.Series = cube.get_destination_counts()
+            st.bar_chart(to_counts)
+
+    # Reconciliation with the O/D matrix of a period.
+    with st.container():
+        st.subheader("Comparison with an O/D matrix")
+        st.write(
+            "Compare the trips that depart within the period of an O/D matrix "
+            "with the movements in that matrix, per origin and destination."
+        )
+        od_matrix: ODMatrix | None = None
+        if use_demo_files_2:
+            od_dir = st.session_state.demo_data["od_matrix_dir"]
+            od_filename = st.selectbox("O/D matrix", sorted(os.listdir(od_dir)))
+            od_matrix = get_od_from_config(os.path.join(od_dir, od_filename))
+        else:
+            od_file: UploadedFile = st.file_uploader(
+                "Upload an O/D matrix here", type=["txt", *COMPRESSED_EXTENSIONS]
+            )
+            if od_file:
+                od_matrix = get_od_from_upload(od_file)
+        if od_matrix is not None:
+            with profile_stage("O/D reconciliation") as record:
+                comparison_df = cube.reconcile(od_matrix)
+                record.rows = len(comparison_df)
+            od_period = (od_matrix.start * OD_TIME_UNIT, od_matrix.end * OD_TIME_UNIT)
+            if not cube.is_aligned(*od_period):
+                covering = cube.get_covering_period(*od_period)
+                st.warning(
+                    f"The period of this O/D matrix ({od_matrix.start:g}-{od_matrix.end:g}h) "
+                    f"does not start and end on a multiple of {cube.bin_seconds / 60:g} minutes, "
+                    "so it is compared with all trips that depart from "
+                    f"{dt.timedelta(seconds=covering[0])} until {dt.timedelta(seconds=covering[1])}.",
+                    icon=WARNING_ICON,
+                )
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Period (hours)", f"{od_matrix.start:g}-{od_matrix.end:g}")
+            col2.metric("Matrix movements", round(comparison_df["Matrix count"].sum()))
+            col3.metric("Trips in period", int(comparison_df["Trip count"].sum()))
+            st.dataframe(comparison_df.style.format(thousands=None, precision=0))
 
 # Only plot maps if geojson dict is uploaded.
-if xml_df is not None and taz_gdf is not None:
-    assert geojson_dict is not None, "taz_gdf and geo_json dict should both exist!"
+if xml_df is not None and zones is not None:
     with st.container():
         st.subheader("TAZ heatmap")
         st.write(
-            "The plots below show a heatmap of the zones and the trips that "
-            "start (=Origin) or end (=Destination) there. "
+            "The plot below shows a heatmap of the zones and the trips that "
+            "start (=Origin) or end (=Destination) there, or the difference between both. "
+            "Use the buttons above the map to switch between them. "
             "Please note that the map will only render with an internet connection."
         )
-        tab1, tab2 = st.tabs(["Origin", "Destination"])
-        with tab1:
-            geo_o = get_map_obj(from_counts, taz_gdf, geojson_dict)
-            st.plotly_chart(geo_o)
-        with tab2:
-            geo_d = get_map_obj(to_counts, taz_gdf, geojson_dict)
-            st.plotly_chart(geo_d)
+        with profile_stage("TAZ map"):
+            st.plotly_chart(get_map_obj(from_counts, to_counts, zones))
 elif xml_df is not None:  # Only show the .geojson warning if an XML file is uploaded.
     st.header("Heatmaps")
     st.warning(
@@ -218,3 +328,5 @@ elif xml_df is not None:  # Only show the .geojson warning if an XML file is upl
     )
 else:
     pass
+
+show_profile_panel()
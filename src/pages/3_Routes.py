@@ -7,6 +7,12 @@ from streamlit_keplergl import keplergl_static
 from streamlit.runtime.uploaded_file_manager import UploadedFile  # For type checking.
 
 # Local.
+from util.disk_cache import load_cached_frame
+from util.ingest import COMPRESSED_EXTENSIONS, read_geo_file
+from util.map_payload import GeometryPayload, load_geometry_payload
+from util.network_index import NetworkIndex
+from util.profiling import cached_loader, profile_stage, show_profile_panel, start_profile
+from util.routes_index import RoutesIndex, load_cached_routes_index
 from util.texts import WARNING_ICON, ABOUT_ROUTES_PAGE, UPLOAD_INFO
 
 
@@ -37,43 +43,68 @@ def get_edge_list(df_in: pd.DataFrame, index: int) -> list[str]:
     return route_list
 
 
-@st.cache_data
-def get_geojson_from_config() -> gpd.GeoDataFrame:
+@cached_loader(st.cache_data)
+def get_geojson_from_config() -> NetworkIndex:
+    """Load the config's network, together with an index on its edge IDs"""
     demo_paths_dict = st.session_state.demo_data
-    ret_df = gpd.read_file(demo_paths_dict["network"])
-    return ret_df
+    ret_df = read_geo_file(demo_paths_dict["network"])
+    return NetworkIndex(ret_df)
 
 
-@st.cache_data
-def get_geojson_from_file(file: UploadedFile) -> gpd.GeoDataFrame:
-    ret_df = gpd.read_file(file)
-    return ret_df
+@cached_loader(st.cache_data)
+def get_geojson_from_file(file: UploadedFile) -> NetworkIndex:
+    """Load a user-uploaded network, together with an index on its edge IDs"""
+    ret_df = read_geo_file(file)
+    return NetworkIndex(ret_df)
+
+
+# The serialised network geometry, such that a map does not serialise it again.
+@cached_loader(st.cache_resource)
+def get_payload_from_config() -> GeometryPayload:
+    demo_paths_dict = st.session_state.demo_data
+    return load_geometry_payload(demo_paths_dict["network"], get_geojson_from_config().network)
+
 
+@cached_loader(st.cache_resource)
+def get_payload_from_file(file: UploadedFile) -> GeometryPayload:
+    return load_geometry_payload(file, get_geojson_from_file(file).network)
 
-@st.cache_data
-def get_routes_from_config(xpath: str | None) -> pd.DataFrame:
+
+@cached_loader(st.cache_data)
+def get_routes_from_config() -> pd.DataFrame:
     """
-    Get the routes from config, and convert them into a GeoDataFrame
+    Get the vehicles (without their routes) from config, and convert them into a DataFrame
     """
     demo_paths_dict = st.session_state.demo_data
-    xml_fp = demo_paths_dict["routes"]
-    # The code currently forces the 'route' inside the XML using an XPath query.
-    ret_df = pd.read_xml(xml_fp, xpath=xpath) if xpath else pd.read_xml(xml_fp)
+    ret_df = load_cached_frame(demo_paths_dict["routes"], "routes-v1")
     return ret_df
 
 
-@st.cache_data
-def get_routes_from_file(file: UploadedFile, xpath: str | None) -> pd.DataFrame:
+@cached_loader(st.cache_data)
+def get_routes_from_file(file: UploadedFile) -> pd.DataFrame:
     """
-    Get the routes from config, and convert them into a GeoDataFrame
+    Get the vehicles (without their routes) from an uploaded file, and put them in a DataFrame
     """
-    # The code currently forces the 'route' inside the XML using an XPath query.
-    ret_df = pd.read_xml(file, xpath=xpath) if xpath else pd.read_xml(file)
+    ret_df = load_cached_frame(file, "routes-v1")
     return ret_df
 
 
+@cached_loader(st.cache_data)
+def get_routes_index_from_config() -> RoutesIndex:
+    """Index the byte range of every vehicle in the config's routes file"""
+    demo_paths_dict = st.session_state.demo_data
+    return load_cached_routes_index(demo_paths_dict["routes"])
+
+
+@cached_loader(st.cache_data)
+def get_routes_index_from_file(file: UploadedFile) -> RoutesIndex:
+    """Index the byte range of every vehicle in a user-uploaded routes file"""
+    return load_cached_routes_index(file)
+
+
 # Streamlit.
 state = st.session_state
+start_profile("Routes")
 
 with st.container():
     st.title("Individual route analysis")
@@ -83,12 +114,20 @@ with st.container():
     use_demo_files_3: bool = st.checkbox("Try out the demo files", value=False)
 
 base_network_gj: gpd.GeoDataFrame | None = None
+network_index: NetworkIndex | None = None
+payload: GeometryPayload | None = None
 route_header_df: pd.DataFrame | None = None
+routes_index: RoutesIndex | None = None
+routes_source: str | UploadedFile | None = None  # The routes file that routes_index points into.
 if use_demo_files_3:
-    base_network_gj = get_geojson_from_config()
+    network_index = get_geojson_from_config()
+    base_network_gj = network_index.network
+    payload = get_payload_from_config()
     # Heavy instruction.
     # 'set_index("id")' sets the IDs in the .xml file as the DataFrame index.
-    route_header_df = get_routes_from_config(xpath=None).set_index("id")
+    route_header_df = get_routes_from_config().set_index("id")
+    routes_index = get_routes_index_from_config()
+    routes_source = st.session_state.demo_data["routes"]
     assert base_network_gj is not None
     assert route_header_df is not None
 else:
@@ -102,16 +141,22 @@ else:
             icon=WARNING_ICON,
         )
         st.write("Please select the files you want to visualise.")
-        xml_file: UploadedFile = st.file_uploader("Upload your trips file here", type="xml")
+        xml_file: UploadedFile = st.file_uploader(
+            "Upload your trips file here", type=["xml", *COMPRESSED_EXTENSIONS]
+        )
         geojson_file: UploadedFile = st.file_uploader(
-            "Upload your **network** `.geojson` file here", type="geojson"
+            "Upload your **network** `.geojson` file here", type=["geojson", *COMPRESSED_EXTENSIONS]
         )
     if xml_file:
         # Heavy instruction.
         # 'set_index("id")' sets the IDs in the .xml file as the DataFrame index.
-        route_header_df = get_routes_from_file(xml_file, xpath=None).set_index("id")
+        route_header_df = get_routes_from_file(xml_file).set_index("id")
+        routes_index = get_routes_index_from_file(xml_file)
+        routes_source = xml_file
     if geojson_file:
-        base_network_gj = get_geojson_from_file(geojson_file)
+        network_index = get_geojson_from_file(geojson_file)
+        base_network_gj = network_index.network
+        payload = get_payload_from_file(geojson_file)
 
 # Both files need to be uploaded for the remainder to work.
 if route_header_df is not None:
@@ -149,8 +194,6 @@ if route_header_df is not None:
         chosen_route_id = st.selectbox("Which route?", options=id_list)
 
     # Now that a route ID is chosen, display that route!
-    chosen_route_query = f"/routes/vehicle[@id='{chosen_route_id}']//route"
-
     with st.container():
         st.header("Route analysis")
         st.subheader("General route information")
@@ -165,8 +208,10 @@ if route_header_df is not None:
             "In those cases, you can choose which route you would like to see visualised.\n"
             "The route where everything but `edges` is equal to `None` is the original route."
         )
-        st.write(f"Performing query: `{chosen_route_query}`")
-        chosen_route_df = get_routes_from_config(xpath=chosen_route_query)
+        # Only the XML fragment of the chosen vehicle is parsed, using the byte offset index.
+        with profile_stage("Route fragment") as record:
+            chosen_route_df = routes_index.get_routes(routes_source, chosen_route_id)
+            record.rows = len(chosen_route_df)
         st.write(chosen_route_df)
 
     # Most of the time there is only one route, but sometimes there are multiple options.
@@ -199,36 +244,45 @@ if route_header_df is not None:
         vis_all = False
         route_to_vis: int = 0
 
-    if base_network_gj is not None:
-        # Create a map.
-        map_1: KeplerGl = KeplerGl(height=600)
-
-        if vis_all:
-            # Traverse the option indices in reverse order,
-            #  such that the 'initial' route is the top layer.
-            for i in reversed(range(option_count)):
-                i_edge_list = get_edge_list(chosen_route_df, route_to_vis)
-                i_route_gj = base_network_gj.query("id in @i_edge_list")
-                map_1.add_data(i_route_gj, f"Route {i}")
-
-        else:  # Get the edges of the intended route.
-            edge_list = get_edge_list(chosen_route_df, route_to_vis)
-            with st.expander("See edges of route", expanded=False):
-                st.write(edge_list)
-            route_gj = base_network_gj.query("id in @edge_list")
-            map_1.add_data(route_gj, "Selected trip")
-
+    if network_index is not None:
         # Time to visualise!
         with st.container():
             st.subheader("Route visualisation")
+            merge_edges: bool = st.checkbox("Merge the edges into a single line", value=False)
             add_full_network: bool = st.checkbox("Also show full network", value=False)
 
+        # Create a map.
+        map_1: KeplerGl = KeplerGl(height=600)
+
+        def get_route_gj(route_edges: list[str], route_name: str) -> gpd.GeoDataFrame | dict:
+            """Get the geometry of a route, using the edge ID index (in traversal order)."""
+            if merge_edges:
+                return network_index.get_route_line(route_edges, route_name)
+            # Take the already serialised geometry of the edges.
+            return payload.get_layer(positions=network_index.get_positions(route_edges))
+
+        with profile_stage("Route geometry"):
+            if vis_all:
+                # Traverse the option indices in reverse order,
+                #  such that the 'initial' route is the top layer.
+                for i in reversed(range(option_count)):
+                    i_edge_list = get_edge_list(chosen_route_df, i)
+                    map_1.add_data(get_route_gj(i_edge_list, f"Route {i}"), f"Route {i}")
+
+            else:  # Get the edges of the intended route.
+                edge_list = get_edge_list(chosen_route_df, route_to_vis)
+                with st.expander("See edges of route", expanded=False):
+                    st.write(edge_list)
+                map_1.add_data(get_route_gj(edge_list, "Selected trip"), "Selected trip")
+
         # Load and display the map.
         if add_full_network:  # Load full network last (if wanted).
-            map_1.add_data(base_network_gj, "Full network")
-        with st.container():
+            map_1.add_data(payload.get_layer(), "Full network")
+        with profile_stage("Kepler serialisation"), st.container():
             keplergl_static(map_1, center_map=True)
     else:
         st.warning("To visualise the route on a map, we need a network `.geojson` file!")
 else:  # Without the route_header_df, nothing can be processed.
     st.warning("Please upload an XML file, or use the demo files!")
+
+show_profile_panel()
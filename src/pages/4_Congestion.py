@@ -1,5 +1,5 @@
 # Dependencies.
-import geopandas as gpd
+import numpy as np
 import pandas as pd
 import streamlit as st
 from keplergl import KeplerGl
@@ -7,44 +7,81 @@ from streamlit.runtime.uploaded_file_manager import UploadedFile  # For type che
 from streamlit_keplergl import keplergl_static
 
 # Local.
-from util.texts import ABOUT_CONGESTION_PAGE, KEPLER_WORKAROUND, INFO_ICON, UPLOAD_INFO
+from util.edge_data import EdgeDataCube, load_cached_edge_cube
+from util.ingest import COMPRESSED_EXTENSIONS, strip_compression_suffix
+from util.map_payload import GeometryPayload, load_geometry_payload
+from util.profiling import cached_loader, profile_stage, show_profile_panel, start_profile
+from util.texts import (
+    ABOUT_CONGESTION_PAGE,
+    ERROR_ICON,
+    KEPLER_WORKAROUND,
+    INFO_ICON,
+    SIMPLIFIED_MAP_INFO,
+    UPLOAD_INFO,
+)
+from util.xml_streaming import read_edge_data_columns
 
 
 # Functions.
-@st.cache_data
-def get_default_geojson() -> gpd.GeoDataFrame:
+@cached_loader(st.cache_data)
+def get_default_xml_columns() -> list[str]:
     demo_paths_dict = st.session_state.demo_data
-    ret_df = gpd.read_file(demo_paths_dict["network"])
-    return ret_df
+    return read_edge_data_columns(demo_paths_dict["edge_xml"])
 
 
-@st.cache_data
-def get_default_traffic_data() -> pd.DataFrame:
+@cached_loader(st.cache_data)
+def get_xml_columns_from_file(file: UploadedFile) -> list[str]:
+    return read_edge_data_columns(file)
+
+
+# The cubes are cached as resources, such that their arrays are not copied on every rerun.
+#  The edge data and network frames are not needed after that.
+@cached_loader(st.cache_resource)
+def get_default_cube(columns: tuple[str, ...] | None = None) -> EdgeDataCube:
     demo_paths_dict = st.session_state.demo_data
-    ret_df = pd.read_csv(demo_paths_dict["edge_csv"], delimiter=";")
-    return ret_df
+    traffic_path = demo_paths_dict["edge_csv" if columns is None else "edge_xml"]
+    return load_cached_edge_cube(demo_paths_dict["network"], traffic_path, columns)
 
 
-@st.cache_data
-def get_geojson_from_file(file: UploadedFile) -> gpd.GeoDataFrame:
-    ret_df = gpd.read_file(file)
-    return ret_df
+@cached_loader(st.cache_resource)
+def get_cube_from_files(
+    geojson_file: UploadedFile, traffic_file: UploadedFile, columns: tuple[str, ...] | None = None
+) -> EdgeDataCube:
+    return load_cached_edge_cube(geojson_file, traffic_file, columns)
 
 
-@st.cache_data
-def get_traffic_from_csv(file: UploadedFile) -> pd.DataFrame:
-    ret_df = pd.read_csv(file, delimiter=";")
-    return ret_df
+# The serialised network geometry, such that a map frame does not serialise it again.
+@cached_loader(st.cache_resource)
+def get_default_payload() -> GeometryPayload:
+    demo_paths_dict = st.session_state.demo_data
+    return load_geometry_payload(demo_paths_dict["network"])
+
+
+@cached_loader(st.cache_resource)
+def get_payload_from_file(file: UploadedFile) -> GeometryPayload:
+    return load_geometry_payload(file)
+
+
+def select_xml_columns(available_columns: list[str]) -> tuple[str, ...]:
+    """Let the user pick the measurements to load from an XML file. Only these are parsed."""
+    return tuple(
+        st.multiselect(
+            "Measurements to load from the XML file (fewer is faster)",
+            options=available_columns,
+            default=available_columns,
+        )
+    )
 
 
 # Streamlit.
+start_profile("Congestion")
 with st.container():
     st.title("Road congestion analysis")
     st.write(ABOUT_CONGESTION_PAGE)
     st.divider()
 
-geo_df: gpd.GeoDataFrame | None = None
-traffic_df: pd.DataFrame | None = None
+cube: EdgeDataCube | None = None
+payload: GeometryPayload | None = None
 
 # Allow the user to upload their own file, if they want to.
 # Otherwise, use the default file (in the config) for demo purposes.
@@ -52,78 +89,101 @@ st.write(UPLOAD_INFO)
 use_demo_files_4: bool = st.checkbox("Try out the demo files", value=False)
 
 if use_demo_files_4:  # Use config! Config is embedded into the session state.
-    geo_df = get_default_geojson()
-    traffic_df = get_default_traffic_data()
+    demo_format: str = st.radio("Edge data format", options=["CSV", "XML"], horizontal=True)
+    # Columns is None for CSV files, which are always read entirely.
+    demo_columns = select_xml_columns(get_default_xml_columns()) if demo_format == "XML" else None
+    if demo_columns == ():
+        st.info("Please select at least one measurement to load.")
+    else:
+        cube = get_default_cube(demo_columns)
+        payload = get_default_payload()
 else:  # User files needed.
     st.header("File upload")
     st.write("Please select the files you want to visualise.")
     geojson_file: UploadedFile = st.file_uploader(
-        "Upload your network .geojson file here", type="geojson"
+        "Upload your network .geojson file here", type=["geojson", *COMPRESSED_EXTENSIONS]
+    )
+    traffic_file: UploadedFile = st.file_uploader(
+        "Upload the edge traffic data (`.csv` or SUMO edge data `.xml`) here",
+        type=["csv", "xml", *COMPRESSED_EXTENSIONS],
     )
-    # TODO: Eventually support both CSV and XML.
-    csv_file: UploadedFile = st.file_uploader("Upload the edge traffic data here", type="csv")
-    if geojson_file and csv_file:
-        geo_df = get_geojson_from_file(geojson_file)
-        traffic_df = get_traffic_from_csv(csv_file)
-    elif geojson_file:  # But not csv file.
+    traffic_columns: tuple[str, ...] | None = None  # None for CSV files.
+    if traffic_file and strip_compression_suffix(traffic_file.name.lower()).endswith(".xml"):
+        traffic_columns = select_xml_columns(get_xml_columns_from_file(traffic_file))
+    if geojson_file and traffic_file:
+        if traffic_columns == ():
+            st.info("Please select at least one measurement to load.")
+        else:
+            try:
+                cube = get_cube_from_files(geojson_file, traffic_file, traffic_columns)
+                payload = get_payload_from_file(geojson_file)
+            except ValueError as e:  # E.g. an edge data file without edges.
+                st.error(f"Could not read `{traffic_file.name}`: {e}", icon=ERROR_ICON)
+                cube = None
+    elif geojson_file:  # But not traffic file.
         st.info("Traffic file missing")
-    elif csv_file:  # But not geojson_file
+    elif traffic_file:  # But not geojson_file
         st.info("geojson file missing")
     else:
         st.info("Both files missing")
 
 
 # Try to create map if both files are loaded.
-if isinstance(geo_df, gpd.GeoDataFrame) and isinstance(traffic_df, pd.DataFrame):
+if cube is not None:
     # Ask the user what they would like to filter the data on.
     st.header("Data filters")
-    # [6:] filters out the first few columns (which includes timestamps and edge IDs).
-    column_filter = st.selectbox(label="Column to visualise", options=list(traffic_df.columns[6:]))
+    # Only the measurements (so no timestamps and edge IDs) can be visualised.
+    column_filter = st.selectbox(label="Column to visualise", options=cube.columns)
 
-    # Merge the data. General procedure:
+    # Select the data. General procedure:
     # 1. Allow the user to set the time (as `time_slide`):
     #   min(interval_begin) <= time_slide <= max(interval_end).
-    assert "interval_begin" in traffic_df.columns
-    assert "interval_end" in traffic_df.columns
-    time_min = int(traffic_df.interval_begin.min())
-    time_max = int(traffic_df.interval_begin.max())
+    time_min = int(cube.begins.min())
+    time_max = int(cube.begins.max())
 
     st.write("Use the slider below to adjust the time.")
     time_slide: int = st.slider(
         label="Timestamp", min_value=time_min, max_value=time_max, value=time_min
     )
-    # 2. Filter traffic_df based on `time_slide` and `column_filter`.
-    # Helped by: https://gis.stackexchange.com/a/349253
-    filtered_traffic = traffic_df.query("interval_begin <= @time_slide <= interval_end")
-    filtered_traffic = filtered_traffic.filter(items=["edge_id", column_filter])
+    # 2. Get the values of `column_filter` at `time_slide`, for every edge of the network.
+    #  The cube is already aligned to the network, so this is a slice (without any merging).
+    with profile_stage("Interval selection") as record:
+        interval = cube.get_interval(time_slide)
+        values = cube.get_values(column_filter, interval)
+        has_data = ~np.isnan(values)
+        record.rows = int(has_data.sum())
 
     # Allow the user to inspect the data (to be sure).
     with st.container():
         st.subheader("Data inspection")
         col1, col2, col3 = st.columns(3)
-        col1.metric("Traffic #", len(traffic_df))
-        col2.metric("Geojson #", len(geo_df))
-        col3.metric("Timestamp #", len(filtered_traffic))
+        col1.metric("Traffic #", cube.row_count)
+        col2.metric("Geojson #", len(cube.edge_ids))
+        col3.metric("Timestamp #", int(has_data.sum()))
         with st.expander("See the filtered column's contents"):
-            st.write(filtered_traffic)
-
-    # 3. Merge the filtered data INTO the GeoDataFrame.
-    assert "edge_id" in filtered_traffic.columns
-    __merged_df: pd.DataFrame = geo_df.merge(
-        filtered_traffic, left_on="id", right_on="edge_id", how="left"
-    )
-    merged_gdf: gpd.GeoDataFrame = gpd.GeoDataFrame(__merged_df)
-    del __merged_df  # Save some space in memory.
+            edge_ids = cube.edge_ids[has_data]
+            st.write(pd.DataFrame({"id": edge_ids, column_filter: values[has_data]}))
 
     # Load and display the map.
-    map_1: KeplerGl = KeplerGl(height=600)
-    map_1.add_data(merged_gdf, "Traffic data")
+    # 3. Only the values are new for this frame, the geometry of the network is serialised once.
+    #  For large networks, the most detailed geometry that fits the vertex budget is used.
+    with profile_stage("Kepler layer"):
+        map_level = payload.get_level()
+        map_1: KeplerGl = KeplerGl(height=600)
+        map_1.add_data(payload.get_layer({column_filter: values}, level=map_level), "Traffic data")
     with st.container():
         st.header("Map")
-        keplergl_static(map_1, center_map=True)
+        with profile_stage("Kepler serialisation"):
+            keplergl_static(map_1, center_map=True)
+        if map_level > 0:
+            st.info(
+                SIMPLIFIED_MAP_INFO.format(tolerance=payload.tolerances[map_level]), icon=INFO_ICON
+            )
         st.info(KEPLER_WORKAROUND.format(col=column_filter), icon=INFO_ICON)
 
 else:
     with st.container():
         st.header("Visualisation")
         st.info("Nothing uploaded. Please load a file to run the visualisations.", icon=INFO_ICON)
+
+show_profile_panel()
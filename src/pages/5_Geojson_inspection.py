@@ -1,36 +1,108 @@
 # Dependencies.
 import geopandas as gpd
+import plotly.graph_objects as p_go
 import streamlit as st
 from keplergl import KeplerGl
 from streamlit.runtime.uploaded_file_manager import UploadedFile  # For type checking.
 from streamlit_keplergl import keplergl_static
 
 # Local.
-from util.texts import ABOUT_INSPECTION_PAGE, INFO_ICON, UPLOAD_INFO
+from util.ingest import COMPRESSED_EXTENSIONS, read_geo_file
+from util.map_payload import GeometryPayload, load_geometry_payload
+from util.profiling import cached_loader, profile_stage, show_profile_panel, start_profile
+from util.texts import (
+    ABOUT_INSPECTION_PAGE,
+    INFO_ICON,
+    SIMPLIFIED_MAP_INFO,
+    TILES_MISSING_INFO,
+    UPLOAD_INFO,
+)
+from util.vector_tiles import find_tileset, get_mapbox_layer
 
 
 # Functions.
-@st.cache_data
+@cached_loader(st.cache_data)
 def get_default_geojson() -> gpd.GeoDataFrame:
     demo_paths_dict = st.session_state.demo_data
     # Assert that the right values is in config.
-    ret_df = gpd.read_file(demo_paths_dict["network"])
+    ret_df = read_geo_file(demo_paths_dict["network"])
     return ret_df
 
 
-@st.cache_data
+@cached_loader(st.cache_data)
 def get_geojson_from_file(file: UploadedFile) -> gpd.GeoDataFrame:
-    ret_df = gpd.read_file(file)
+    ret_df = read_geo_file(file)
     return ret_df
 
 
+def get_property_columns(geo_df: gpd.GeoDataFrame) -> list[str]:
+    """Get the names of all columns, except for the geometry."""
+    return [col for col in geo_df.columns if col != geo_df.geometry.name]
+
+
+# The serialised network (with all its properties), such that a rerun does not serialise it again.
+@cached_loader(st.cache_resource)
+def get_default_payload() -> GeometryPayload:
+    demo_paths_dict = st.session_state.demo_data
+    geo_df = get_default_geojson()
+    return load_geometry_payload(demo_paths_dict["network"], geo_df, get_property_columns(geo_df))
+
+
+@cached_loader(st.cache_resource)
+def get_payload_from_file(file: UploadedFile) -> GeometryPayload:
+    geo_df = get_geojson_from_file(file)
+    return load_geometry_payload(file, geo_df, get_property_columns(geo_df))
+
+
+# Tilesets can be exported while the dashboard runs, so look for them again after a while.
+@cached_loader(st.cache_data(ttl=60))
+def get_default_tileset() -> dict | None:
+    demo_paths_dict = st.session_state.demo_data
+    return find_tileset(demo_paths_dict["network"])
+
+
+@cached_loader(st.cache_data(ttl=60))
+def get_tileset_from_file(file: UploadedFile) -> dict | None:
+    return find_tileset(file)
+
+
+def get_tiles_map_obj(tileset: dict) -> p_go.Figure:
+    """
+    Create a map that shows a tileset, of which the browser only fetches the visible tiles.
+
+    Parameters
+    ----------
+    tileset
+      The TileJSON of the tileset, see `util.vector_tiles.find_tileset`.
+
+    Returns
+    -------
+    p_go.Figure
+        An (otherwise empty) map with the tileset as layer.
+    """
+    center_x, center_y, zoom = tileset["center"]
+    ret_fig = p_go.Figure(p_go.Scattermapbox())
+    ret_fig.update_layout(
+        mapbox_style="carto-positron",
+        mapbox_layers=[get_mapbox_layer(tileset, line={"width": 1})],
+        mapbox_zoom=zoom,
+        mapbox_center={"lat": center_y, "lon": center_x},
+        height=600,
+        margin={"l": 0, "r": 0, "t": 0, "b": 0},
+    )
+    return ret_fig
+
+
 # Streamlit.
+start_profile("GeoJSON inspection")
 with st.container():
     st.title("GeoJSON inspection using Kepler")
     st.write(ABOUT_INSPECTION_PAGE)
     st.divider()
 
 geo_df: gpd.GeoDataFrame | None = None
+payload: GeometryPayload | None = None
+tileset: dict | None = None  # Only if the file was exported with `export_tiles.py`.
 
 # Allow the user to upload their own file, if they want to.
 # Otherwise, use the default file (in the config) for demo purposes.
@@ -39,14 +111,18 @@ use_demo_files_5: bool = st.checkbox("Try out the demo files", value=False)
 
 if use_demo_files_5:  # Use config! Config is embedded into the session state.
     geo_df = get_default_geojson()
+    payload = get_default_payload()
+    tileset = get_default_tileset()
 else:  # User files needed.
     st.header("File upload")
     st.write("Please select the files you want to visualise.")
     geojson_file: UploadedFile = st.file_uploader(
-        "Upload your network .geojson file here", type="geojson"
+        "Upload your network .geojson file here", type=["geojson", *COMPRESSED_EXTENSIONS]
     )
     if geojson_file:
         geo_df = get_geojson_from_file(geojson_file)
+        payload = get_payload_from_file(geojson_file)
+        tileset = get_tileset_from_file(geojson_file)
 
 
 # Try to create map if a GeoDataFrame is loaded.
@@ -69,13 +145,37 @@ if isinstance(geo_df, gpd.GeoDataFrame):
                 + "\n".join(f"    - `{t}`" for t in sorted(set(geo_df["type"])))
             )
 
-    map_1: KeplerGl = KeplerGl(height=600)
-    map_1.add_data(geo_df, "Network")
     with st.container():
         st.header("Visualisation")
-        keplergl_static(map_1, center_map=True)
+        use_tiles: bool = False
+        if tileset is not None:
+            use_tiles = st.checkbox(
+                "Use the vector tiles of this file (the map then only loads the visible area)",
+                value=False,
+            )
+        else:
+            st.caption(TILES_MISSING_INFO)
+
+        if use_tiles:
+            with profile_stage("Tiles map"):
+                st.plotly_chart(get_tiles_map_obj(tileset))
+        else:
+            # For large networks, the most detailed geometry that fits the vertex budget is used.
+            with profile_stage("Kepler layer"):
+                map_level = payload.get_level()
+                map_1: KeplerGl = KeplerGl(height=600)
+                map_1.add_data(payload.get_layer(level=map_level), "Network")
+            with profile_stage("Kepler serialisation"):
+                keplergl_static(map_1, center_map=True)
+            if map_level > 0:
+                st.info(
+                    SIMPLIFIED_MAP_INFO.format(tolerance=payload.tolerances[map_level]),
+                    icon=INFO_ICON,
+                )
 
 else:
     with st.container():
         st.header("Visualisation")
         st.info("Nothing uploaded. Please load a file to run the visualisations.", icon=INFO_ICON)
+
+show_profile_panel()
@@ -0,0 +1,237 @@
+"""
+Precompute everything that the dashboard pages need for a scenario directory, in parallel.
+
+The scenario directory is laid out like `demo_data`: O/D matrices in an `od_matrix` directory,
+and trips, routes, edge data and network GeoJSON files anywhere (recognised by their names).
+Every parsed file and built artefact (O/D matrices, trip cubes, route indexes, edge data cubes and
+simplified network geometries) is stored in the on-disk cache, where the dashboard picks it up.
+
+Usage (from the root folder of this project):
+    python ./src/precompute.py ./demo_data
+
+The dashboard reads the cache directory from `SUMO_DASHBOARD_CACHE_DIR` (see `DEFAULT_CACHE_DIR`),
+which is also the default of `--cache-dir`. A different `--cache-dir` is only used by the dashboard
+if it is launched with `SUMO_DASHBOARD_CACHE_DIR` set to that directory.
+"""
+
+# Standard library.
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Dependencies.
+import pandas as pd
+
+# Local.
+from util.disk_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, DiskCache, guess_kind
+from util.edge_data import load_cached_edge_cube
+from util.ingest import read_geo_file, strip_compression_suffix
+from util.map_payload import load_geometry_payload
+from util.od_timeseries import load_cached_od_matrix
+from util.routes_index import load_cached_routes_index
+from util.trip_cube import load_cached_trip_cube
+from util.xml_streaming import read_edge_data_columns
+
+# A job is the kind of artefact to build, and the paths of the files that it is built from.
+Job = tuple[str, tuple[str, ...]]
+
+
+def get_page_columns(path: os.PathLike | str) -> tuple[str, ...] | None:
+    """
+    Get the columns that the dashboard parses of an input file by default, such that the cached
+    file is the one that the pages look up (the selected columns are part of the cache key).
+
+    Parameters
+    ----------
+    path
+      The path to the input file.
+
+    Returns
+    -------
+    tuple[str, ...] | None
+      All measurements of an edge data XML file (the Congestion page loads them all by default),
+      or None for files of which the columns cannot be selected.
+    """
+    if guess_kind(os.path.basename(path)) == "edge_xml-v2":
+        return tuple(read_edge_data_columns(path))
+    return None
+
+
+def parse_file(path: os.PathLike | str, cache: DiskCache) -> pd.DataFrame:
+    """
+    Load a parsed input file from the cache, or parse (and cache) it as the dashboard does.
+
+    Parameters
+    ----------
+    path
+      The path to a trips, routes or edge data file, see `guess_kind`.
+    cache
+      The cache to store the parsed file in.
+
+    Returns
+    -------
+    pd.DataFrame
+      The parsed input file.
+    """
+    kind = guess_kind(os.path.basename(path))
+    assert kind is not None, f"Unknown kind of input file: {path}"
+    return cache.load_or_parse(path, kind, get_page_columns(path))
+
+
+def check_cache_dir(cache_dir: os.PathLike | str):
+    """
+    Warn (on stderr) if the dashboard does not read its cache from a cache directory.
+
+    Parameters
+    ----------
+    cache_dir
+      The cache directory that is filled, e.g. the `--cache-dir` of a CLI.
+    """
+    if os.path.realpath(os.path.expanduser(cache_dir)) != os.path.realpath(DEFAULT_CACHE_DIR):
+        print(
+            f"Warning: the dashboard reads its cache from {DEFAULT_CACHE_DIR}, not {cache_dir}. "
+            f"Launch it with SUMO_DASHBOARD_CACHE_DIR={cache_dir} to use this cache.",
+            file=sys.stderr,
+        )
+
+
+def find_jobs(scenario_dir: os.PathLike | str) -> list[Job]:
+    """
+    Find all artefacts that can be built from the files in a scenario directory (recursively).
+
+    Parameters
+    ----------
+    scenario_dir
+      The directory with SUMO output files, laid out like `demo_data`.
+
+    Returns
+    -------
+    list[Job]
+      The jobs, with the (slowest) edge data and trips jobs first.
+    """
+    od_paths, geojson_paths, network_paths, edge_paths, other_jobs = [], [], [], [], []
+    for dir_path, _, filenames in os.walk(scenario_dir):
+        for filename in sorted(filenames):
+            path = os.path.join(dir_path, filename)
+            name = strip_compression_suffix(filename.lower())
+            kind = guess_kind(filename)
+            if os.path.basename(dir_path) == "od_matrix":
+                od_paths.append(path)
+            elif name.endswith(".geojson"):
+                geojson_paths.append(path)
+                if "network" in name:
+                    network_paths.append(path)
+            elif kind in ("edge_csv-v1", "edge_xml-v2"):
+                edge_paths.append(path)
+            elif kind == "trips-v2":
+                other_jobs.append(("trip_cube", (path,)))
+            elif kind == "routes-v1":
+                other_jobs.append(("routes_index", (path,)))
+    # Edge data is aligned to a network, so every edge data file is combined with every network.
+    edge_jobs = [
+        ("edge_data_cube", (network_path, edge_path))
+        for edge_path in edge_paths
+        for network_path in network_paths
+    ]
+    return [
+        *edge_jobs,
+        *other_jobs,
+        *(("geometry_payload", (path,)) for path in geojson_paths),
+        *(("od_matrix", (path,)) for path in od_paths),
+    ]
+
+
+def run_job(job: Job, cache_dir: os.PathLike | str, max_bytes: int) -> str:
+    """
+    Build (or load) the artefact of a job, such that it is in the cache afterwards.
+    Defined on module level such that worker processes can run it.
+
+    Returns
+    -------
+    str
+      A summary of the artefact, and how long it took.
+    """
+    start = time.perf_counter()
+    summary = _build_artefact(*job, DiskCache(cache_dir, max_bytes))
+    return f"{summary} in {time.perf_counter() - start:.2f}s"
+
+
+def _build_artefact(kind: str, paths: tuple[str, ...], cache: DiskCache) -> str:
+    """Build (or load) an artefact, see `run_job`."""
+    if kind == "edge_data_cube":
+        network_path, edge_path = paths
+        cube = load_cached_edge_cube(network_path, edge_path, get_page_columns(edge_path), cache)
+        return f"{cube.interval_count} intervals x {len(cube.columns)} measurements"
+    if kind == "trip_cube":
+        frame = parse_file(paths[0], cache)  # Also shown as is, on the Trips page.
+        cube = load_cached_trip_cube(paths[0], cache)
+        return f"{len(frame)} trips, {len(cube.zones)} TAZs, {len(cube.bin_starts)} time bins"
+    if kind == "routes_index":
+        frame = parse_file(paths[0], cache)
+        index = load_cached_routes_index(paths[0], cache)
+        return f"{len(frame)} vehicles, {len(index)} indexed"
+    if kind == "geometry_payload":
+        network = read_geo_file(paths[0])
+        # The Routes and Congestion pages only need the IDs, the GeoJSON page needs all properties.
+        properties = [col for col in network.columns if col != network.geometry.name]
+        column_sets = [properties] + ([["id"]] if "id" in properties else [])
+        for columns in column_sets:
+            payload = load_geometry_payload(paths[0], network, columns, cache)
+        return f"{len(network)} features, {len(payload.levels)} levels of detail"
+    if kind == "od_matrix":
+        od_matrix = load_cached_od_matrix(paths[0], cache)
+        return f"{od_matrix.get_row_count()} pairs"
+    raise ValueError(f"Unknown kind of artefact: {kind}")
+
+
+def precompute(
+    scenario_dir: os.PathLike | str,
+    cache_dir: os.PathLike | str = DEFAULT_CACHE_DIR,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    max_workers: int | None = None,
+):
+    """
+    Build all artefacts of a scenario directory in a process pool, and store them in the cache.
+
+    Parameters
+    ----------
+    scenario_dir
+      The directory with SUMO output files, laid out like `demo_data`.
+    cache_dir
+      The directory of the on-disk cache.
+    max_bytes
+      The maximum size of the cache, in bytes.
+    max_workers
+      The maximum amount of worker processes. Defaults to the amount of CPUs.
+    """
+    jobs = find_jobs(scenario_dir)
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(run_job, job, cache_dir, max_bytes): job for job in jobs}
+        for future in as_completed(futures):
+            kind, paths = futures[future]
+            print(f"{', '.join(paths)} ({kind}): {future.result()}")
+    cache_size = DiskCache(cache_dir, max_bytes).get_size()
+    print(f"{len(jobs)} artefacts in {time.perf_counter() - start:.2f}s")
+    print(f"Cache size: {cache_size / 1024**2:.1f}MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("scenario_dir", help="The directory with SUMO output files.")
+    parser.add_argument(
+        "--cache-dir",
+        default=DEFAULT_CACHE_DIR,
+        help="Where to store the cache (by default, where the dashboard reads it from).",
+    )
+    parser.add_argument(
+        "--max-bytes", type=int, default=DEFAULT_MAX_BYTES, help="The maximum cache size in bytes."
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="The amount of worker processes (all CPUs)."
+    )
+    args = parser.parse_args()
+    check_cache_dir(args.cache_dir)
+    precompute(args.scenario_dir, args.cache_dir, args.max_bytes, args.workers)
@@ -0,0 +1,136 @@
+# Standard library.
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Hashable
+from typing import Any, BinaryIO
+
+# Local.
+from util.ingest import open_buffer
+
+# Amount of bytes that is read at once when hashing a file.
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def hash_buffer(buffer: bytes | memoryview) -> str:
+    """
+    Get a content hash of an in-memory buffer, e.g. the contents of an uploaded file.
+
+    Parameters
+    ----------
+    buffer
+      The bytes to hash. A memoryview is hashed without copying it first.
+
+    Returns
+    -------
+    str
+      A hexadecimal BLAKE2b digest of the buffer.
+    """
+    return hashlib.blake2b(buffer, digest_size=20).hexdigest()
+
+
+def hash_file(filepath: os.PathLike | str) -> str:
+    """
+    Get a content hash of a file on disk, reading it in blocks.
+
+    Parameters
+    ----------
+    filepath
+      The path to the file to hash.
+
+    Returns
+    -------
+    str
+      A hexadecimal BLAKE2b digest of the file contents.
+    """
+    hasher = hashlib.blake2b(digest_size=20)
+    with open(filepath, "rb") as rf:
+        while block := rf.read(HASH_BLOCK_SIZE):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def hash_source(source: os.PathLike | str | BinaryIO) -> str:
+    """
+    Get a content hash of a file on disk or of an uploaded file.
+
+    Parameters
+    ----------
+    source
+      The path to a file, or an in-memory file (e.g. an UploadedFile), which is not copied.
+
+    Returns
+    -------
+    str
+      A hexadecimal BLAKE2b digest of the file contents.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return hash_file(source)
+    with open_buffer(source) as buffer:
+        return hash_buffer(buffer)
+
+
+class LRUCache:
+    """
+    A least-recently-used cache that is bounded by the total size of its values.
+
+    Streamlit runs every session in its own thread, so all operations are guarded by a lock.
+    Wrap an instance in `st.cache_resource` to share it across reruns and sessions.
+    """
+
+    def __init__(self, max_bytes: int):
+        """
+        Parameters
+        ----------
+        max_bytes
+          The maximum total size of all values. Once exceeded, the least recently used values
+          are evicted until the cache fits again.
+        """
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get the value of `key` (marking it as most recently used), or `default` if absent."""
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def put(self, key: Hashable, value: Any, size: int):
+        """
+        Store a value, and evict the least recently used values if the cache grows too large.
+
+        Parameters
+        ----------
+        key
+          The key to store the value under, usually a content hash.
+        value
+          The value to store.
+        size
+          The (approximate) size of the value in bytes.
+        """
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.total_bytes += size
+            # Never evict the value that was just added, even if it is larger than the budget.
+            while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+
+    def clear(self):
+        """Remove all values from the cache."""
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
@@ -0,0 +1,162 @@
+# Standard library.
+import math
+import os
+from collections.abc import Iterable
+from typing import BinaryIO
+
+# Dependencies.
+import numpy as np
+
+# Local.
+from util.xml_streaming import iter_trip_chunks
+
+# The width of the histogram bins that departures are counted in, in seconds.
+DENSITY_BIN_WIDTH = 1.0
+# Like seaborn's kdeplot: the amount of bandwidths that the curve extends beyond the data,
+#  and the amount of points on the curve.
+DENSITY_CUT = 3
+DENSITY_GRIDSIZE = 200
+# The kernel is truncated at this amount of bandwidths (beyond which it is negligible).
+KERNEL_TRUNCATE = 4
+
+
+class DepartureDensity:
+    """
+    A kernel density estimate (KDE) of departure times, for any bandwidth.
+
+    Departures are counted once into a fine histogram, which can be built chunk by chunk.
+    The KDE of any bandwidth is then the histogram convolved with a Gaussian kernel (using FFT),
+    so its cost depends on the time span rather than on the amount of trips.
+    Every computed curve is remembered, such that moving back to a bandwidth is free.
+    """
+
+    def __init__(self, bin_width: float = DENSITY_BIN_WIDTH):
+        """
+        Parameters
+        ----------
+        bin_width
+          The width of the histogram bins, in seconds. Departures are rounded to their bin centre.
+        """
+        self.bin_width = bin_width
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.first_bin = 0  # The bin index of counts[0], which is (first_bin * bin_width) seconds.
+        # Running statistics (merged per chunk), for the bandwidth and the range of the curve.
+        self.n = 0
+        self.mean = 0.0
+        self._m2 = 0.0  # The sum of squared differences from the mean.
+        self.min = math.inf
+        self.max = -math.inf
+        self._curves: dict[tuple[float, float, int], tuple[np.ndarray, np.ndarray]] = {}
+
+    @classmethod
+    def from_values(cls, departs: Iterable[float], bin_width: float = DENSITY_BIN_WIDTH):
+        """Create the density of a single array (or Series) of departure times."""
+        density = cls(bin_width)
+        density.add(departs)
+        return density
+
+    @classmethod
+    def from_trips_file(
+        cls, source: os.PathLike | str | BinaryIO, bin_width: float = DENSITY_BIN_WIDTH
+    ):
+        """Create the density of a trips file, which is streamed chunk by chunk."""
+        density = cls(bin_width)
+        for chunk in iter_trip_chunks(source):
+            density.add(chunk["depart"])
+        return density
+
+    def add(self, departs: Iterable[float]):
+        """
+        Add a chunk of departure times.
+
+        Parameters
+        ----------
+        departs
+          The departure times, in seconds. Missing values (NaN) are ignored.
+        """
+        values = np.asarray(departs, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        # Merge the mean and variance of the chunk with those so far (Chan et al.).
+        chunk_n, chunk_mean = len(values), float(values.mean())
+        chunk_m2 = float(((values - chunk_mean) ** 2).sum())
+        total_n = self.n + chunk_n
+        delta = chunk_mean - self.mean
+        self.mean += delta * chunk_n / total_n
+        self._m2 += chunk_m2 + delta**2 * self.n * chunk_n / total_n
+        self.n = total_n
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+        # Count the chunk, then grow the histogram if the chunk lies outside of it.
+        bins = np.floor(values / self.bin_width).astype(np.int64)
+        first_bin, last_bin = int(bins.min()), int(bins.max())
+        if len(self.counts) > 0:
+            first_bin = min(first_bin, self.first_bin)
+            last_bin = max(last_bin, self.first_bin + len(self.counts) - 1)
+        if last_bin - first_bin + 1 > len(self.counts):
+            grown = np.zeros(last_bin - first_bin + 1, dtype=np.int64)
+            offset = self.first_bin - first_bin
+            grown[offset : offset + len(self.counts)] = self.counts
+            self.counts, self.first_bin = grown, first_bin
+        self.counts += np.bincount(bins - self.first_bin, minlength=len(self.counts))
+        self._curves.clear()
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self._m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+    def get_bandwidth(self, bw_adjust: float = 1.0) -> float:
+        """
+        Get the bandwidth (the standard deviation of the kernel) in seconds.
+
+        Like seaborn (and scipy), this is Scott's rule (std * n^(-1/5)), scaled by `bw_adjust`.
+        """
+        return self.std * self.n ** (-1 / 5) * bw_adjust
+
+    def evaluate(
+        self, bw_adjust: float = 1.0, cut: float = DENSITY_CUT, gridsize: int = DENSITY_GRIDSIZE
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Get the density curve of the departure times.
+
+        Parameters
+        ----------
+        bw_adjust
+          The factor to scale the bandwidth with, as in seaborn's `kdeplot`.
+        cut
+          The amount of bandwidths that the curve extends beyond the earliest and latest departure.
+        gridsize
+          The amount of points on the curve.
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray]
+          The departure times, and the density at each of them. The density integrates to 1.
+        """
+        key = (bw_adjust, cut, gridsize)
+        if key not in self._curves:
+            self._curves[key] = self._evaluate(*key)
+        return self._curves[key]
+
+    def _evaluate(self, bw_adjust: float, cut: float, gridsize: int):
+        assert self.n > 0, "No departures to estimate the density of!"
+        # The bandwidth is at least half a bin, which is the resolution of the histogram.
+        bandwidth = max(self.get_bandwidth(bw_adjust), self.bin_width / 2)
+        half_width = math.ceil(max(cut, KERNEL_TRUNCATE) * bandwidth / self.bin_width)
+        offsets = np.arange(-half_width, half_width + 1) * self.bin_width
+        kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2) / (bandwidth * math.sqrt(2 * math.pi))
+
+        # Convolve using FFT. The histogram is padded with the kernel's half width on both sides.
+        size = len(self.counts) + 2 * half_width
+        fft_size = 1 << (size - 1).bit_length()
+        convolved = np.fft.irfft(
+            np.fft.rfft(self.counts, fft_size) * np.fft.rfft(kernel, fft_size), fft_size
+        )[:size]
+        density = np.maximum(convolved, 0) / self.n  # FFT noise can be slightly negative.
+        # The time at the centre of each bin of the convolved (padded) histogram.
+        bin_times = (np.arange(size) + self.first_bin - half_width + 0.5) * self.bin_width
+
+        grid = np.linspace(self.min - cut * bandwidth, self.max + cut * bandwidth, gridsize)
+        return grid, np.interp(grid, bin_times, density)
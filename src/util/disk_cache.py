@@ -0,0 +1,359 @@
+# Standard library.
+import os
+import pickle
+import uuid
+from collections.abc import Callable, Sequence
+from contextlib import suppress
+from functools import lru_cache
+from typing import Any, BinaryIO
+
+# Dependencies.
+import pandas as pd
+from pyarrow import feather
+
+# Local.
+from util.caching import hash_buffer, hash_source
+from util.ingest import count_opened_bytes, open_binary, strip_compression_suffix
+from util.xml_streaming import read_edge_data_dataframe, read_trips_dataframe
+
+# Where parsed files are stored. Can be overridden with an environment variable.
+DEFAULT_CACHE_DIR = os.environ.get(
+    "SUMO_DASHBOARD_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "sumo-dashboard")
+)
+# The maximum total size of the cache directory, in bytes (2GB by default).
+DEFAULT_MAX_BYTES = int(os.environ.get("SUMO_DASHBOARD_CACHE_MAX_BYTES", 2 * 1024**3))
+CACHE_EXTENSION = ".feather"
+# Built artefacts (e.g. indexes and cubes) are pickled, rather than converted into a DataFrame.
+OBJECT_EXTENSION = ".pickle"
+
+
+def read_routes_header(source: os.PathLike | str | BinaryIO) -> pd.DataFrame:
+    """Read the vehicles of a SUMO routes file (one row per vehicle, without the routes)."""
+    with open_binary(source) as rf:
+        return pd.read_xml(rf)
+
+
+def read_edge_csv(source: os.PathLike | str | BinaryIO) -> pd.DataFrame:
+    """Read a SUMO edge data file that was converted to (semicolon-separated) CSV."""
+    with open_binary(source) as rf:
+        return pd.read_csv(rf, delimiter=";")
+
+
+# The parser of each kind of input file. The kind is part of the cache key, so bump the version
+#  suffix whenever a parser changes its output.
+FRAME_READERS: dict[str, Callable[..., pd.DataFrame]] = {
+    "trips-v2": read_trips_dataframe,
+    "routes-v1": read_routes_header,
+    "edge_csv-v1": read_edge_csv,
+    "edge_xml-v2": read_edge_data_dataframe,
+}
+# The kinds of input files whose parser can read a selection of columns (as `columns=...`).
+COLUMN_READERS = {"edge_xml-v2"}
+
+
+class DiskCache:
+    """
+    A directory of parsed input files, stored as uncompressed Feather files,
+    and of the artefacts that are built from them (e.g. indexes), stored as pickles.
+
+    Every file is keyed on the kind of input and the content hash of the raw file, so a cached
+    file is reused regardless of where the raw file is stored (or whether it was uploaded).
+    Uncompressed Feather files are memory-mapped, so loading one skips parsing and decompression.
+    The conversion to pandas still copies the columns (strings always), so it is not zero-copy.
+    When the directory grows beyond `max_bytes`, the least recently used files are removed.
+    """
+
+    def __init__(
+        self, cache_dir: os.PathLike | str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES
+    ):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _get_path(self, kind: str, content_hash: str, extension: str = CACHE_EXTENSION) -> str:
+        return os.path.join(self.cache_dir, f"{kind}-{content_hash}{extension}")
+
+    def _write_atomic(self, path: str, write: Callable[[str], None]):
+        """Write a cache file, then evict old files if the cache is too large."""
+        # Write to a temporary file first, such that other sessions never read a partial file.
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            write(temp_path)
+            os.replace(temp_path, path)
+        except BaseException:
+            with suppress(FileNotFoundError):
+                os.remove(temp_path)
+            raise
+        self.evict()
+
+    def _read(self, path: str, read: Callable[[str], Any]) -> Any | None:
+        """
+        Read a cache file, and mark it as recently used.
+
+        A file that cannot be read (e.g. a pickle of an older version of a class) is a cache miss,
+        and is removed such that it is replaced by the next store.
+
+        Parameters
+        ----------
+        path
+          The path to the cache file.
+        read
+          Reads the file at a path.
+
+        Returns
+        -------
+        Any | None
+          The result of `read`, or None if the file is missing or cannot be read.
+        """
+        try:
+            result = read(path)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            with suppress(FileNotFoundError):
+                os.remove(path)
+            return None
+        # Another session may evict the file in the meantime.
+        with suppress(FileNotFoundError):
+            os.utime(path)  # Mark the file as recently used, for the eviction.
+            count_opened_bytes(os.path.getsize(path))
+        return result
+
+    def load_frame(self, kind: str, content_hash: str) -> pd.DataFrame | None:
+        """
+        Load a cached DataFrame.
+
+        Parameters
+        ----------
+        kind
+          The kind of input file, see `FRAME_READERS`.
+        content_hash
+          The content hash of the raw input file.
+
+        Returns
+        -------
+        pd.DataFrame | None
+          The cached DataFrame, or None if it is not in the cache (or cannot be read).
+        """
+        # This copies the memory-mapped columns into pandas, such that the file can be evicted.
+        return self._read(
+            self._get_path(kind, content_hash),
+            lambda path: feather.read_table(path, memory_map=True).to_pandas(),
+        )
+
+    def store_frame(self, kind: str, content_hash: str, frame: pd.DataFrame):
+        """
+        Store a DataFrame in the cache, then evict old files if the cache is too large.
+
+        Parameters
+        ----------
+        kind
+          The kind of input file, see `FRAME_READERS`.
+        content_hash
+          The content hash of the raw input file.
+        frame
+          The parsed input file.
+        """
+        self._write_atomic(
+            self._get_path(kind, content_hash),
+            lambda temp_path: feather.write_feather(
+                frame.reset_index(drop=True), temp_path, compression="uncompressed"
+            ),
+        )
+
+    def load_object(self, kind: str, content_hash: str) -> Any | None:
+        """
+        Load a cached artefact.
+
+        Parameters
+        ----------
+        kind
+          The kind of artefact, e.g. "trip_cube-v1".
+        content_hash
+          The key of the artefact, see `get_artefact_key`.
+
+        Returns
+        -------
+        Any | None
+          The cached artefact, or None if it is not in the cache (or cannot be read).
+        """
+
+        def read(path: str) -> Any:
+            with open(path, "rb") as rf:
+                return pickle.load(rf)
+
+        return self._read(self._get_path(kind, content_hash, OBJECT_EXTENSION), read)
+
+    def store_object(self, kind: str, content_hash: str, artefact: Any):
+        """
+        Store an artefact in the cache, then evict old files if the cache is too large.
+
+        Parameters
+        ----------
+        kind
+          The kind of artefact, e.g. "trip_cube-v1".
+        content_hash
+          The key of the artefact, see `get_artefact_key`.
+        artefact
+          The artefact, which must be picklable.
+        """
+
+        def write(temp_path: str):
+            with open(temp_path, "wb") as wf:
+                pickle.dump(artefact, wf, protocol=pickle.HIGHEST_PROTOCOL)
+
+        self._write_atomic(self._get_path(kind, content_hash, OBJECT_EXTENSION), write)
+
+    def load_or_build(self, kind: str, content_hash: str, build: Callable[[], Any]) -> Any:
+        """
+        Load an artefact from the cache, or build (and cache) it if it is not cached.
+
+        Parameters
+        ----------
+        kind
+          The kind of artefact. Bump its version suffix whenever the artefact class changes.
+        content_hash
+          The key of the artefact, see `get_artefact_key`.
+        build
+          Builds the artefact, if it is not cached.
+
+        Returns
+        -------
+        Any
+          The artefact.
+        """
+        artefact = self.load_object(kind, content_hash)
+        if artefact is None:
+            artefact = build()
+            self.store_object(kind, content_hash, artefact)
+        return artefact
+
+    def get_size(self) -> int:
+        """Get the total size of all cached files, in bytes."""
+        return sum(size for _, _, size in self._list_files())
+
+    def _list_files(self) -> list[tuple[str, float, int]]:
+        """List the path, last use time and size of each cached file, least recently used first."""
+        files = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith((CACHE_EXTENSION, OBJECT_EXTENSION)):
+                with suppress(FileNotFoundError):  # Removed by another session.
+                    stat = entry.stat()
+                    files.append((entry.path, stat.st_mtime, stat.st_size))
+        return sorted(files, key=lambda f: f[1])
+
+    def evict(self):
+        """Remove the least recently used files until the cache fits within `max_bytes`."""
+        files = self._list_files()
+        total_size = sum(size for _, _, size in files)
+        # Always keep the most recently used file, even if it exceeds the budget by itself.
+        for path, _, size in files[:-1]:
+            if total_size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # Already removed by another session.
+            total_size -= size
+
+    def load_or_parse(
+        self,
+        source: os.PathLike | str | BinaryIO,
+        kind: str,
+        columns: Sequence[str] | None = None,
+    ) -> pd.DataFrame:
+        """
+        Load a parsed input file from the cache, or parse (and cache) it if it is not cached.
+
+        Parameters
+        ----------
+        source
+          The path to the input file, or an uploaded file.
+        kind
+          The kind of input file, see `FRAME_READERS`.
+        columns
+          Only parse these columns, if the kind supports it (see `COLUMN_READERS`).
+          Every selection of columns is cached separately.
+
+        Returns
+        -------
+        pd.DataFrame
+          The parsed input file.
+        """
+        content_hash = hash_source(source)
+        reader_kwargs = {}
+        if columns is not None:
+            assert kind in COLUMN_READERS, f"Cannot select the columns of {kind} files!"
+            reader_kwargs["columns"] = list(columns)
+            content_hash += "-" + hash_buffer("\n".join(columns).encode("utf-8"))[:8]
+        frame = self.load_frame(kind, content_hash)
+        if frame is None:
+            frame = FRAME_READERS[kind](source, **reader_kwargs)
+            self.store_frame(kind, content_hash, frame)
+        return frame
+
+
+def get_artefact_key(*sources: os.PathLike | str | BinaryIO, **params) -> str:
+    """
+    Get the cache key of an artefact that is built from one or more input files.
+
+    Parameters
+    ----------
+    sources
+      The paths to the input files, or uploaded files.
+    params
+      The parameters that the artefact is built with, e.g. the selected columns.
+
+    Returns
+    -------
+    str
+      The content hashes of the input files, followed by a short hash of the parameters (if any).
+    """
+    key = "-".join(hash_source(source) for source in sources)
+    if params:
+        key += "-" + hash_buffer(repr(sorted(params.items())).encode("utf-8"))[:8]
+    return key
+
+
+def guess_kind(filename: str) -> str | None:
+    """
+    Guess the kind of a SUMO output file by its name, following the `demo_data` naming.
+
+    Parameters
+    ----------
+    filename
+      The name of the file, e.g. "trips.trips.xml" or "edge_data_3600.csv.gz".
+
+    Returns
+    -------
+    str | None
+      The kind of the file (a key of `FRAME_READERS`), or None if it is not a known kind.
+    """
+    name = strip_compression_suffix(filename.lower())
+    if name.endswith(".xml") and "trip" in name:
+        return "trips-v2"
+    if name.endswith(".xml") and "rou" in name:
+        return "routes-v1"
+    if name.endswith(".xml") and ("edge" in name or "meandata" in name):
+        return "edge_xml-v2"
+    if name.endswith(".csv"):
+        return "edge_csv-v1"
+    return None
+
+
+@lru_cache(maxsize=None)
+def get_default_cache() -> DiskCache:
+    """Get the DiskCache in the default cache directory, which is shared by all pages."""
+    return DiskCache()
+
+
+def load_cached_frame(
+    source: os.PathLike | str | BinaryIO, kind: str, columns: Sequence[str] | None = None
+) -> pd.DataFrame:
+    """Load (or parse and cache) an input file using the default DiskCache, see `load_or_parse`."""
+    return get_default_cache().load_or_parse(source, kind, columns)
+
+
+def load_cached_object(kind: str, content_hash: str, build: Callable[[], Any]) -> Any:
+    """Load (or build and cache) an artefact using the default DiskCache, see `load_or_build`."""
+    return get_default_cache().load_or_build(kind, content_hash, build)
@@ -0,0 +1,188 @@
+# Standard library.
+import os
+from collections.abc import Sequence
+from typing import BinaryIO
+
+# Dependencies.
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+# Local.
+from util.disk_cache import DiskCache, get_artefact_key, get_default_cache
+from util.ingest import read_geo_file
+
+# The columns of SUMO edge data that identify a measurement (rather than being one).
+EDGE_DATA_KEY_COLUMNS = ("interval_begin", "interval_end", "interval_id", "edge_id")
+# The kind of the EdgeDataCube artefacts in the DiskCache.
+EDGE_DATA_CUBE_KIND = "edge_data_cube-v3"
+
+
+class EdgeDataCube:
+    """
+    SUMO edge data, pivoted into one (interval x edge) array per measurement column.
+
+    The edge axis is aligned to the row order of the network, so the values of one interval can be
+    attached to the network as-is: selecting a time is an array slice rather than a query + merge.
+    The cube only keeps the edge IDs of the network (not its geometry), so a cached cube does not
+    hold another copy of the network.
+    Edges without data in an interval (or without data at all) are NaN.
+    """
+
+    def __init__(self, traffic_df: pd.DataFrame, network: gpd.GeoDataFrame, id_column: str = "id"):
+        """
+        Parameters
+        ----------
+        traffic_df
+          The edge data, with one row per (interval, edge) pair. See `EDGE_DATA_KEY_COLUMNS`.
+        network
+          The network, with one row per edge.
+        id_column
+          The column of `network` with the edge IDs.
+        """
+        assert "interval_begin" in traffic_df.columns
+        assert "interval_end" in traffic_df.columns
+        assert "edge_id" in traffic_df.columns
+        # The edge ID of every network row, in the order of the network.
+        self.edge_ids: np.ndarray = network[id_column].to_numpy()
+        # The amount of rows of the edge data, so the data itself does not have to be kept.
+        self.row_count = len(traffic_df)
+
+        # The intervals, sorted by their start time.
+        intervals = pd.MultiIndex.from_arrays(
+            [traffic_df.interval_begin.to_numpy(), traffic_df.interval_end.to_numpy()]
+        )
+        interval_codes, unique_intervals = intervals.factorize(sort=True)
+        self.begins = unique_intervals.get_level_values(0).to_numpy(dtype=np.float64)
+        self.ends = unique_intervals.get_level_values(1).to_numpy(dtype=np.float64)
+
+        # The edges with data, and the network rows they belong to (which is done only once).
+        edge_codes, edge_ids = pd.factorize(traffic_df.edge_id.astype(str))
+        network_edges = pd.Index(edge_ids).get_indexer(network[id_column].astype(str))
+        # Network rows without data point to an extra (all-NaN) edge at the end.
+        network_edges[network_edges < 0] = len(edge_ids)
+
+        # Pivot every measurement column.
+        self.columns: list[str] = [
+            col
+            for col in traffic_df.columns
+            if col not in EDGE_DATA_KEY_COLUMNS and pd.api.types.is_numeric_dtype(traffic_df[col])
+        ]
+        self.arrays: dict[str, np.ndarray] = {}
+        for col in self.columns:
+            pivot = np.full((len(self.begins), len(edge_ids) + 1), np.nan)
+            pivot[interval_codes, edge_codes] = traffic_df[col].to_numpy(dtype=np.float64)
+            self.arrays[col] = pivot[:, network_edges]
+
+    @property
+    def interval_count(self) -> int:
+        return len(self.begins)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in self.arrays.values())
+
+    def get_interval(self, timestamp: float) -> int | None:
+        """
+        Get the interval that contains a timestamp.
+
+        Parameters
+        ----------
+        timestamp
+          The time, in seconds.
+
+        Returns
+        -------
+        int | None
+          The index of the latest interval with `begin <= timestamp <= end`,
+          or None if no interval contains the timestamp.
+        """
+        interval = int(np.searchsorted(self.begins, timestamp, side="right")) - 1
+        if interval < 0 or timestamp > self.ends[interval]:
+            return None
+        return interval
+
+    def get_values(self, column: str, interval: int | None) -> np.ndarray:
+        """
+        Get the value of a measurement for every row of the network, in a single interval.
+
+        Parameters
+        ----------
+        column
+          The measurement column, e.g. "edge_speed".
+        interval
+          The index of the interval, see `get_interval`. If None, all values are NaN.
+
+        Returns
+        -------
+        np.ndarray
+          One value per network row (a view on the cube, so it should not be modified).
+        """
+        if interval is None:
+            return np.full(len(self.edge_ids), np.nan)
+        return self.arrays[column][interval]
+
+    def get_frame(
+        self, network: gpd.GeoDataFrame, column: str, interval: int | None
+    ) -> gpd.GeoDataFrame:
+        """
+        Get the network with the values of a measurement in a single interval.
+
+        Parameters
+        ----------
+        network
+          The network that the cube was built with.
+        column
+          The measurement column, e.g. "edge_speed".
+        interval
+          The index of the interval, see `get_interval`.
+
+        Returns
+        -------
+        gpd.GeoDataFrame
+          The network, with an extra column named `column`. The geometry is not copied.
+        """
+        assert len(network) == len(self.edge_ids), "The cube was built with another network!"
+        frame = network.copy(deep=False)  # Shares the columns (and geometry) of the network.
+        frame[column] = self.get_values(column, interval)
+        return frame
+
+
+def load_cached_edge_cube(
+    network_source: os.PathLike | str | BinaryIO,
+    traffic_source: os.PathLike | str | BinaryIO,
+    columns: Sequence[str] | None = None,
+    cache: DiskCache | None = None,
+) -> EdgeDataCube:
+    """
+    Load the EdgeDataCube of a network and an edge data file from the DiskCache,
+    or build (and cache) it if it is not cached.
+
+    Parameters
+    ----------
+    network_source
+      The path to the network GeoJSON file, or an uploaded network file.
+    traffic_source
+      The path to the edge data file, or an uploaded edge data file.
+    columns
+      None for a (converted) CSV file. Otherwise, the measurement columns to read from an XML file.
+    cache
+      The DiskCache to use, the default cache if None.
+
+    Returns
+    -------
+    EdgeDataCube
+      The edge data, aligned to the network.
+    """
+    cache = get_default_cache() if cache is None else cache
+    columns = None if columns is None else tuple(columns)
+
+    def build() -> EdgeDataCube:
+        if columns is None:
+            traffic_df = cache.load_or_parse(traffic_source, "edge_csv-v1")
+        else:
+            traffic_df = cache.load_or_parse(traffic_source, "edge_xml-v2", columns)
+        return EdgeDataCube(traffic_df, read_geo_file(network_source))
+
+    key = get_artefact_key(network_source, traffic_source, columns=columns)
+    return cache.load_or_build(EDGE_DATA_CUBE_KIND, key, build)
@@ -1,11 +1,106 @@
+# Standard library.
+import math
+from typing import NamedTuple
+
+# Dependencies.
+import numpy as np
+import shapely
 from geopandas import GeoDataFrame  # For type checking
 from numpy import float64
+from pyproj import CRS, Transformer
 
+# Local.
+from util.caching import LRUCache, hash_buffer
 
 # Used for more explicit typing (rather than having to guess what each float64 means).
 X = float64
 Y = float64
 
+# Half the width of the (square) Web Mercator world, in metres.
+MERCATOR_HALF_WIDTH = 20037508.342789244
+# The width of the world at zoom level 0 of a Mapbox (GL) map, in pixels.
+MAPBOX_WORLD_PIXELS = 512
+MAX_ZOOM = 20
+# The amount of GeoDataFrames whose bounds are remembered.
+GEO_BOUNDS_CACHE_ENTRIES = 256
+
+
+class GeoBounds(NamedTuple):
+    """The extent and centre of a GeoDataFrame, in longitude/latitude (WGS84)."""
+
+    west: X
+    south: Y
+    east: X
+    north: Y
+    centroid_x: X
+    centroid_y: Y
+
+
+# Every entry counts as 1 "byte", so the cache holds GEO_BOUNDS_CACHE_ENTRIES entries.
+_GEO_BOUNDS_CACHE = LRUCache(GEO_BOUNDS_CACHE_ENTRIES)
+
+
+def _compute_geo_bounds(feature_bounds: np.ndarray, crs: CRS) -> GeoBounds:
+    """Compute the GeoBounds from the (xmin, ymin, xmax, ymax) of every feature."""
+    to_lon_lat = Transformer.from_crs(crs, 4326, always_xy=True)
+    if crs.is_geographic:  # Use metres for the centroid, rather than degrees.
+        west, south, east, north = to_lon_lat.transform_bounds(
+            *feature_bounds[:, :2].min(axis=0), *feature_bounds[:, 2:].max(axis=0)
+        )
+        utm_zone = int((((west + east) / 2 + 180) // 6) % 60) + 1
+        projected_crs = CRS.from_epsg((32600 if (south + north) >= 0 else 32700) + utm_zone)
+        to_projected = Transformer.from_crs(crs, projected_crs, always_xy=True)
+        x_min, y_min = to_projected.transform(feature_bounds[:, 0], feature_bounds[:, 1])
+        x_max, y_max = to_projected.transform(feature_bounds[:, 2], feature_bounds[:, 3])
+        to_lon_lat = Transformer.from_crs(projected_crs, 4326, always_xy=True)
+    else:
+        x_min, y_min, x_max, y_max = feature_bounds.T
+        west, south, east, north = to_lon_lat.transform_bounds(
+            x_min.min(), y_min.min(), x_max.max(), y_max.max()
+        )
+
+    # The centroid of the bounding boxes, weighted by their area. Unlike a (dissolved) centroid,
+    #  this does not need to look at every vertex. Points and lines have no area, so in that case
+    #  every feature weighs the same.
+    areas = (x_max - x_min) * (y_max - y_min)
+    weights = areas if areas.sum() > 0 else np.ones_like(areas)
+    centroid_x, centroid_y = to_lon_lat.transform(
+        np.average((x_min + x_max) / 2, weights=weights),
+        np.average((y_min + y_max) / 2, weights=weights),
+    )
+    return GeoBounds(
+        *(float64(value) for value in (west, south, east, north, centroid_x, centroid_y))
+    )
+
+
+def get_geo_bounds(geo_df: GeoDataFrame) -> GeoBounds:
+    """
+    Get the extent and a representative centroid of a GeoDataFrame.
+
+    Both are computed from the bounding box of each feature, in a projected CRS.
+    The result is remembered per GeoDataFrame content (that is, its CRS and feature bounds).
+
+    Parameters
+    ----------
+    geo_df
+      The GeoDataFrame. Without a CRS, it is assumed to be WGS84 (as in GeoJSON).
+
+    Returns
+    -------
+    GeoBounds
+      The bounds and centroid, in longitude/latitude.
+    """
+    crs = CRS.from_user_input(geo_df.crs or 4326)
+    feature_bounds = shapely.bounds(geo_df.geometry.to_numpy())
+    feature_bounds = feature_bounds[~np.isnan(feature_bounds).any(axis=1)]  # Empty geometries.
+    assert len(feature_bounds) > 0, "The GeoDataFrame has no (non-empty) geometries!"
+    key = (crs.to_wkt(), hash_buffer(np.ascontiguousarray(feature_bounds).data))
+    geo_bounds = _GEO_BOUNDS_CACHE.get(key)
+    if geo_bounds is None:
+        geo_bounds = _compute_geo_bounds(feature_bounds, crs)
+        _GEO_BOUNDS_CACHE.put(key, geo_bounds, 1)
+    return geo_bounds
+
 
 def get_gdf_centroid(geo_df: GeoDataFrame) -> tuple[X, Y]:
     """
@@ -19,15 +114,41 @@ def get_gdf_centroid(geo_df: GeoDataFrame) -> tuple[X, Y]:
     Returns
     -------
     tuple[X,Y]
-      A tuple of float64 depicting the x- and y-coordinate of the centroid.
+      A tuple of float64 depicting the x- and y-coordinate (longitude, latitude) of the centroid.
+    """
+    geo_bounds = get_geo_bounds(geo_df)
+    return geo_bounds.centroid_x, geo_bounds.centroid_y
+
+
+def get_zoom_level(geo_df: GeoDataFrame, width: int, height: int, padding: float = 0.1) -> float:
+    """
+    Get the zoom level at which a GeoDataFrame fits a (Mapbox) map.
+
+    Parameters
+    ----------
+    geo_df
+      The GeoDataFrame to show.
+    width
+      The width of the map, in pixels.
+    height
+      The height of the map, in pixels.
+    padding
+      The fraction of the map that is kept free around the data.
+
+    Returns
+    -------
+    float
+      The zoom level, e.g. for `mapbox_zoom` in plotly.
     """
-    # From: https://stackoverflow.com/a/70088741
-    # FIXME UserWarning: Geometry is in a geographic CRS.
-    #  Results from 'centroid' are likely incorrect.
-    #  Use 'GeoSeries.to_crs()' to re-project geometries to a projected CRS before this operation.
-    centroid = geo_df.dissolve().centroid
-    # Extract the x- and y-coordinate from the centroid. `.x` and `.y` are essentially 1x1 matrices.
-    # .iloc[0] added to avoid FutureWarning.
-    x: float64 = centroid.x.iloc[0]
-    y: float64 = centroid.y.iloc[0]
-    return x, y
+    geo_bounds = get_geo_bounds(geo_df)
+    to_mercator = Transformer.from_crs(4326, 3857, always_xy=True)
+    x_min, y_min = to_mercator.transform(geo_bounds.west, max(geo_bounds.south, -85))
+    x_max, y_max = to_mercator.transform(geo_bounds.east, min(geo_bounds.north, 85))
+    # At zoom level z, the world is MAPBOX_WORLD_PIXELS * 2^z pixels wide (and high).
+    #  The data is at least 1 metre wide and high, such that a single point gets the maximum zoom.
+    world_width = 2 * MERCATOR_HALF_WIDTH
+    world_pixels = min(
+        width * world_width / max(x_max - x_min, 1), height * world_width / max(y_max - y_min, 1)
+    )
+    zoom = math.log2((1 - padding) * world_pixels / MAPBOX_WORLD_PIXELS)
+    return round(min(max(zoom, 0), MAX_ZOOM), 2)
@@ -0,0 +1,307 @@
+# Standard library.
+import bz2
+import gzip
+import io
+import lzma
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+from collections.abc import Iterator
+from contextlib import ExitStack, contextmanager
+from typing import BinaryIO, TextIO
+
+# Dependencies.
+import geopandas as gpd
+
+# The amount of bytes that is read (or written) at once when streaming a file.
+INGEST_BLOCK_SIZE = 1 << 20
+# The compression formats that are recognised by the magic bytes at the start of a file.
+COMPRESSION_MAGIC = {
+    b"\x1f\x8b": "gzip",
+    b"BZh": "bz2",
+    b"\xfd7zXZ\x00": "xz",
+    b"\x28\xb5\x2f\xfd": "zstd",
+}
+# The file extensions of compressed files, e.g. for `st.file_uploader(type=...)`.
+COMPRESSED_EXTENSIONS = ("gz", "bz2", "xz", "zst")
+# The total size of the files that each thread opened, see `get_opened_bytes`.
+_opened_bytes = threading.local()
+
+
+def count_opened_bytes(size: int):
+    """Add the size of an opened file (as stored, so compressed) to the total of this thread."""
+    _opened_bytes.total = get_opened_bytes() + size
+
+
+def get_opened_bytes() -> int:
+    """
+    Get the total size of the files that the current thread opened (to parse or hash them).
+
+    Streamlit runs every session in its own thread, so the difference of two calls is the amount of
+    bytes that a session read in between (e.g. to profile a loader), regardless of other sessions.
+    """
+    return getattr(_opened_bytes, "total", 0)
+
+
+class BufferReader(io.RawIOBase):
+    """
+    A read-only binary stream over a buffer (e.g. a memoryview or mmap), which never copies it.
+
+    Every reader has its own position, so the same upload can be read by several parsers at once.
+    """
+
+    def __init__(self, buffer: memoryview | mmap.mmap):
+        self._view = memoryview(buffer).cast("B")
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        size = min(len(target), len(self._view) - self._position)
+        if size <= 0:
+            return 0
+        target[:size] = self._view[self._position : self._position + size]
+        self._position += size
+        return size
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        start = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: len(self._view)}
+        self._position = max(start[whence] + offset, 0)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def close(self):
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+
+def get_source_name(source: os.PathLike | str | BinaryIO) -> str:
+    """Get the file name of a path or of an uploaded file (or "" if it has none)."""
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.basename(source)
+    return os.path.basename(getattr(source, "name", "") or "")
+
+
+def strip_compression_suffix(filename: str) -> str:
+    """Remove the compression extension of a file name, e.g. "trips.xml.gz" -> "trips.xml"."""
+    stem, extension = os.path.splitext(filename)
+    return stem if extension.lower().lstrip(".") in COMPRESSED_EXTENSIONS else filename
+
+
+def _get_upload_view(source: BinaryIO) -> memoryview:
+    """
+    Get the contents of an in-memory file without copying it.
+
+    An UploadedFile (a BytesIO) shares the bytes of the upload until it is written to.
+    `getvalue()` returns those bytes as they are, whereas `getbuffer()` first makes a private copy.
+    """
+    return memoryview(source.getvalue())
+
+
+@contextmanager
+def open_buffer(source: os.PathLike | str | BinaryIO) -> Iterator[memoryview | mmap.mmap]:
+    """
+    Get the raw bytes of a file on disk (memory-mapped) or of an uploaded file, without copying.
+
+    The bytes are not decompressed, see `detect_compression` and `open_binary` for that.
+
+    Parameters
+    ----------
+    source
+      The path to the file, or an in-memory file (e.g. an UploadedFile).
+
+    Yields
+    ------
+    memoryview | mmap.mmap
+      The contents of the file, which are released when the context exits.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as rf:
+            if os.fstat(rf.fileno()).st_size == 0:
+                yield memoryview(b"")
+                return
+            buffer = mmap.mmap(rf.fileno(), 0, access=mmap.ACCESS_READ)
+    else:
+        buffer = _get_upload_view(source)
+    count_opened_bytes(len(buffer))
+    try:
+        yield buffer
+    finally:
+        buffer.close() if isinstance(buffer, mmap.mmap) else buffer.release()
+
+
+def detect_compression(source: os.PathLike | str | BinaryIO) -> str | None:
+    """
+    Detect whether a file is compressed, by the magic bytes at its start (not by its name).
+
+    Parameters
+    ----------
+    source
+      The path to the file, or a binary file-like object. The position of a file-like object is
+      left as it is.
+
+    Returns
+    -------
+    str | None
+      The compression format (a value of `COMPRESSION_MAGIC`), or None if it is not compressed.
+    """
+    size = max(len(magic) for magic in COMPRESSION_MAGIC)
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as rf:
+            head = rf.read(size)
+    elif hasattr(source, "getvalue"):
+        head = bytes(_get_upload_view(source)[:size])
+    else:
+        position = source.tell()
+        head = source.read(size)
+        source.seek(position)
+    for magic, compression in COMPRESSION_MAGIC.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def _open_decompressed(raw: BinaryIO, compression: str) -> BinaryIO:
+    """Wrap a compressed binary stream in a stream that decompresses it as it is read."""
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=raw, mode="rb")
+    if compression == "bz2":
+        return bz2.BZ2File(raw, mode="rb")
+    if compression == "xz":
+        return lzma.LZMAFile(raw, mode="rb")
+    try:  # Zstandard is not in the standard library, so it is only supported if it is installed.
+        import zstandard
+    except ImportError as e:
+        raise ImportError(
+            "This file is compressed with Zstandard. Install `zstandard` to read it."
+        ) from e
+    # Unlike the others, this reader is not buffered (and would close `raw` by default).
+    reader = zstandard.ZstdDecompressor().stream_reader(
+        raw, read_size=INGEST_BLOCK_SIZE, read_across_frames=True, closefd=False
+    )
+    return io.BufferedReader(reader, INGEST_BLOCK_SIZE)
+
+
+@contextmanager
+def open_binary(source: os.PathLike | str | BinaryIO) -> Iterator[BinaryIO]:
+    """
+    Open a file on disk or an uploaded file as a buffered binary stream, to parse it incrementally.
+
+    Compressed files (see `COMPRESSION_MAGIC`) are decompressed while they are read, so they are
+    never inflated in memory (or on disk) as a whole.
+
+    Parameters
+    ----------
+    source
+      The path to the file, or a binary file-like object. In-memory files (e.g. an UploadedFile)
+      are read from their bytes without copying them, and without moving their own position.
+      Any other file-like object is read as it is.
+
+    Yields
+    ------
+    BinaryIO
+      The (decompressed) stream, which is closed when the context exits.
+    """
+    compression = detect_compression(source)
+    with ExitStack() as stack:
+        if isinstance(source, (str, os.PathLike)):
+            rf = stack.enter_context(open(source, "rb", buffering=INGEST_BLOCK_SIZE))
+            count_opened_bytes(os.fstat(rf.fileno()).st_size)
+        elif hasattr(source, "getvalue"):
+            view = _get_upload_view(source)
+            count_opened_bytes(view.nbytes)
+            rf = stack.enter_context(io.BufferedReader(BufferReader(view), INGEST_BLOCK_SIZE))
+        else:
+            rf = source
+        if compression is not None:
+            rf = stack.enter_context(_open_decompressed(rf, compression))
+        yield rf
+
+
+@contextmanager
+def open_text(source: os.PathLike | str | BinaryIO, encoding: str = "utf-8") -> Iterator[TextIO]:
+    """
+    Open a file on disk or an uploaded file as a text stream, which is decoded as it is read.
+
+    Parameters
+    ----------
+    source
+      The path to the file, or a binary file-like object, see `open_binary`.
+    encoding
+      The encoding of the file.
+
+    Yields
+    ------
+    TextIO
+      The stream. Line endings are kept as they are (like `open(..., newline="")`).
+    """
+    with open_binary(source) as binary_rf:
+        text_rf = io.TextIOWrapper(binary_rf, encoding=encoding, newline="")
+        try:
+            yield text_rf
+        finally:
+            text_rf.detach()  # Leave closing the binary stream to `open_binary`.
+
+
+@contextmanager
+def open_local_path(source: os.PathLike | str | BinaryIO) -> Iterator[str]:
+    """
+    Get a path on disk for a file, for libraries that only read files by path (or by bytes).
+
+    Parameters
+    ----------
+    source
+      The path to the file, or a binary file-like object. The latter (and a compressed file) is
+      decompressed into a temporary file in blocks, with the same extension as its name.
+
+    Yields
+    ------
+    str
+      The path, which (if it is temporary) is removed when the context exits.
+    """
+    if isinstance(source, (str, os.PathLike)) and detect_compression(source) is None:
+        count_opened_bytes(os.path.getsize(source))
+        yield os.fspath(source)
+        return
+    name = strip_compression_suffix(get_source_name(source))
+    suffix = "".join(f".{ext}" for ext in name.split(".")[1:])
+    wf = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+    # Also remove the temporary file if the source cannot be read (e.g. a corrupt upload).
+    try:
+        with wf, open_binary(source) as rf:
+            shutil.copyfileobj(rf, wf, INGEST_BLOCK_SIZE)
+        yield wf.name
+    finally:
+        os.remove(wf.name)
+
+
+def read_geo_file(source: os.PathLike | str | BinaryIO, **kwargs) -> gpd.GeoDataFrame:
+    """
+    Read a GeoJSON file (or any other format that GeoPandas supports) from disk or from an upload.
+
+    GeoPandas reads a file-like object by reading all of its bytes into a new bytes object.
+    Instead, an upload is streamed to a temporary file, which GDAL then reads by path.
+
+    Parameters
+    ----------
+    source
+      The path to the file, or an uploaded file.
+    kwargs
+      Passed on to `gpd.read_file`.
+
+    Returns
+    -------
+    gpd.GeoDataFrame
+      The features in the file.
+    """
+    with open_local_path(source) as path:
+        return gpd.read_file(path, **kwargs)
@@ -0,0 +1,205 @@
+# Standard library.
+import os
+from collections.abc import Mapping, Sequence
+from typing import BinaryIO
+
+# Dependencies.
+import geopandas as gpd
+import numpy as np
+import shapely
+
+# Local.
+from util.caching import LRUCache
+from util.disk_cache import DiskCache, get_artefact_key, get_default_cache
+from util.ingest import read_geo_file
+
+# The amount of decimals of the (WGS84) coordinates that are sent to the map, 6 is about 0.1m.
+MAP_PRECISION = 6
+# The maximum total size of the serialised geometries that are kept in memory (1GiB).
+PAYLOAD_CACHE_MAX_BYTES = 1024**3
+# The simplification tolerances (in metres) of the levels of detail, from detailed to coarse.
+LOD_TOLERANCES = (0.0, 2.0, 10.0, 50.0)
+# The maximum amount of vertices that a map layer should have (if a level of detail allows it).
+MAP_VERTEX_BUDGET = 500_000
+# The kind of the GeometryPayload artefacts in the DiskCache.
+GEOMETRY_PAYLOAD_KIND = "geometry_payload-v1"
+
+
+def _to_json_list(values: Sequence | np.ndarray) -> list:
+    """Convert values to a list of JSON-serialisable Python objects, with None for NaN."""
+    return [None if value != value else value for value in np.asarray(values).tolist()]
+
+
+class GeometryPayload:
+    """
+    The geometries of a network (or any GeoDataFrame), serialised once for Kepler.gl.
+
+    Kepler.gl expects each dataset as a "split" dict (columns, index and rows), with WKT geometries.
+    Reprojecting and serialising all geometries is by far the most expensive part of building it,
+    so it is done once per network, on the server. Every layer still holds (and so sends the
+    browser) the WKT strings of all its rows: the Kepler.gl component is rebuilt on every rerun,
+    so the browser cannot keep the geometry of an earlier layer.
+
+    The geometries are serialised at several levels of detail (simplified with increasing
+    tolerances), and every layer uses the most detailed level that fits within a vertex budget.
+    """
+
+    def __init__(
+        self,
+        network: gpd.GeoDataFrame,
+        columns: Sequence[str] = ("id",),
+        precision: int = MAP_PRECISION,
+        tolerances: Sequence[float] = LOD_TOLERANCES,
+    ):
+        """
+        Parameters
+        ----------
+        network
+          The network, in any CRS. Without a CRS, it is assumed to be WGS84 (as in GeoJSON).
+        columns
+          The properties of the network that are included in every layer (if present).
+        precision
+          The amount of decimals of the coordinates.
+        tolerances
+          The simplification tolerance of each level of detail, in metres. 0 keeps all vertices.
+        """
+        if network.crs is None:
+            network = network.set_crs(4326)
+        self.columns = [col for col in columns if col in network.columns]
+        self.properties = [_to_json_list(network[col]) for col in self.columns]
+        self.tolerances = list(tolerances)
+
+        # Simplify in metres, then serialise in longitude/latitude (which Kepler.gl needs).
+        projected = network.geometry
+        if projected.crs.is_geographic and len(projected) > 0:
+            projected = projected.to_crs(projected.estimate_utm_crs())
+        self.levels: list[list[str]] = []
+        vertex_counts = []
+        for tolerance in self.tolerances:
+            # Lines keep their end points, so simplified edges stay connected to each other.
+            simplified = projected.simplify(tolerance) if tolerance > 0 else projected
+            vertex_counts.append(shapely.get_num_coordinates(simplified.to_numpy()))
+            geometry = simplified.to_crs(4326).to_numpy()
+            self.levels.append(
+                shapely.to_wkt(geometry, rounding_precision=precision, trim=True).tolist()
+            )
+        # The amount of vertices of each row, at each level of detail.
+        self.vertex_counts = np.array(vertex_counts, dtype=np.int64).reshape(len(self.levels), -1)
+
+    def __len__(self) -> int:
+        return len(self.levels[0])
+
+    @property
+    def geometry(self) -> list[str]:
+        """The serialised geometries at full detail."""
+        return self.levels[0]
+
+    @property
+    def nbytes(self) -> int:
+        """The (approximate) size of the serialised geometries."""
+        return sum(len(wkt) for level in self.levels for wkt in level)
+
+    def get_level(
+        self,
+        positions: Sequence[int] | np.ndarray | None = None,
+        vertex_budget: int = MAP_VERTEX_BUDGET,
+    ) -> int:
+        """
+        Get the most detailed level of detail whose vertices fit within a budget.
+
+        Parameters
+        ----------
+        positions
+          The rows of the network in the layer. If None, all rows are included.
+        vertex_budget
+          The maximum amount of vertices in the layer.
+
+        Returns
+        -------
+        int
+          The index of the level (in `tolerances`). If no level fits, the coarsest one.
+        """
+        counts = self.vertex_counts if positions is None else self.vertex_counts[:, positions]
+        fits = np.flatnonzero(counts.sum(axis=1) <= vertex_budget)
+        return int(fits[0]) if len(fits) else len(self.levels) - 1
+
+    def get_layer(
+        self,
+        attributes: Mapping[str, Sequence | np.ndarray] | None = None,
+        positions: Sequence[int] | np.ndarray | None = None,
+        level: int | None = None,
+    ) -> dict[str, list]:
+        """
+        Get a Kepler.gl dataset of the network, which can be passed to `KeplerGl.add_data`.
+        Its rows refer to the serialised geometries (no copies), but it holds all of them.
+
+        Parameters
+        ----------
+        attributes
+          Extra columns, with one value per row of the network (e.g. from an `EdgeDataCube`).
+        positions
+          The rows of the network to include, in order. If None, all rows are included.
+        level
+          The level of detail of the geometries. If None, it is picked with `get_level`.
+
+        Returns
+        -------
+        dict[str, list]
+          The dataset, in the "split" format of `DataFrame.to_dict`.
+        """
+        attributes = {} if attributes is None else attributes
+        level = self.get_level(positions) if level is None else level
+        names = [*self.columns, *attributes, "geometry"]
+        values = [
+            *self.properties,
+            *(_to_json_list(attribute) for attribute in attributes.values()),
+            self.levels[level],
+        ]
+        if positions is not None:
+            positions = np.asarray(positions).tolist()
+            values = [[column[position] for position in positions] for column in values]
+        rows = [list(row) for row in zip(*values)]
+        return {"columns": names, "index": list(range(len(rows))), "data": rows}
+
+
+# Shared by all pages and sessions, such that every network is only serialised once.
+_PAYLOAD_CACHE = LRUCache(PAYLOAD_CACHE_MAX_BYTES)
+
+
+def load_geometry_payload(
+    source: os.PathLike | str | BinaryIO,
+    network: gpd.GeoDataFrame | None = None,
+    columns: Sequence[str] = ("id",),
+    cache: DiskCache | None = None,
+) -> GeometryPayload:
+    """
+    Get the GeometryPayload of a network file, from memory or from the DiskCache if it was
+    serialised before (e.g. by `precompute.py`).
+
+    Parameters
+    ----------
+    source
+      The path to the network file, or an uploaded network file. Its content hash is the cache key.
+    network
+      The network in `source`, if it is already loaded. Otherwise, it is read from `source`.
+    columns
+      The properties of the network that are included in every layer, see `GeometryPayload`.
+    cache
+      The DiskCache to use, the default cache if None.
+
+    Returns
+    -------
+    GeometryPayload
+      The serialised network.
+    """
+    key = get_artefact_key(source, columns=tuple(columns))
+    payload = _PAYLOAD_CACHE.get(key)
+    if payload is None:
+        cache = get_default_cache() if cache is None else cache
+        payload = cache.load_or_build(
+            GEOMETRY_PAYLOAD_KIND,
+            key,
+            lambda: GeometryPayload(read_geo_file(source) if network is None else network, columns),
+        )
+        _PAYLOAD_CACHE.put(key, payload, payload.nbytes)
+    return payload
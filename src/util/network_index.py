@@ -0,0 +1,92 @@
+# Dependencies.
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from shapely.ops import linemerge
+
+
+class NetworkIndex:
+    """
+    A network GeoDataFrame, together with a hash index from edge ID to row position.
+
+    Looking up the edges of a route then scales with the length of the route,
+    rather than with the size of the network (as a `query("id in @edge_list")` would).
+    """
+
+    def __init__(self, network: gpd.GeoDataFrame, id_column: str = "id"):
+        """
+        Parameters
+        ----------
+        network
+          The network, with one row per edge.
+        id_column
+          The column with the edge IDs.
+        """
+        self.network = network
+        edge_ids = network[id_column].astype(str)
+        # Only the first row of an edge is used if the network has duplicate IDs.
+        is_first = ~edge_ids.duplicated().to_numpy()
+        self.positions = pd.Series(
+            np.flatnonzero(is_first), index=pd.Index(edge_ids[is_first], name=id_column)
+        )
+
+    def __len__(self) -> int:
+        return len(self.network)
+
+    def get_positions(self, edge_list: list[str]) -> np.ndarray:
+        """
+        Get the row positions of the edges in a route.
+
+        Parameters
+        ----------
+        edge_list
+          The edge IDs, in the order they are traversed.
+
+        Returns
+        -------
+        np.ndarray
+          The row position of each edge in the network, in the same order as `edge_list`.
+          Edges that are not in the network are left out.
+        """
+        indexer = self.positions.index.get_indexer(edge_list)
+        return self.positions.to_numpy()[indexer[indexer >= 0]]
+
+    def get_route(self, edge_list: list[str]) -> gpd.GeoDataFrame:
+        """
+        Get the edges of a route, in the order they are traversed.
+
+        Parameters
+        ----------
+        edge_list
+          The edge IDs of the route.
+
+        Returns
+        -------
+        gpd.GeoDataFrame
+          One row per (known) edge of the route.
+        """
+        return self.network.take(self.get_positions(edge_list))
+
+    def get_route_line(self, edge_list: list[str], name: str) -> gpd.GeoDataFrame:
+        """
+        Get a route as a single (merged) line.
+
+        Parameters
+        ----------
+        edge_list
+          The edge IDs of the route.
+        name
+          The name of the route, e.g. "Route 0".
+
+        Returns
+        -------
+        gpd.GeoDataFrame
+          A single row with the route name, its edge count and the merged geometry.
+          If the edges do not connect, the geometry is a MultiLineString.
+        """
+        route = self.get_route(edge_list)
+        return gpd.GeoDataFrame(
+            {"route": [name], "edge_count": [len(route)]},
+            geometry=[linemerge(list(route.geometry))],
+            crs=self.network.crs,
+        )
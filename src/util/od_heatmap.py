@@ -0,0 +1,157 @@
+# Dependencies.
+import numpy as np
+from matplotlib import colormaps, rcParams
+from matplotlib.colors import LogNorm
+from matplotlib.figure import Figure
+
+# Local.
+from util.sumo_conversions import ODMatrix
+
+# The maximum amount of rows and columns of a heatmap. Larger matrices are aggregated into bins.
+HEATMAP_MAX_BINS = 200
+# The size (in pixels) of the rendered heatmap image.
+HEATMAP_PIXELS = (900, 700)
+HEATMAP_DPI = 100
+# The maximum amount of tick labels per axis.
+HEATMAP_MAX_TICKS = 20
+
+
+class HeatmapGrid:
+    """
+    An O/D matrix aggregated into a grid of at most `max_bins` x `max_bins` cells.
+
+    The rows are the origin TAZs and the columns are the destination TAZs (both in sorted order).
+    Only TAZs that occur as origin (or destination, respectively) are included.
+    Row bin `i` covers the origin TAZs `row_zones[row_edges[i]:row_edges[i + 1]]`,
+    and likewise for the columns.
+    """
+
+    def __init__(
+        self,
+        od_matrix: ODMatrix,
+        max_bins: int = HEATMAP_MAX_BINS,
+        row_range: tuple[int, int] | None = None,
+        col_range: tuple[int, int] | None = None,
+    ):
+        """
+        Parameters
+        ----------
+        od_matrix
+          The O/D matrix to aggregate.
+        max_bins
+          The maximum amount of rows and columns in the grid (the resolution budget).
+        row_range
+          Optional (start, end) range of origin positions (in `row_zones`) to drill down into.
+        col_range
+          Optional (start, end) range of destination positions (in `col_zones`) to drill down into.
+        """
+        zone_count = len(od_matrix.zones)
+        # Give the origins and destinations that actually occur a compact rank.
+        has_row = np.diff(od_matrix.indptr) > 0
+        has_col = np.zeros(zone_count, dtype=bool)
+        has_col[od_matrix.indices] = True
+        self.row_zones = od_matrix.zones[has_row]
+        self.col_zones = od_matrix.zones[has_col]
+        row_rank = (np.cumsum(has_row) - 1)[od_matrix._origin_indices()]
+        col_rank = (np.cumsum(has_col) - 1)[od_matrix.indices]
+
+        self.row_range = row_range or (0, len(self.row_zones))
+        self.col_range = col_range or (0, len(self.col_zones))
+        in_block = (
+            (row_rank >= self.row_range[0])
+            & (row_rank < self.row_range[1])
+            & (col_rank >= self.col_range[0])
+            & (col_rank < self.col_range[1])
+        )
+        self.row_edges = self._get_bin_edges(self.row_range, max_bins)
+        self.col_edges = self._get_bin_edges(self.col_range, max_bins)
+        row_bins = np.searchsorted(self.row_edges, row_rank[in_block], side="right") - 1
+        col_bins = np.searchsorted(self.col_edges, col_rank[in_block], side="right") - 1
+        # Sum all counts that fall into the same cell.
+        shape = (len(self.row_edges) - 1, len(self.col_edges) - 1)
+        self.grid = np.bincount(
+            row_bins * shape[1] + col_bins,
+            weights=od_matrix.values[in_block],
+            minlength=shape[0] * shape[1],
+        ).reshape(shape)
+
+    @staticmethod
+    def _get_bin_edges(position_range: tuple[int, int], max_bins: int) -> np.ndarray:
+        """Split a range of positions into at most `max_bins` (nearly) equally sized bins."""
+        start, end = position_range
+        bin_count = max(min(end - start, max_bins), 1)
+        return np.unique(np.linspace(start, end, bin_count + 1).round().astype(np.int64))
+
+    @property
+    def is_aggregated(self) -> bool:
+        """Whether any cell of the grid covers more than one O/D pair."""
+        return bool((np.diff(self.row_edges) > 1).any() or (np.diff(self.col_edges) > 1).any())
+
+    def get_row_range(self, row_bin: int) -> tuple[int, int]:
+        """Get the (start, end) range of origin positions covered by a row of the grid."""
+        return int(self.row_edges[row_bin]), int(self.row_edges[row_bin + 1])
+
+    def get_col_range(self, col_bin: int) -> tuple[int, int]:
+        """Get the (start, end) range of destination positions covered by a column of the grid."""
+        return int(self.col_edges[col_bin]), int(self.col_edges[col_bin + 1])
+
+    def get_row_labels(self) -> list[str]:
+        return self._get_labels(self.row_zones, self.row_edges)
+
+    def get_col_labels(self) -> list[str]:
+        return self._get_labels(self.col_zones, self.col_edges)
+
+    @staticmethod
+    def _get_labels(zones: np.ndarray, edges: np.ndarray) -> list[str]:
+        """Label each bin by its TAZ, or by its first and last TAZ if it covers several."""
+        return [
+            f"{zones[start]}" if end - start == 1 else f"{zones[start]} - {zones[end - 1]}"
+            for start, end in zip(edges[:-1], edges[1:])
+        ]
+
+
+def render_heatmap(heatmap_grid: HeatmapGrid, title: str) -> Figure:
+    """
+    Rasterise an aggregated O/D grid into a figure of a fixed pixel size.
+
+    Parameters
+    ----------
+    heatmap_grid
+      The aggregated O/D matrix to plot.
+    title
+      The title of the plot.
+
+    Returns
+    -------
+    Figure
+      The heatmap figure. Empty cells are drawn black, and the colours use a log scale.
+      It is not registered with pyplot, so it is freed once it is no longer referenced.
+    """
+    width, height = HEATMAP_PIXELS
+    fig = Figure(figsize=(width / HEATMAP_DPI, height / HEATMAP_DPI), dpi=HEATMAP_DPI)
+    ax = fig.subplots()
+    # Configure colour to deal with empty slots.
+    # With the help of: https://stackoverflow.com/a/58185087
+    colour = colormaps[rcParams["image.cmap"]].copy()
+    colour.set_bad("black")  # If the value is bad, the colour will be black instead of transparent.
+    grid = np.ma.masked_less_equal(heatmap_grid.grid, 0)
+    vmax = max(grid.max(), 1) if grid.count() else 1
+    image = ax.imshow(
+        grid, norm=LogNorm(vmin=1, vmax=vmax), cmap=colour, aspect="auto", interpolation="nearest"
+    )
+    fig.colorbar(image, ax=ax)
+    for set_ticks, set_labels, labels in (
+        (ax.set_yticks, ax.set_yticklabels, heatmap_grid.get_row_labels()),
+        (ax.set_xticks, ax.set_xticklabels, heatmap_grid.get_col_labels()),
+    ):
+        if not labels:
+            continue
+        tick_positions = np.unique(np.linspace(0, len(labels) - 1, HEATMAP_MAX_TICKS).astype(int))
+        set_ticks(tick_positions)
+        set_labels([labels[i] for i in tick_positions], fontsize=7)
+    ax.tick_params(axis="x", labelrotation=90)
+    ax.set_xlabel("Destination TAZ")
+    ax.set_ylabel("Origin TAZ")
+    ax.set_title(title)
+    fig.tight_layout()
+    return fig
@@ -0,0 +1,250 @@
+# Standard library.
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO
+
+# Dependencies.
+import numpy as np
+import pandas as pd
+
+# Local.
+from util.disk_cache import DiskCache, get_artefact_key, get_default_cache
+from util.sumo_conversions import ODMatrix, SOURCE_TAZ, TARGET_TAZ
+
+# The kind of the ODMatrix artefacts in the DiskCache.
+OD_MATRIX_KIND = "od_matrix-v1"
+# Directories with less O/D matrix data than this (in bytes) are parsed in the calling process,
+#  since starting worker processes takes longer than parsing the files.
+OD_PARALLEL_MIN_BYTES = 64 * 1024**2
+
+
+def load_cached_od_matrix(
+    source: os.PathLike | str | BinaryIO,
+    cache: DiskCache | None = None,
+    source_hash: str | None = None,
+) -> ODMatrix:
+    """
+    Load a parsed O/D matrix file from the DiskCache, or parse (and cache) it if it is not cached.
+    The content hash of the file is used as the content hash of the matrix, so the parsed arrays
+    are never hashed again.
+
+    Parameters
+    ----------
+    source
+      The path to the O/D matrix file, or an uploaded O/D matrix file.
+    cache
+      The DiskCache to use, the default cache if None.
+    source_hash
+      The content hash of the file (see `hash_source`), if the caller already computed it.
+
+    Returns
+    -------
+    ODMatrix
+      The O/D matrix in the file.
+    """
+
+    def build() -> ODMatrix:
+        od_matrix = ODMatrix()
+        if isinstance(source, (str, os.PathLike)):
+            od_matrix.load_from_filepath(source)
+        else:
+            od_matrix.load_from_streamlit_file(source)
+        return od_matrix
+
+    cache = get_default_cache() if cache is None else cache
+    source_hash = get_artefact_key(source) if source_hash is None else source_hash
+    od_matrix = cache.load_or_build(OD_MATRIX_KIND, source_hash, build)
+    od_matrix.set_content_hash(source_hash)
+    return od_matrix
+
+
+def load_od_file(filepath: os.PathLike | str) -> ODMatrix:
+    """Load a single O/D matrix file. Defined on module level such that worker processes can run it."""
+    return load_cached_od_matrix(filepath)
+
+
+class ODTimeSeries:
+    """
+    Hold a series of O/D matrices (one per period) in a single 3-D sparse structure.
+
+    The counts are stored as COO columns sorted by (period, origin, destination):
+    the entries of period `p` are at positions `period_ptr[p]:period_ptr[p + 1]`.
+    Origins and destinations are dense indices into `zones`, which is shared by all periods.
+    """
+
+    def __init__(self, matrices: list[ODMatrix], names: list[str] | None = None):
+        """
+        Parameters
+        ----------
+        matrices
+          The O/D matrices to combine. They are ordered by their start time.
+        names
+          Optional names (e.g. file names) of the matrices, in the same order as `matrices`.
+        """
+        names = names if names is not None else [f"Period {i}" for i in range(len(matrices))]
+        order = sorted(range(len(matrices)), key=lambda i: (matrices[i].start, matrices[i].end))
+        matrices = [matrices[i] for i in order]
+        self.names: list[str] = [names[i] for i in order]
+        # The first line of each O/D matrix file, e.g. "$OR;D2".
+        self.file_headers: list[str] = [m.file_header for m in matrices]
+        self.starts = np.array([m.start for m in matrices], dtype=np.float64)
+        self.ends = np.array([m.end for m in matrices], dtype=np.float64)
+        self.factors = np.array([m.factor for m in matrices], dtype=np.float64)
+        # One shared zone index for all periods.
+        self.zones = np.unique(np.concatenate([m.zones for m in matrices] or [[]])).astype(np.int64)
+        origin_parts, destination_parts, value_parts = [], [], []
+        for m in matrices:
+            # Re-map each matrix's own dense indices onto the shared zone index.
+            zone_map = np.searchsorted(self.zones, m.zones)
+            origin_parts.append(zone_map[m._origin_indices()])
+            destination_parts.append(zone_map[m.indices])
+            value_parts.append(m.values)
+        index_type = np.int32 if len(self.zones) < np.iinfo(np.int32).max else np.int64
+        self.origin_idx = np.concatenate(origin_parts or [[]]).astype(index_type)
+        self.destination_idx = np.concatenate(destination_parts or [[]]).astype(index_type)
+        self.values = np.concatenate(value_parts or [[]]).astype(np.int64)
+        self.period_ptr = np.concatenate([[0], np.cumsum([len(v) for v in value_parts])])
+
+    @classmethod
+    def from_directory(
+        cls, od_dir: os.PathLike | str, max_workers: int | None = None
+    ) -> "ODTimeSeries":
+        """
+        Load all O/D matrix files in a directory, parsing large directories in parallel.
+
+        The worker processes are spawned rather than forked: forking the (multithreaded)
+        Streamlit server can deadlock on locks that other sessions hold.
+
+        Parameters
+        ----------
+        od_dir
+          The directory with O/D matrix files (e.g. `MR_5.0_6.0.txt`, `MR_6.0_7.0.txt`, ...).
+        max_workers
+          The maximum amount of worker processes. Defaults to the amount of CPUs.
+          The files are parsed serially if they are smaller than `OD_PARALLEL_MIN_BYTES` together.
+
+        Returns
+        -------
+        ODTimeSeries
+          The combined O/D matrices of all files, ordered by their start time.
+        """
+        filenames = sorted(f for f in os.listdir(od_dir) if os.path.isfile(os.path.join(od_dir, f)))
+        filepaths = [os.path.join(od_dir, f) for f in filenames]
+        total_bytes = sum(os.path.getsize(fp) for fp in filepaths)
+        if len(filepaths) <= 1 or max_workers == 1 or total_bytes < OD_PARALLEL_MIN_BYTES:
+            matrices = [load_od_file(fp) for fp in filepaths]
+        else:
+            with ProcessPoolExecutor(
+                max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+            ) as executor:
+                matrices = list(executor.map(load_od_file, filepaths))
+        return cls(matrices, filenames)
+
+    @property
+    def period_count(self) -> int:
+        return len(self.names)
+
+    def get_period_labels(self) -> list[str]:
+        """Get a label for each period, in the `start-end` format."""
+        return [f"{start:g}-{end:g}" for start, end in zip(self.starts, self.ends)]
+
+    def _period_slice(self, period: int) -> slice:
+        return slice(self.period_ptr[period], self.period_ptr[period + 1])
+
+    def get_period_totals(self) -> pd.Series:
+        """Get the total amount of movements in each period, indexed by the period label."""
+        cumulative = np.concatenate([[0], np.cumsum(self.values)])
+        totals = cumulative[self.period_ptr[1:]] - cumulative[self.period_ptr[:-1]]
+        return pd.Series(totals, index=self.get_period_labels(), name="Movements")
+
+    def get_peak_period(self) -> int:
+        """Get the index of the period with the most movements."""
+        return int(np.argmax(self.get_period_totals().to_numpy()))
+
+    def get_period_matrix(self, period: int) -> ODMatrix:
+        """
+        Get the O/D matrix of a single period, without re-reading its file.
+
+        Parameters
+        ----------
+        period
+          The index of the period (in order of start time).
+
+        Returns
+        -------
+        ODMatrix
+          The O/D matrix of that period.
+        """
+        period_slice = self._period_slice(period)
+        od_matrix = ODMatrix()
+        od_matrix.file_header = self.file_headers[period]
+        od_matrix.start = float(self.starts[period])
+        od_matrix.end = float(self.ends[period])
+        od_matrix.factor = float(self.factors[period])
+        od_matrix.set_counts(
+            self.zones[self.origin_idx[period_slice]],
+            self.zones[self.destination_idx[period_slice]],
+            self.values[period_slice],
+        )
+        return od_matrix
+
+    def _flat_pairs(self, period: int) -> tuple[np.ndarray, np.ndarray]:
+        """Get the flattened (origin * zone_count + destination) keys and counts of a period."""
+        period_slice = self._period_slice(period)
+        flat = self.origin_idx[period_slice].astype(np.int64) * len(self.zones)
+        return flat + self.destination_idx[period_slice], self.values[period_slice]
+
+    def get_diff(self, period_a: int, period_b: int) -> pd.DataFrame:
+        """
+        Compare the O/D pairs of two periods.
+
+        Parameters
+        ----------
+        period_a
+          The index of the first period.
+        period_b
+          The index of the second period.
+
+        Returns
+        -------
+        pd.DataFrame
+          One row per pair that occurs in either period, sorted by the absolute difference.
+          Columns: "Origin TAZ", "Destination TAZ", "Count A", "Count B" and "Difference" (B - A).
+        """
+        keys_a, values_a = self._flat_pairs(period_a)
+        keys_b, values_b = self._flat_pairs(period_b)
+        # Within a period the keys are sorted and unique, so they can be aligned by searching.
+        keys = np.union1d(keys_a, keys_b)
+        counts_a = np.zeros(len(keys), dtype=np.int64)
+        counts_b = np.zeros(len(keys), dtype=np.int64)
+        counts_a[np.searchsorted(keys, keys_a)] = values_a
+        counts_b[np.searchsorted(keys, keys_b)] = values_b
+        difference = counts_b - counts_a
+        order = np.argsort(-np.abs(difference), kind="stable")
+        origins, destinations = np.divmod(keys[order], max(len(self.zones), 1))
+        return pd.DataFrame(
+            {
+                "Origin TAZ": self.zones[origins],
+                "Destination TAZ": self.zones[destinations],
+                "Count A": counts_a[order],
+                "Count B": counts_b[order],
+                "Difference": difference[order],
+            }
+        )
+
+    def get_pair_series(self, origin: SOURCE_TAZ, destination: TARGET_TAZ) -> pd.Series:
+        """Get the count of a single O/D pair in every period, indexed by the period label."""
+        zone_count = len(self.zones)
+        origin_pos, destination_pos = np.searchsorted(self.zones, [origin, destination])
+        counts = np.zeros(self.period_count, dtype=np.int64)
+        if (
+            origin_pos < zone_count
+            and destination_pos < zone_count
+            and self.zones[origin_pos] == origin
+            and self.zones[destination_pos] == destination
+        ):
+            is_pair = (self.origin_idx == origin_pos) & (self.destination_idx == destination_pos)
+            periods = np.searchsorted(self.period_ptr, np.flatnonzero(is_pair), side="right") - 1
+            counts[periods] = self.values[is_pair]
+        return pd.Series(counts, index=self.get_period_labels(), name=f"{origin} -> {destination}")
@@ -0,0 +1,307 @@
+# Standard library.
+import functools
+import json
+import os
+import time
+import uuid
+from collections.abc import Callable, Iterator, Sized
+from contextlib import contextmanager
+from typing import Any
+
+# Dependencies.
+import pandas as pd
+import plotly.graph_objects as p_go
+import streamlit as st
+
+# Local.
+from util.ingest import get_opened_bytes
+
+# Profiling is opt-in: set this environment variable to 1 to profile (and show) every rerun.
+PROFILING_ENABLED = os.environ.get("SUMO_DASHBOARD_PROFILE", "0") not in ("", "0")
+# If set, the records of every profiled rerun are also appended to this JSON lines file.
+PROFILE_LOG_PATH = os.environ.get("SUMO_DASHBOARD_PROFILE_LOG")
+# The session state key of the profile of the current rerun.
+PROFILE_STATE_KEY = "rerun_profile"
+# The measurements of each record, in the order in which they are exported.
+RECORD_FIELDS = (
+    "name",
+    "kind",
+    "depth",
+    "start",
+    "duration",
+    "bytes_read",
+    "rows",
+    "memory_delta",
+    "cache",
+)
+# The colour of each kind of record in the timeline ("loader" records are coloured by cache use).
+TIMELINE_COLOURS = {"stage": "#4c78a8", "hit": "#54a24b", "miss": "#e45756"}
+
+
+def get_rss() -> int | None:
+    """
+    Get the resident memory of the process, in bytes.
+
+    This is shared by all sessions, so it is only a good indication when one session is active.
+
+    Returns
+    -------
+    int | None
+      The current RSS, or None if it cannot be read (it is read from `/proc`, so on Linux only).
+    """
+    try:
+        with open("/proc/self/statm") as rf:
+            return int(rf.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def count_rows(result: Any) -> int | None:
+    """Get the amount of rows (or items) in the result of a loader, if it has a length."""
+    if isinstance(result, Sized) and not isinstance(result, (str, bytes, dict)):
+        return len(result)
+    return None
+
+
+class ProfileRecord:
+    """The measurements of one stage of a rerun, or of one call of a loader."""
+
+    def __init__(self, name: str, kind: str, start: float, depth: int):
+        """
+        Parameters
+        ----------
+        name
+          The name of the stage or loader.
+        kind
+          Either "stage" or "loader".
+        start
+          When it started, in seconds since the start of the rerun.
+        depth
+          The amount of stages (or loaders) that it is nested in.
+        """
+        self.name = name
+        self.kind = kind
+        self.start = start
+        self.depth = depth
+        self.duration: float | None = None
+        # The total size of the files that were opened (including cached files), see `ingest`.
+        self.bytes_read: int | None = None
+        self.rows: int | None = None
+        # The change in RSS of the process, in bytes.
+        self.memory_delta: int | None = None
+        # "hit" or "miss" for loaders (or a stage that sets it), else None.
+        self.cache: str | None = None
+
+    def to_dict(self) -> dict[str, str | int | float | None]:
+        """Represent the record in a dict, see `RECORD_FIELDS`"""
+        return {field: getattr(self, field) for field in RECORD_FIELDS}
+
+
+class RerunProfile:
+    """The records of a single rerun of a page, in the order in which they started."""
+
+    def __init__(self, page: str):
+        self.page = page
+        self.rerun_id = uuid.uuid4().hex[:12]
+        self.timestamp = time.time()
+        self.started = time.perf_counter()
+        self.records: list[ProfileRecord] = []
+        # The records that are running, innermost last.
+        self.stack: list[ProfileRecord] = []
+
+    def get_elapsed(self) -> float:
+        """Get the amount of seconds since the start of the rerun."""
+        return time.perf_counter() - self.started
+
+    def to_frame(self) -> pd.DataFrame:
+        """Get one row per record, with the columns in `RECORD_FIELDS`."""
+        return pd.DataFrame(
+            [record.to_dict() for record in self.records],
+            columns=list(RECORD_FIELDS),
+        )
+
+    def to_json_lines(self) -> str:
+        """Get one JSON line per record, which also holds the page, rerun ID and timestamp."""
+        rerun = {"page": self.page, "rerun_id": self.rerun_id, "timestamp": self.timestamp}
+        return "".join(json.dumps({**rerun, **record.to_dict()}) + "\n" for record in self.records)
+
+
+def _get_profile() -> RerunProfile | None:
+    if not PROFILING_ENABLED:
+        return None
+    return st.session_state.get(PROFILE_STATE_KEY)
+
+
+def start_profile(page: str):
+    """
+    Start the profile of a rerun. Call this at the start of a page, before any stage or loader.
+
+    Parameters
+    ----------
+    page
+      The name of the page, which is included in the exported records.
+    """
+    if PROFILING_ENABLED:
+        st.session_state[PROFILE_STATE_KEY] = RerunProfile(page)
+
+
+@contextmanager
+def profile_stage(name: str, kind: str = "stage") -> Iterator[ProfileRecord]:
+    """
+    Profile a stage of a rerun: its duration, the bytes that it read and its change in memory.
+
+    Parameters
+    ----------
+    name
+      The name of the stage, as shown in the timeline.
+    kind
+      Either "stage" or "loader".
+
+    Yields
+    ------
+    ProfileRecord
+      The record of the stage, on which e.g. the amount of rows can be set.
+      If profiling is disabled, the record is not kept.
+    """
+    profile = _get_profile()
+    if profile is None:
+        yield ProfileRecord(name, kind, 0.0, 0)
+        return
+    record = ProfileRecord(name, kind, profile.get_elapsed(), len(profile.stack))
+    profile.records.append(record)
+    profile.stack.append(record)
+    rss_before = get_rss()
+    opened_before = get_opened_bytes()
+    try:
+        yield record
+    finally:
+        record.duration = profile.get_elapsed() - record.start
+        record.bytes_read = get_opened_bytes() - opened_before
+        rss_after = get_rss()
+        if rss_before is not None and rss_after is not None:
+            record.memory_delta = rss_after - rss_before
+        profile.stack.pop()
+
+
+def cached_loader(cache: Callable[[Callable], Callable]) -> Callable[[Callable], Callable]:
+    """
+    Cache a loader with a Streamlit cache decorator, and profile its calls (see `profile_stage`).
+
+    The record of each call tells whether the result came from the cache ("hit"), or whether the
+    loader ran ("miss"), and how many rows the result has. Without profiling, this is the same as
+    the cache decorator itself.
+
+    Parameters
+    ----------
+    cache
+      The cache decorator, e.g. `st.cache_data` or `st.cache_resource(max_entries=4)`.
+
+    Returns
+    -------
+    Callable[[Callable], Callable]
+      A decorator, e.g. use `@cached_loader(st.cache_data)` for `@st.cache_data`.
+    """
+
+    def decorate(func: Callable) -> Callable:
+        if not PROFILING_ENABLED:
+            return cache(func)
+
+        @functools.wraps(func)
+        def load(*args, **kwargs):
+            # Only runs if the result is not cached. The innermost record is the one of this call.
+            profile = _get_profile()
+            if profile is not None and profile.stack:
+                profile.stack[-1].cache = "miss"
+            return func(*args, **kwargs)
+
+        cached_load = cache(load)
+
+        @functools.wraps(func)
+        def profiled_load(*args, **kwargs):
+            with profile_stage(func.__name__, "loader") as record:
+                record.cache = "hit"
+                result = cached_load(*args, **kwargs)
+                record.rows = count_rows(result)
+            return result
+
+        profiled_load.clear = cached_load.clear
+        return profiled_load
+
+    return decorate
+
+
+def get_timeline(profile: RerunProfile) -> p_go.Figure:
+    """
+    Create a timeline of a rerun, with one bar per record (nested records are indented).
+
+    Parameters
+    ----------
+    profile
+      The profile of the rerun.
+
+    Returns
+    -------
+    p_go.Figure
+      A horizontal bar chart, in seconds since the start of the rerun.
+    """
+    records = profile.records
+    labels = [" " * record.depth + record.name for record in records]
+    colours = [TIMELINE_COLOURS[record.cache or "stage"] for record in records]
+    hover_texts = [
+        f"{record.kind}: {record.duration * 1000:.1f}ms"
+        + (f", cache {record.cache}" if record.cache else "")
+        + (f", {record.rows} rows" if record.rows is not None else "")
+        + f", {record.bytes_read / 1024**2:.1f}MB read"
+        for record in records
+    ]
+    ret_fig = p_go.Figure(
+        p_go.Bar(
+            base=[record.start for record in records],
+            x=[record.duration for record in records],
+            y=list(range(len(records))),
+            orientation="h",
+            marker_color=colours,
+            hovertext=hover_texts,
+            hoverinfo="text",
+        )
+    )
+    ret_fig.update_yaxes(tickvals=list(range(len(records))), ticktext=labels, autorange="reversed")
+    ret_fig.update_layout(
+        xaxis_title="Seconds since the start of the rerun",
+        height=120 + 25 * len(records),
+        margin={"l": 0, "r": 0, "t": 20, "b": 0},
+    )
+    return ret_fig
+
+
+def show_profile_panel():
+    """
+    Show the profile of the current rerun in a collapsed panel. Call this at the end of a page.
+
+    The records can be downloaded as JSON lines, and are appended to `PROFILE_LOG_PATH` (if set).
+    """
+    profile = _get_profile()
+    if profile is None:
+        return
+    total = profile.get_elapsed()
+    json_lines = profile.to_json_lines()
+    if PROFILE_LOG_PATH:
+        with open(PROFILE_LOG_PATH, "a", encoding="utf-8") as af:
+            af.write(json_lines)
+
+    records_df = profile.to_frame()
+    loaders_df = records_df[records_df.kind == "loader"]
+    with st.expander(f"Profile of this rerun ({total:.2f}s)", expanded=False):
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Rerun time", f"{total:.2f}s")
+        col2.metric("Loader calls", len(loaders_df))
+        col3.metric("Cache misses", int((loaders_df.cache == "miss").sum()))
+        if profile.records:
+            st.plotly_chart(get_timeline(profile))
+            st.dataframe(records_df.style.format(thousands=None, precision=3))
+        st.download_button(
+            "Download the profile as JSON lines",
+            json_lines,
+            file_name=f"profile-{profile.rerun_id}.jsonl",
+            mime="application/jsonl",
+        )
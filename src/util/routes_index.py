@@ -0,0 +1,207 @@
+# Standard library.
+import html
+import os
+import re
+from collections.abc import Iterator
+from typing import BinaryIO
+
+# Dependencies.
+import numpy as np
+import pandas as pd
+from lxml import etree
+
+# Local.
+from util.disk_cache import DiskCache, get_artefact_key, get_default_cache
+from util.ingest import INGEST_BLOCK_SIZE, detect_compression, open_binary, open_buffer
+from util.xml_streaming import records_to_frame
+
+# Any attribute value (which may hold a ">"), or a single character of a start tag outside of them.
+_TAG_PART = rb"""(?:[^>"']|"[^"]*"|'[^']*')"""
+# Start tags of vehicles (group 1 or 2 holds the (escaped) ID in double or single quotes,
+#  group 3 is "/" for self-closing tags), and end tags.
+VEHICLE_START_PATTERN = re.compile(
+    rb"<vehicle\b"
+    + _TAG_PART
+    + rb"""*?\sid\s*=\s*(?:"([^"]*)"|'([^']*)')"""
+    + _TAG_PART
+    + rb"*?(/?)>"
+)
+VEHICLE_END_TAG = b"</vehicle>"
+# The only route attributes that are converted to numbers. All others (e.g. edges) stay strings.
+ROUTE_NUMERIC_COLUMNS = ("cost", "probability", "replacedAtTime")
+# The kind of the RoutesIndex artefacts in the DiskCache.
+ROUTES_INDEX_KIND = "routes_index-v2"
+
+
+def _iter_blocks(source: os.PathLike | str | BinaryIO) -> Iterator[tuple[int, bytes | memoryview]]:
+    """
+    Get the (decompressed) bytes of a routes file in blocks that only hold complete tags.
+
+    An uncompressed file is a single block (its memory-mapped or uploaded bytes, without copying).
+    A compressed file is decompressed as a stream, and every block is cut right before its last
+    "<", which cannot occur within a tag.
+
+    Yields
+    ------
+    tuple[int, bytes | memoryview]
+      The offset of the block in the (decompressed) file, and the block itself.
+    """
+    if detect_compression(source) is None:
+        with open_buffer(source) as buffer:
+            yield 0, buffer
+        return
+    offset, remainder = 0, b""
+    with open_binary(source) as rf:
+        while block := rf.read(INGEST_BLOCK_SIZE):
+            block = remainder + block
+            cut = max(block.rfind(b"<"), 0)
+            yield offset, block[:cut]
+            offset, remainder = offset + cut, block[cut:]
+    yield offset, remainder
+
+
+def _find_vehicle(source: os.PathLike | str | BinaryIO, vehicle_id: str) -> bytes:
+    """Find the first `<vehicle>` element with an ID by parsing the routes file, see `get_fragment`."""
+    with open_binary(source) as rf:
+        for _, vehicle in etree.iterparse(rf, events=("end",), tag="vehicle"):
+            if vehicle.get("id") == vehicle_id:
+                vehicle.tail = None
+                return etree.tostring(vehicle)
+            vehicle.clear(keep_tail=True)
+    raise KeyError(f"The routes file has no vehicle with ID {vehicle_id!r}!")
+
+
+class RoutesIndex:
+    """
+    The byte range of every `<vehicle>` element in a SUMO routes file.
+
+    Building the index takes a single pass over the raw bytes (without parsing the XML).
+    Afterwards, the routes of one vehicle are obtained by parsing only its own fragment.
+    If a vehicle ID occurs more than once (which SUMO does not allow), its first vehicle is kept.
+    """
+
+    def __init__(self, source: os.PathLike | str | BinaryIO):
+        """
+        Parameters
+        ----------
+        source
+          The path to the routes file, or an uploaded routes file. It may be compressed.
+        """
+        ids, starts, start_tag_ends, self_closing, end_tag_parts = [], [], [], [], []
+        for offset, block in _iter_blocks(source):
+            for match in VEHICLE_START_PATTERN.finditer(block):
+                vehicle_id = (match.group(1) or match.group(2) or b"").decode("utf-8")
+                ids.append(html.unescape(vehicle_id) if "&" in vehicle_id else vehicle_id)
+                starts.append(offset + match.start())
+                start_tag_ends.append(offset + match.end())
+                self_closing.append(match.group(3) == b"/")
+            end_tag_parts.append(
+                offset
+                + np.fromiter(
+                    (m.end() for m in re.finditer(re.escape(VEHICLE_END_TAG), block)),
+                    dtype=np.int64,
+                )
+            )
+        # A vehicle ends at the first end tag after its start tag (vehicles are never nested).
+        end_tags = np.concatenate(end_tag_parts)
+        self.starts = np.array(starts, dtype=np.int64)
+        start_tag_ends = np.array(start_tag_ends, dtype=np.int64)
+        end_positions = np.searchsorted(end_tags, start_tag_ends)
+        closing_ends = end_tags[np.minimum(end_positions, max(len(end_tags) - 1, 0))]
+        self.ends = np.where(np.array(self_closing, dtype=bool), start_tag_ends, closing_ends)
+        # A hash-based index, such that looking up a vehicle ID does not scan all IDs.
+        #  It must be unique, such that a lookup gives a single position.
+        vehicle_ids = pd.Index(ids, dtype=object)
+        is_first = ~vehicle_ids.duplicated(keep="first")
+        self.vehicle_ids = vehicle_ids[is_first]
+        self.starts = self.starts[is_first]
+        self.ends = self.ends[is_first]
+
+    def __len__(self) -> int:
+        return len(self.vehicle_ids)
+
+    def get_fragment(self, source: os.PathLike | str | BinaryIO, vehicle_id: str) -> bytes:
+        """
+        Read the raw XML of a single vehicle.
+
+        Parameters
+        ----------
+        source
+          The same routes file that the index was built from.
+        vehicle_id
+          The ID of the vehicle.
+
+        Returns
+        -------
+        bytes
+          The `<vehicle>` element of that vehicle (including its routes).
+
+        Raises
+        ------
+        KeyError
+          If the file has no vehicle with this ID.
+        """
+        vehicle_id = str(vehicle_id)
+        if vehicle_id not in self.vehicle_ids:
+            # E.g. a start tag that the index did not recognise, so parse the file after all.
+            return _find_vehicle(source, vehicle_id)
+        position = self.vehicle_ids.get_loc(vehicle_id)
+        start, end = int(self.starts[position]), int(self.ends[position])
+        if detect_compression(source) is not None:
+            # A compressed stream cannot seek, so the bytes before the vehicle are decompressed
+            #  (and discarded) block by block.
+            with open_binary(source) as rf:
+                skip = start
+                while skip > 0 and (block := rf.read(min(skip, INGEST_BLOCK_SIZE))):
+                    skip -= len(block)
+                return rf.read(end - start)
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, "rb") as rf:
+                rf.seek(start)
+                return rf.read(end - start)
+        with open_buffer(source) as buffer:
+            return bytes(buffer[start:end])
+
+    def get_routes(self, source: os.PathLike | str | BinaryIO, vehicle_id: str) -> pd.DataFrame:
+        """
+        Get all routes of a single vehicle, including alternatives that it was rerouted from.
+
+        Parameters
+        ----------
+        source
+          The same routes file that the index was built from.
+        vehicle_id
+          The ID of the vehicle.
+
+        Returns
+        -------
+        pd.DataFrame
+          One row per `<route>` element of the vehicle, with one column per route attribute.
+        """
+        vehicle = etree.fromstring(self.get_fragment(source, vehicle_id))
+        records = [dict(route.attrib) for route in vehicle.iter("route")]
+        return records_to_frame(records, numeric_columns=ROUTE_NUMERIC_COLUMNS)
+
+
+def load_cached_routes_index(
+    source: os.PathLike | str | BinaryIO, cache: DiskCache | None = None
+) -> RoutesIndex:
+    """
+    Load the RoutesIndex of a routes file from the DiskCache, or build (and cache) it if needed.
+
+    Parameters
+    ----------
+    source
+      The path to the routes file, or an uploaded routes file.
+    cache
+      The DiskCache to use, the default cache if None.
+
+    Returns
+    -------
+    RoutesIndex
+      The index of the vehicles in the file.
+    """
+    cache = get_default_cache() if cache is None else cache
+    return cache.load_or_build(
+        ROUTES_INDEX_KIND, get_artefact_key(source), lambda: RoutesIndex(source)
+    )
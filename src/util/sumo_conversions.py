@@ -1,21 +1,123 @@
 # Standard library.
 import csv
+import hashlib
+import io
 import json
 import os.path
 from collections import defaultdict
-from io import StringIO
+from collections.abc import Iterator, Mapping
 from textwrap import dedent
 from typing import TextIO
-from xml.dom import minidom
 
 # Dependencies
+import numpy as np
+import pandas as pd
+from lxml import etree
 from streamlit.runtime.uploaded_file_manager import UploadedFile
 
+# Local.
+from util.ingest import open_text
+
 # Custom types (to make the types also self-documenting).
 TAZ = int
 SOURCE_TAZ = TAZ
 TARGET_TAZ = TAZ
 
+# Amount of characters read at once by the bulk O/D parser (~16MB worth of rows per block).
+OD_BLOCK_SIZE = 1 << 24
+
+
+def _parse_od_block(block: str) -> np.ndarray:
+    """
+    Parse a block of whitespace-separated O/D rows into an int64 array with one row per line.
+
+    Parameters
+    ----------
+    block
+      Complete rows of an O/D-matrix body, in the `origin destination count` format.
+      Empty lines are skipped.
+
+    Returns
+    -------
+    np.ndarray
+      An int64 array of shape `(rows, 3)`.
+    """
+    if not block.strip():
+        return np.empty((0, 3), dtype=np.int64)
+    # Unlike a flat parse of all values, this keeps the line boundaries, so a row with a missing
+    #  value is not silently merged with the next one.
+    try:
+        rows = np.loadtxt(io.StringIO(block), dtype=np.int64, comments=None, ndmin=2)
+    except ValueError as e:
+        raise ValueError(f"Invalid data row in O/D matrix: {e}") from e
+    if rows.shape[1] != 3:
+        raise ValueError("Every data row in the O/D matrix should have exactly three values!")
+    return rows
+
+
+def parse_od_rows(
+    csv_rf: TextIO, block_size: int = OD_BLOCK_SIZE
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Read the body of an O/D matrix (the part after the header) into typed NumPy arrays.
+
+    The body is read in blocks of complete lines, and every block is parsed in one go.
+    This avoids creating Python objects for each individual value.
+
+    Parameters
+    ----------
+    csv_rf
+      A text stream that is positioned right after the 5-line header of the O/D matrix.
+    block_size
+      The amount of characters to read (and parse) at once.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray, np.ndarray]
+      Three int64 arrays of equal length: the origin TAZs, destination TAZs and the counts.
+    """
+    blocks: list[np.ndarray] = []
+    remainder = ""
+    while block := csv_rf.read(block_size):
+        block = remainder + block
+        # Only parse complete lines, keep the (partial) last line for the next block.
+        cut = block.rfind("\n") + 1
+        remainder = block[cut:]
+        blocks.append(_parse_od_block(block[:cut]))
+    if remainder.strip():
+        blocks.append(_parse_od_block(remainder))
+    rows = np.concatenate(blocks) if blocks else np.empty((0, 3), dtype=np.int64)
+    return rows[:, 0].copy(), rows[:, 1].copy(), rows[:, 2].copy()
+
+
+class ODCountsView(Mapping):
+    """
+    A read-only, dict-like view on the counts of an ODMatrix.
+
+    The keys are `(origin, destination)` tuples and the values are the trip counts,
+    such that callers that expect a `dict[tuple[SOURCE_TAZ, TARGET_TAZ], int]` keep working.
+    """
+
+    def __init__(self, od_matrix: "ODMatrix"):
+        self._od = od_matrix
+
+    def __getitem__(self, key: tuple[SOURCE_TAZ, TARGET_TAZ]) -> int:
+        origin, destination = key
+        position = self._od._find_pair(origin, destination)
+        if position is None:
+            raise KeyError(key)
+        return int(self._od.values[position])
+
+    def __iter__(self) -> Iterator[tuple[SOURCE_TAZ, TARGET_TAZ]]:
+        origins, destinations, _ = self._od.get_pairs()
+        return zip(origins.tolist(), destinations.tolist())
+
+    def __len__(self) -> int:
+        return self._od.get_row_count()
+
+    def values(self) -> list[int]:
+        return self._od.values.tolist()
+
 
 class ODMatrix:
     """Hold the properties of an OD-Matrix file."""
@@ -38,24 +140,107 @@ class ODMatrix:
     start: float | None = None
     end: float | None = None
     factor: float | None = None
-    counts: dict[tuple[SOURCE_TAZ, TARGET_TAZ], int] | None = None
+    # The counts are stored in a CSR-like sparse structure:
+    #  - `zones` holds the sorted TAZ IDs. The position of a TAZ in it is its dense index.
+    #  - The counts of the origin with dense index `i` are `values[indptr[i]:indptr[i + 1]]`,
+    #     with the (sorted) dense indices of their destinations in `indices[indptr[i]:indptr[i + 1]]`.
+    zones: np.ndarray | None = None
+    indptr: np.ndarray | None = None
+    indices: np.ndarray | None = None
+    values: np.ndarray | None = None
     # upscaling_factor: float | None = None
+    # Attributes that fully describe an O/D matrix, used for pickling and hashing.
+    STATE_FIELDS = ("file_header", "start", "end", "factor", "zones", "indptr", "indices", "values")
+    _content_hash: str | None = None
 
     def __init__(self):
         pass
 
-    def load_from_filepath(self, filepath: os.PathLike | str):
+    def __getstate__(self) -> dict:
+        """Pickle only the header fields and the sparse arrays (which pickle as raw buffers)."""
+        state = {field: getattr(self, field) for field in self.STATE_FIELDS}
+        # Keep the content hash, which may be the hash of the file rather than of the arrays.
+        state["_content_hash"] = self._content_hash
+        return state
+
+    def __setstate__(self, state: dict):
+        # Needed because `__dict__` is overridden, so the default unpickling cannot be used.
+        for field in self.STATE_FIELDS:
+            setattr(self, field, state[field])
+        self._content_hash = state.get("_content_hash")
+
+    def __hash__(self) -> int:
+        return int(self.content_hash()[:16], 16)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, ODMatrix):
+            return NotImplemented
+        return self.content_hash() == other.content_hash()
+
+    def content_hash(self) -> str:
+        """
+        Get a hash of the contents of the O/D matrix, which can be used as a cache key.
+
+        Returns
+        -------
+        str
+          A hexadecimal BLAKE2b digest of the header fields and the counts.
+        """
+        if self._content_hash is None:
+            hasher = hashlib.blake2b(digest_size=20)
+            hasher.update(repr((self.file_header, self.start, self.end, self.factor)).encode())
+            for array in (self.zones, self.indptr, self.indices, self.values):
+                hasher.update(np.ascontiguousarray(array).data)
+            self._content_hash = hasher.hexdigest()
+        return self._content_hash
+
+    def set_content_hash(self, content_hash: str):
+        """
+        Use an already known hash as the content hash, rather than hashing the arrays again.
+
+        Parameters
+        ----------
+        content_hash
+          A hash that identifies the contents, e.g. the content hash of the file it was read from.
+          It is reset once the counts change.
+        """
+        self._content_hash = content_hash
+
+    @property
+    def nbytes(self) -> int:
+        """The amount of memory taken by the sparse arrays, in bytes."""
+        return sum(a.nbytes for a in (self.zones, self.indptr, self.indices, self.values))
+
+    def load_from_filepath(self, filepath: os.PathLike | str, bulk: bool = True):
         assert os.path.exists(filepath)
-        # csv_rf: TextIO
-        with open(filepath, "r", newline="", encoding="utf8") as csv_rf:
-            self.read_matrix(csv_rf)
+        with open_text(filepath) as csv_rf:
+            self.read_matrix(csv_rf, bulk=bulk)
 
-    def load_from_streamlit_file(self, uploaded_file: UploadedFile):
-        string_io = StringIO(uploaded_file.getvalue().decode("utf-8"))
-        self.read_matrix(string_io)
+    def load_from_streamlit_file(self, uploaded_file: UploadedFile, bulk: bool = True):
+        # The upload is decoded block by block, rather than into one big string.
+        with open_text(uploaded_file) as csv_rf:
+            self.read_matrix(csv_rf, bulk=bulk)
 
-    def read_matrix(self, csv_rf: TextIO | StringIO):
-        """Read the OD-Matrices as provided by SUMO"""
+    def read_matrix(self, csv_rf: TextIO, bulk: bool = True):
+        """
+        Read the OD-Matrices as provided by SUMO
+
+        Parameters
+        ----------
+        csv_rf
+          The text stream of the O/D matrix file.
+        bulk
+          If True, parse all data rows in one pass into NumPy arrays (see `parse_od_rows`).
+          Otherwise, parse the data rows one by one. Both modes give the same result.
+        """
+        self._read_header(csv_rf)
+        if bulk:
+            self.set_counts(*parse_od_rows(csv_rf))
+        else:
+            self._read_rows(csv_rf)
+
+    def _read_header(self, csv_rf: TextIO):
+        """Read the 5 header lines of the OD-Matrix, which contain the time frame and factor."""
         # First 5 lines are header-like.
         self.file_header = csv_rf.readline().rstrip("\n")
         csv_rf.readline()  # "From-time, to-time", ignore input.
@@ -68,6 +253,9 @@ class ODMatrix:
         # Finally, we store the factor.
         line_5 = csv_rf.readline()
         self.factor = float(line_5)
+
+    def _read_rows(self, csv_rf: TextIO):
+        """Read the data rows of the OD-Matrix one by one."""
         # Now that the "header bit" is done, read the rest of the rows in a csv-like manner.
         result_dict: dict[(int, int), int] = {}
         csv_reader = csv.reader(csv_rf, delimiter=" ")
@@ -77,14 +265,135 @@ class ODMatrix:
             target = int(_target)
             count = int(_count)
             result_dict[(source, target)] = count
-        # Finally, after all rows are read, assign result dict to counts.
-        self.counts = result_dict
+        # Finally, after all rows are read, store the result dict as counts.
+        pair_count = len(result_dict)
+        self.set_counts(
+            np.fromiter((o for o, _ in result_dict.keys()), dtype=np.int64, count=pair_count),
+            np.fromiter((d for _, d in result_dict.keys()), dtype=np.int64, count=pair_count),
+            np.fromiter(result_dict.values(), dtype=np.int64, count=pair_count),
+        )
+
+    def set_counts(self, origins: np.ndarray, destinations: np.ndarray, counts: np.ndarray):
+        """
+        Store the counts of (origin, destination) pairs in the sparse structure.
+
+        Parameters
+        ----------
+        origins
+          The origin TAZ of each row.
+        destinations
+          The destination TAZ of each row.
+        counts
+          The trip count of each row. If a pair occurs more than once, the last row is kept
+          (just like assigning the rows to a dict one by one).
+        """
+        self._content_hash = None
+        self.zones = np.unique(np.concatenate([origins, destinations])).astype(np.int64)
+        zone_count = len(self.zones)
+        index_type = np.int32 if zone_count < np.iinfo(np.int32).max else np.int64
+        origin_idx = np.searchsorted(self.zones, origins)
+        destination_idx = np.searchsorted(self.zones, destinations)
+        # Sort the rows by (origin, destination), and only keep the last row of duplicate pairs.
+        flat_idx = origin_idx.astype(np.int64) * zone_count + destination_idx
+        order = np.argsort(flat_idx, kind="stable")
+        sorted_idx = flat_idx[order]
+        is_last = np.ones(len(order), dtype=bool)
+        is_last[:-1] = sorted_idx[1:] != sorted_idx[:-1]
+        order = order[is_last]
+        self.indices = destination_idx[order].astype(index_type)
+        self.values = np.asarray(counts, dtype=np.int64)[order]
+        row_lengths = np.bincount(origin_idx[order], minlength=zone_count)
+        self.indptr = np.concatenate([[0], np.cumsum(row_lengths)]).astype(np.int64)
+
+    @property
+    def counts(self) -> ODCountsView:
+        """A read-only dict-like view of the counts, keyed by (origin, destination)."""
+        return ODCountsView(self)
+
+    def _origin_indices(self) -> np.ndarray:
+        """Get the dense origin index of each stored pair (i.e. expand `indptr`)."""
+        return np.repeat(np.arange(len(self.zones)), np.diff(self.indptr))
+
+    def _find_pair(self, origin: SOURCE_TAZ, destination: TARGET_TAZ) -> int | None:
+        """Get the position of a pair in `indices` and `values`, or None if it does not exist."""
+        origin_pos = np.searchsorted(self.zones, origin)
+        destination_pos = np.searchsorted(self.zones, destination)
+        zone_count = len(self.zones)
+        if origin_pos == zone_count or self.zones[origin_pos] != origin:
+            return None
+        if destination_pos == zone_count or self.zones[destination_pos] != destination:
+            return None
+        row_start, row_end = self.indptr[origin_pos], self.indptr[origin_pos + 1]
+        position = row_start + np.searchsorted(self.indices[row_start:row_end], destination_pos)
+        if position == row_end or self.indices[position] != destination_pos:
+            return None
+        return int(position)
+
+    def get_pairs(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Get all stored pairs as columns.
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray, np.ndarray]
+          The origin TAZs, destination TAZs and counts, sorted by origin and then destination.
+        """
+        return self.zones[self._origin_indices()], self.zones[self.indices], self.values
+
+    def get_count(self, origin: SOURCE_TAZ, destination: TARGET_TAZ) -> int:
+        """Get the amount of trips from `origin` to `destination` (0 if the pair is absent)."""
+        position = self._find_pair(origin, destination)
+        return 0 if position is None else int(self.values[position])
 
     def get_row_count(self) -> int:
-        return len(self.counts)
+        return len(self.values)
 
     def get_movement_count(self) -> int:
-        return sum(self.counts.values())
+        return int(self.values.sum())
+
+    def get_origin_totals(self) -> pd.Series:
+        """Get the amount of trips departing from each TAZ (the row sums), indexed by TAZ."""
+        totals = np.bincount(self._origin_indices(), weights=self.values, minlength=len(self.zones))
+        return pd.Series(
+            totals.astype(np.int64), index=pd.Index(self.zones, name="TAZ"), name="Origin count"
+        )
+
+    def get_destination_totals(self) -> pd.Series:
+        """Get the amount of trips arriving at each TAZ (the column sums), indexed by TAZ."""
+        totals = np.bincount(self.indices, weights=self.values, minlength=len(self.zones))
+        return pd.Series(
+            totals.astype(np.int64),
+            index=pd.Index(self.zones, name="TAZ"),
+            name="Destination count",
+        )
+
+    def get_top_pairs(self, k: int = 10) -> pd.DataFrame:
+        """
+        Get the `k` origin-destination pairs with the most trips.
+
+        Parameters
+        ----------
+        k
+          The amount of pairs to return.
+
+        Returns
+        -------
+        pd.DataFrame
+          The pairs in descending order of trip count.
+          Columns: "Origin TAZ", "Destination TAZ" and "Trip count".
+        """
+        k = min(k, self.get_row_count())
+        # argpartition finds the k largest values without sorting all of them.
+        top = np.argpartition(-self.values, k - 1)[:k] if k else np.empty(0, dtype=np.int64)
+        top = top[np.argsort(-self.values[top], kind="stable")]
+        origin_idx = np.searchsorted(self.indptr, top, side="right") - 1
+        return pd.DataFrame(
+            {
+                "Origin TAZ": self.zones[origin_idx],
+                "Destination TAZ": self.zones[self.indices[top]],
+                "Trip count": self.values[top],
+            }
+        )
 
     def __str__(self) -> str:
         """Read the class info"""
@@ -98,7 +407,7 @@ class ODMatrix:
         )
 
     def __dict__(self) -> dict[tuple[SOURCE_TAZ, TARGET_TAZ], int]:
-        return self.counts
+        return dict(self.counts)
 
     def to_json(self) -> str:
         """Convert the OD-Matrix into a json for easy further processing
@@ -145,7 +454,7 @@ class ODMatrix:
         # (2) Convert counts to json-friendly format. Reason: json does not support tuple keys.
         # Format: {origin: {destination: count}}
         json_od_counts: dict[SOURCE_TAZ, dict[TARGET_TAZ, int]] = defaultdict(dict)
-        for (origin, destination), count in self.counts.items():
+        for origin, destination, count in zip(*(column.tolist() for column in self.get_pairs())):
             json_od_counts[origin][destination] = count
         # (3) Add OD counts to base dict, and return that.
         json_base_dict["od_matrix"] = json_od_counts
@@ -153,7 +462,9 @@ class ODMatrix:
 
 
 class Trip:
-    """Wrapper around trip"""
+    """Wrapper around trip. Uses `__slots__`, such that each instance has no `__dict__`."""
+
+    __slots__ = ("id", "depart_stamp", "source_str", "target_str", "source_taz", "target_taz")
 
     PRINT_FORMAT = dedent(
         """
@@ -184,14 +495,14 @@ class Trip:
         """Get a string representation of a trip"""
         return self.PRINT_FORMAT.format(
             trip_id=self.id,
-            s=self.source_taz,
+            s=self.source_str,
             t=self.target_str,
             s_taz=self.source_taz,
             t_taz=self.target_taz,
             depart=self.depart_stamp,
         )
 
-    def __dict__(self) -> dict[str, str | int | float]:
+    def to_dict(self) -> dict[str, str | int | float]:
         """Represent the trip in a dict"""
         return {
             "id": self.id,
@@ -204,20 +515,21 @@ class Trip:
 
     def to_json(self) -> str:
         """Represent the trip in json"""
-        dict_rep = self.__dict__()
+        dict_rep = self.to_dict()
         return json.dumps(dict_rep, indent=2)
 
     @classmethod
-    def from_xml_element(cls, trip: minidom.Element):
-        _id = trip.attributes["id"].value
+    def from_xml_element(cls, trip: etree._Element):
+        """Create a trip from a `<trip>` element, e.g. as yielded by `etree.iterparse`"""
+        _id = trip.get("id")
         trip_id = _id
-        _depart = trip.attributes["depart"].value
+        _depart = trip.get("depart")
         stamp = float(_depart)
-        _from = trip.attributes["from"].value
-        _to = trip.attributes["to"].value
-        _fromtaz = trip.attributes["fromTaz"].value
+        _from = trip.get("from")
+        _to = trip.get("to")
+        _fromtaz = trip.get("fromTaz")
         from_taz = int(_fromtaz)
-        _totaz = trip.attributes["toTaz"].value
+        _totaz = trip.get("toTaz")
         to_taz = int(_totaz)
         return cls(trip_id, stamp, _from, _to, from_taz, to_taz)
 
@@ -226,22 +538,15 @@ class Trip:
 def read_trips_xml(demo_data_dir: os.PathLike | str):
     trips_fp = os.path.join(demo_data_dir, "xml_files", "trips.trips.xml")
 
-    print("parsing xml...")
-    xml_obj: minidom.Document = minidom.parse(trips_fp)
-    # print(type(xml_obj))
-    trip: minidom.Element
+    print("parsing and processing trip data...")
+    # Parse the xml incrementally, such that only the first trips are ever read.
+    trip: etree._Element
     n: int = 0
-    print("processing trip data...")
-    for trip in xml_obj.getElementsByTagName("trip"):
-        # print(type(trip))
-        # print("---")
+    for _, trip in etree.iterparse(trips_fp, events=("end",), tag="trip"):
         trip_obj = Trip.from_xml_element(trip)
         print(trip_obj)
         print(trip_obj.to_json())
-        # print(dir(trip.attributes))
-        # print(type(trip.attributes))
-        # print(trip.attributes["to"].value)
-        # print(trip.attributes["toTaz"].value)
+        trip.clear(keep_tail=True)
         n += 1
         if n == 10:
             break
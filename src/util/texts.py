@@ -1,6 +1,7 @@
 # Emoji.
 INFO_ICON = "ℹ️"  # :information_source:
 WARNING_ICON = "⚠️"  # :warning:
+ERROR_ICON = "🚨"  # :rotating_light:
 
 # Information at the start of each page.
 ABOUT_HOMEPAGE = """
@@ -64,7 +65,7 @@ ABOUT_CONGESTION_PAGE = """
     On this page, you can visualise congestion using several metrics across a timespan.
     For that, you need only two files:
     1. A `.geojson` file of the network which is visualised;  
-    2. A `.csv` file data about the edges in the network.
+    2. A `.csv` or SUMO edge data `.xml` file with data about the edges in the network.
     
     After uploading the files, you can then choose which metric you wish to visualise.
     Whether it is average speed or the lane density, 
@@ -79,7 +80,7 @@ ABOUT_INSPECTION_PAGE = """
 
 # Other notices.
 UPLOAD_INFO = """
-    Below, you can upload the files you want to visualise.
+    Below, you can upload the files you want to visualise. They may be compressed (e.g. `.xml.gz`).
     If you're just here for a demonstration, check the following box.
 """
 
@@ -91,7 +92,10 @@ UPLOAD_INFO_OD = """
 """
 
 
-XML_SLOW_INFO = "It may take a while for the XML data to load (due to parsing). Just be patient!"
+XML_SLOW_INFO = (
+    "It may take a while for the XML data to load (due to parsing). "
+    "Large files are read in chunks, so they do not need to fit in memory several times over."
+)
 
 KEPLER_WORKAROUND = """
     To give the edges the colour based on your filters, please do the following:
@@ -103,3 +107,14 @@ KEPLER_WORKAROUND = """
     
     Due to a Kepler limitation, this can currently not be automated.
 """
+
+SIMPLIFIED_MAP_INFO = (
+    "This network is large, so the map shows a simplified version of it "
+    "(with a tolerance of {tolerance:g}m). The data itself is not affected."
+)
+
+TILES_MISSING_INFO = (
+    "Tip: for very large files, export them to vector tiles with "
+    "`python ./src/export_tiles.py <file or folder>`. "
+    "This page can then show the file while only loading the visible part of the map."
+)
@@ -0,0 +1,268 @@
+# Standard library.
+import math
+import os
+from typing import BinaryIO
+
+# Dependencies.
+import numpy as np
+import pandas as pd
+
+# Local.
+from util.disk_cache import DiskCache, get_artefact_key, get_default_cache
+from util.sumo_conversions import ODMatrix
+
+# The width of the departure time bins, in seconds. Hours (the O/D matrix periods) are whole bins.
+TRIP_BIN_SECONDS = 900.0
+# The amount of seconds in an O/D matrix time unit (its start and end are given in hours).
+OD_TIME_UNIT = 3600.0
+# Up to this amount of cells, the cube is counted densely with `np.bincount` (int64, so 128 MB).
+DENSE_CUBE_MAX_CELLS = 16_000_000
+# The kind of the TripCube artefacts in the DiskCache.
+TRIP_CUBE_KIND = "trip_cube-v1"
+
+
+class TripCube:
+    """
+    The amount of trips per origin, destination and departure time bin, counted in a single pass.
+
+    The TAZs are integer-coded: their dense index is their position in the sorted `zones`.
+    Only the non-zero cells are stored, as COO columns sorted by (time bin, origin, destination).
+    Time bin `i` holds the trips that depart in `[bin_starts[i], bin_starts[i] + bin_seconds)`.
+    """
+
+    def __init__(
+        self,
+        trips_df: pd.DataFrame,
+        bin_seconds: float = TRIP_BIN_SECONDS,
+        origin_column: str = "fromTaz",
+        destination_column: str = "toTaz",
+    ):
+        """
+        Parameters
+        ----------
+        trips_df
+          The trips, with a `depart` column (in seconds) and the origin and destination TAZs.
+          Trips without a departure time or TAZ are not counted.
+        bin_seconds
+          The width of the departure time bins, in seconds. Bins start at multiples of it.
+        origin_column
+          The column with the origin TAZ of each trip.
+        destination_column
+          The column with the destination TAZ of each trip.
+        """
+        self.bin_seconds = bin_seconds
+        self.origin_column = origin_column
+        self.destination_column = destination_column
+        is_complete = trips_df[["depart", origin_column, destination_column]].notna().all(axis=1)
+        trips = trips_df[is_complete.to_numpy()]
+        departs = trips["depart"].to_numpy(dtype=np.float64)
+        origins = trips[origin_column].to_numpy()
+        destinations = trips[destination_column].to_numpy()
+        self.first_depart = float(departs.min()) if len(departs) > 0 else math.nan
+        self.last_depart = float(departs.max()) if len(departs) > 0 else math.nan
+
+        self.zones = np.unique(np.concatenate([origins, destinations]))
+        zone_count = len(self.zones)
+        origin_idx = np.searchsorted(self.zones, origins)
+        destination_idx = np.searchsorted(self.zones, destinations)
+        time_bins = np.floor(departs / bin_seconds).astype(np.int64)
+        self.first_bin = int(time_bins.min()) if len(time_bins) > 0 else 0
+        bin_count = int(time_bins.max()) - self.first_bin + 1 if len(time_bins) > 0 else 0
+
+        # Count every (time bin, origin, destination) cell at once, on its flattened index.
+        flat = (time_bins - self.first_bin) * zone_count + origin_idx
+        flat = flat * zone_count + destination_idx
+        cell_count = bin_count * zone_count**2
+        if cell_count <= DENSE_CUBE_MAX_CELLS:
+            dense = np.bincount(flat, minlength=cell_count)
+            keys = np.flatnonzero(dense)
+            values = dense[keys]
+        else:  # Too many (mostly empty) cells, so only count the ones that occur.
+            keys, values = np.unique(flat, return_counts=True)
+        time_idx, pair_keys = np.divmod(keys, max(zone_count, 1) ** 2)
+        origin_keys, destination_keys = np.divmod(pair_keys, max(zone_count, 1))
+        index_type = np.int32 if zone_count < np.iinfo(np.int32).max else np.int64
+        self.time_idx = time_idx.astype(np.int32)
+        self.origin_idx = origin_keys.astype(index_type)
+        self.destination_idx = destination_keys.astype(index_type)
+        self.values = values.astype(np.int64)
+        self.bin_starts = (np.arange(bin_count) + self.first_bin) * bin_seconds
+
+    @property
+    def nbytes(self) -> int:
+        """The amount of memory taken by the cube, in bytes."""
+        arrays = (self.zones, self.time_idx, self.origin_idx, self.destination_idx, self.values)
+        return sum(a.nbytes for a in arrays)
+
+    @property
+    def trip_count(self) -> int:
+        return int(self.values.sum())
+
+    def get_covering_period(self, start: float, end: float) -> tuple[float, float]:
+        """
+        Widen a period to the edges of the time bins that it (partially) covers.
+
+        Parameters
+        ----------
+        start
+          The start of the period, in seconds.
+        end
+          The end of the period, in seconds.
+
+        Returns
+        -------
+        tuple[float, float]
+          The start of the first bin and the end of the last bin (equal to the period if both
+          are bin edges already).
+        """
+        # The tolerance keeps e.g. 1.25 hours (4500.000000000001 seconds) on its bin edge.
+        first_bin = math.floor(start / self.bin_seconds + 1e-9)
+        end_bin = math.ceil(end / self.bin_seconds - 1e-9)
+        return first_bin * self.bin_seconds, max(end_bin, first_bin) * self.bin_seconds
+
+    def is_aligned(self, start: float, end: float) -> bool:
+        """Get whether both ends of a period (in seconds) are edges of the time bins."""
+        covering = self.get_covering_period(start, end)
+        return all(math.isclose(a, b) for a, b in zip(covering, (start, end)))
+
+    def _time_mask(self, start: float | None, end: float | None) -> np.ndarray:
+        """Get which cells lie in the bins that cover `[start, end)` (in seconds)."""
+        if start is not None:
+            start = self.get_covering_period(start, start)[0]
+        if end is not None:
+            end = self.get_covering_period(end, end)[1]
+        bin_starts = self.bin_starts[self.time_idx]
+        mask = np.ones(len(self.values), dtype=bool)
+        if start is not None:
+            mask &= bin_starts >= start - self.bin_seconds / 2
+        if end is not None:
+            mask &= bin_starts < end - self.bin_seconds / 2
+        return mask
+
+    def _get_zone_counts(
+        self, zone_idx: np.ndarray, name: str, start: float | None, end: float | None
+    ) -> pd.Series:
+        mask = self._time_mask(start, end)
+        totals = np.bincount(zone_idx[mask], weights=self.values[mask], minlength=len(self.zones))
+        totals = totals.astype(np.int64)
+        is_used = totals > 0
+        counts = pd.Series(
+            totals[is_used], index=pd.Index(self.zones[is_used], name=name), name="count"
+        )
+        # Like `value_counts`: the busiest TAZ first.
+        return counts.sort_values(ascending=False, kind="stable")
+
+    def get_origin_counts(self, start: float | None = None, end: float | None = None) -> pd.Series:
+        """
+        Get the amount of trips that start in each TAZ, like `trips_df.fromTaz.value_counts()`.
+
+        Parameters
+        ----------
+        start
+          Only count the trips that depart from this time on, in seconds.
+        end
+          Only count the trips that depart before this time, in seconds.
+          Bins that are only partially in `[start, end)` are counted entirely,
+          see `get_covering_period`.
+
+        Returns
+        -------
+        pd.Series
+          The trip count of each TAZ with at least one trip, indexed by TAZ, highest count first.
+        """
+        return self._get_zone_counts(self.origin_idx, self.origin_column, start, end)
+
+    def get_destination_counts(
+        self, start: float | None = None, end: float | None = None
+    ) -> pd.Series:
+        """Get the amount of trips that end in each TAZ. See `get_origin_counts`."""
+        return self._get_zone_counts(self.destination_idx, self.destination_column, start, end)
+
+    def get_origin_zone_count(self) -> int:
+        """Get the amount of TAZs in which at least one trip starts."""
+        return len(np.unique(self.origin_idx))
+
+    def get_destination_zone_count(self) -> int:
+        """Get the amount of TAZs in which at least one trip ends."""
+        return len(np.unique(self.destination_idx))
+
+    def get_bin_totals(self) -> pd.Series:
+        """Get the amount of trips that depart in each time bin, indexed by its start (seconds)."""
+        totals = np.bincount(self.time_idx, weights=self.values, minlength=len(self.bin_starts))
+        return pd.Series(
+            totals.astype(np.int64), index=pd.Index(self.bin_starts, name="depart"), name="count"
+        )
+
+    def reconcile(self, od_matrix: ODMatrix) -> pd.DataFrame:
+        """
+        Compare the trips with the O/D matrix of the same period, per O/D pair.
+
+        Parameters
+        ----------
+        od_matrix
+          The O/D matrix. If its start and end (in hours) are not edges of the time bins,
+          the trips of all bins that it partially covers are compared, see `get_covering_period`.
+
+        Returns
+        -------
+        pd.DataFrame
+          One row per pair that occurs in either the matrix or the trips of its period, sorted by
+          the absolute difference. Columns: "Origin TAZ", "Destination TAZ", "Matrix count"
+          (scaled by the matrix' factor), "Trip count" and "Difference" (trips - matrix).
+        """
+        mask = self._time_mask(od_matrix.start * OD_TIME_UNIT, od_matrix.end * OD_TIME_UNIT)
+        matrix_origins, matrix_destinations, matrix_values = od_matrix.get_pairs()
+        # Re-code the TAZs of both onto one shared zone index, and the pairs onto flat keys.
+        zones = np.union1d(self.zones, od_matrix.zones)
+        zone_count = len(zones)
+        zone_map = np.searchsorted(zones, self.zones)
+        trip_keys = zone_map[self.origin_idx[mask]].astype(np.int64) * zone_count
+        trip_keys += zone_map[self.destination_idx[mask]]
+        matrix_keys = np.searchsorted(zones, matrix_origins).astype(np.int64) * zone_count
+        matrix_keys += np.searchsorted(zones, matrix_destinations)
+
+        keys, inverse = np.unique(np.concatenate([trip_keys, matrix_keys]), return_inverse=True)
+        trip_counts = np.bincount(
+            inverse[: len(trip_keys)], weights=self.values[mask], minlength=len(keys)
+        )
+        matrix_counts = np.bincount(
+            inverse[len(trip_keys) :], weights=matrix_values * od_matrix.factor, minlength=len(keys)
+        )
+        difference = trip_counts - matrix_counts
+        order = np.argsort(-np.abs(difference), kind="stable")
+        origins, destinations = np.divmod(keys[order], max(zone_count, 1))
+        return pd.DataFrame(
+            {
+                "Origin TAZ": zones[origins],
+                "Destination TAZ": zones[destinations],
+                "Matrix count": matrix_counts[order],
+                "Trip count": trip_counts[order].astype(np.int64),
+                "Difference": difference[order],
+            }
+        )
+
+
+def load_cached_trip_cube(
+    source: os.PathLike | str | BinaryIO, cache: DiskCache | None = None
+) -> TripCube:
+    """
+    Load the TripCube of a trips file from the DiskCache, or build (and cache) it if needed.
+
+    Parameters
+    ----------
+    source
+      The path to the trips file, or an uploaded trips file.
+    cache
+      The DiskCache to use, the default cache if None.
+
+    Returns
+    -------
+    TripCube
+      The trip counts of the file.
+    """
+    cache = get_default_cache() if cache is None else cache
+    return cache.load_or_build(
+        TRIP_CUBE_KIND,
+        get_artefact_key(source),
+        lambda: TripCube(cache.load_or_parse(source, "trips-v2")),
+    )
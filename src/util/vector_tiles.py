@@ -0,0 +1,465 @@
+# Standard library.
+import json
+import math
+import os
+import struct
+from collections.abc import Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, BinaryIO
+
+# Dependencies.
+import numpy as np
+import shapely
+
+# Local.
+from util.caching import hash_source
+from util.ingest import read_geo_file
+
+# Streamlit serves the `static` folder next to `Home.py` under "app/static" (see `.streamlit`).
+DEFAULT_TILE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static", "tiles")
+TILE_URL_PREFIX = "./app/static/tiles"
+TILEJSON_NAME = "tiles.json"
+# The coordinate range of a tile, and the margin (in tile coordinates) around it.
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+# Half the width of the (square) Web Mercator world, in metres.
+MERCATOR_HALF_WIDTH = 20037508.342789244
+# The amount of tiles that a worker process creates per task.
+TILES_PER_TASK = 256
+
+# Mapbox vector tile geometry types and commands, see https://github.com/mapbox/vector-tile-spec.
+_GEOM_TYPES = {"Point": 1, "LineString": 2, "Polygon": 3}
+_MOVE_TO, _LINE_TO, _CLOSE_PATH = 1, 2, 7
+
+
+# Protocol buffer encoding (only what is needed for vector tiles).
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) if value >= 0 else ((-value) << 1) - 1
+
+
+def _key(field_number: int, wire_type: int) -> bytes:
+    return _varint((field_number << 3) | wire_type)
+
+
+def _message(field_number: int, payload: bytes) -> bytes:
+    """A length-delimited field (a string, bytes, an embedded message or a packed array)."""
+    return _key(field_number, 2) + _varint(len(payload)) + payload
+
+
+def _packed(field_number: int, values: Sequence[int]) -> bytes:
+    return _message(field_number, b"".join(_varint(v) for v in values))
+
+
+def _encode_value(value: Any) -> bytes:
+    """Encode a property value as a `Tile.Value` message."""
+    if isinstance(value, bool):
+        return _key(7, 0) + _varint(int(value))
+    if isinstance(value, int):
+        return _key(6, 0) + _varint(_zigzag(value))
+    if isinstance(value, float):
+        return _key(3, 1) + struct.pack("<d", value)
+    return _message(1, str(value).encode("utf-8"))
+
+
+# Geometry encoding.
+def _command(command_id: int, count: int) -> int:
+    return (command_id & 0x7) | (count << 3)
+
+
+def _dedupe(coords: np.ndarray) -> np.ndarray:
+    """Remove consecutive duplicate points, which appear after rounding to tile coordinates."""
+    if len(coords) < 2:
+        return coords
+    keep = np.ones(len(coords), dtype=bool)
+    keep[1:] = np.any(coords[1:] != coords[:-1], axis=1)
+    return coords[keep]
+
+
+def _signed_area(ring: np.ndarray) -> float:
+    """The surveyor's formula, in tile coordinates (so with the y-axis pointing down)."""
+    x, y = ring[:, 0], ring[:, 1]
+    return float(np.sum(x * np.roll(y, -1) - np.roll(x, -1) * y)) / 2
+
+
+class _GeometryEncoder:
+    """Encodes the parts of a single feature, keeping track of the (relative) cursor position."""
+
+    def __init__(self):
+        self.commands: list[int] = []
+        self.cursor = (0, 0)
+
+    def add_points(self, coords: np.ndarray, command_id: int):
+        self.commands.append(_command(command_id, len(coords)))
+        for x, y in coords.tolist():
+            self.commands.append(_zigzag(x - self.cursor[0]))
+            self.commands.append(_zigzag(y - self.cursor[1]))
+            self.cursor = (x, y)
+
+    def add_line(self, coords: np.ndarray):
+        coords = _dedupe(coords)
+        if len(coords) < 2:
+            return
+        self.add_points(coords[:1], _MOVE_TO)
+        self.add_points(coords[1:], _LINE_TO)
+
+    def add_ring(self, coords: np.ndarray, exterior: bool) -> bool:
+        coords = _dedupe(coords[:-1])  # The closing point is implied by ClosePath.
+        area = _signed_area(coords) if len(coords) >= 3 else 0
+        if area == 0:
+            return False  # Collapsed at this zoom level.
+        if (
+            area > 0
+        ) != exterior:  # Exterior rings are clockwise, interior rings counter-clockwise.
+            coords = coords[::-1]
+        self.add_points(coords[:1], _MOVE_TO)
+        self.add_points(coords[1:], _LINE_TO)
+        self.commands.append(_command(_CLOSE_PATH, 1))
+        return True
+
+
+def _encode_geometry(geometry: shapely.Geometry) -> tuple[int, list[int]] | None:
+    """
+    Encode a geometry that is already in (integer) tile coordinates.
+
+    Returns
+    -------
+    tuple[int, list[int]] | None
+      The vector tile geometry type and commands, or None if nothing is left of the geometry.
+    """
+    parts = shapely.get_parts(geometry)
+    if len(parts) == 0:
+        return None
+    geom_type = parts[0].geom_type
+    encoder = _GeometryEncoder()
+    if geom_type == "Point":
+        encoder.add_points(shapely.get_coordinates(parts).astype(np.int64), _MOVE_TO)
+    elif geom_type == "LineString":
+        for part in parts:
+            encoder.add_line(shapely.get_coordinates(part).astype(np.int64))
+    elif geom_type == "Polygon":
+        for part in parts:
+            exterior = shapely.get_coordinates(part.exterior).astype(np.int64)
+            if encoder.add_ring(exterior, exterior=True):
+                for interior in part.interiors:
+                    coords = shapely.get_coordinates(interior).astype(np.int64)
+                    encoder.add_ring(coords, exterior=False)
+    else:
+        return None
+    if not encoder.commands:
+        return None
+    return _GEOM_TYPES[geom_type], encoder.commands
+
+
+def encode_tile(
+    layer_name: str, geometries: Sequence[shapely.Geometry], properties: Sequence[dict[str, Any]]
+) -> bytes:
+    """
+    Encode a single-layer Mapbox vector tile.
+
+    Parameters
+    ----------
+    layer_name
+      The name of the layer in the tile.
+    geometries
+      The geometry of each feature, in tile coordinates (0 to `TILE_EXTENT`, y pointing down).
+    properties
+      The properties of each feature.
+
+    Returns
+    -------
+    bytes
+      The (uncompressed) tile.
+    """
+    keys: dict[str, int] = {}
+    values: dict[tuple[type, Any], int] = {}
+    features = []
+    for geometry, feature_properties in zip(geometries, properties):
+        encoded = _encode_geometry(geometry)
+        if encoded is None:
+            continue
+        geom_type, commands = encoded
+        tags = []
+        for key, value in feature_properties.items():
+            if value is None or value != value:  # Leave out missing values (and NaN).
+                continue
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault((type(value), value), len(values)))
+        features.append(_packed(2, tags) + _key(3, 0) + _varint(geom_type) + _packed(4, commands))
+    if not features:
+        return b""
+    layer = (
+        _key(15, 0)
+        + _varint(2)  # Version 2 of the specification.
+        + _message(1, layer_name.encode("utf-8"))
+        + b"".join(_message(2, feature) for feature in features)
+        + b"".join(_message(3, key.encode("utf-8")) for key in keys)
+        + b"".join(_message(4, _encode_value(value)) for _, value in values)
+        + _key(5, 0)
+        + _varint(TILE_EXTENT)
+    )
+    return _message(3, layer)
+
+
+# Tiling.
+def get_tile_bounds(z: int, x: int, y: int) -> tuple[float, float, float, float]:
+    """Get the Web Mercator bounds (xmin, ymin, xmax, ymax) of an XYZ tile."""
+    size = 2 * MERCATOR_HALF_WIDTH / 2**z
+    xmin = -MERCATOR_HALF_WIDTH + x * size
+    ymax = MERCATOR_HALF_WIDTH - y * size
+    return xmin, ymax - size, xmin + size, ymax
+
+
+def iter_tiles(bounds: np.ndarray, z: int) -> Iterator[tuple[int, int]]:
+    """
+    Iterate over the tiles of a zoom level that intersect the bounds of at least one feature.
+
+    Parameters
+    ----------
+    bounds
+      The Web Mercator bounds of each feature, as an (n x 4) array of (xmin, ymin, xmax, ymax).
+    z
+      The zoom level.
+
+    Yields
+    ------
+    tuple[int, int]
+      The x and y of each tile.
+    """
+    size = 2 * MERCATOR_HALF_WIDTH / 2**z
+    max_index = 2**z - 1
+    x_ranges = np.clip((bounds[:, [0, 2]] + MERCATOR_HALF_WIDTH) // size, 0, max_index)
+    y_ranges = np.clip((MERCATOR_HALF_WIDTH - bounds[:, [3, 1]]) // size, 0, max_index)
+    tiles: set[tuple[int, int]] = set()
+    for (x0, x1), (y0, y1) in zip(x_ranges.astype(int).tolist(), y_ranges.astype(int).tolist()):
+        tiles.update((x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1))
+    yield from sorted(tiles)
+
+
+# The features of the file that is being tiled, set once per worker process.
+_worker_state: dict[str, Any] = {}
+
+
+def _init_worker(
+    geometries: np.ndarray, properties: list[dict[str, Any]], layer_name: str, tileset_dir: str
+):
+    _worker_state.update(
+        geometries=geometries,
+        tree=shapely.STRtree(geometries),
+        properties=properties,
+        layer_name=layer_name,
+        tileset_dir=tileset_dir,
+    )
+
+
+def _write_tiles(z: int, tiles: list[tuple[int, int]]) -> int:
+    """Create and write a batch of tiles of a single zoom level. Returns the amount written."""
+    geometries = _worker_state["geometries"]
+    written = 0
+    for x, y in tiles:
+        xmin, ymin, xmax, ymax = get_tile_bounds(z, x, y)
+        scale = TILE_EXTENT / (xmax - xmin)
+        margin = TILE_BUFFER / scale
+        indices = _worker_state["tree"].query(
+            shapely.box(xmin - margin, ymin - margin, xmax + margin, ymax + margin)
+        )
+        if len(indices) == 0:
+            continue
+        indices.sort()
+        clipped = shapely.clip_by_rect(
+            geometries[indices], xmin - margin, ymin - margin, xmax + margin, ymax + margin
+        )
+        # Remove the detail that is smaller than a tile coordinate, then go to tile coordinates.
+        clipped = shapely.simplify(clipped, 1 / scale, preserve_topology=True)
+        in_tile = shapely.transform(
+            clipped, lambda c: np.rint((c - [xmin, ymax]) * [scale, -scale])
+        )
+        data = encode_tile(
+            _worker_state["layer_name"],
+            in_tile,
+            [_worker_state["properties"][i] for i in indices],
+        )
+        if not data:
+            continue
+        tile_dir = os.path.join(_worker_state["tileset_dir"], str(z), str(x))
+        os.makedirs(tile_dir, exist_ok=True)
+        with open(os.path.join(tile_dir, f"{y}.pbf"), "wb") as wf:
+            wf.write(data)
+        written += 1
+    return written
+
+
+def _to_property(value: Any) -> Any:
+    """Convert a property to a value that vector tiles support (a number, bool or string)."""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+def get_tileset_name(source: os.PathLike | str | BinaryIO) -> str:
+    """The name of the tileset of a file: its content hash, so tiles are reused across sessions."""
+    return hash_source(source)
+
+
+def find_tileset(
+    source: os.PathLike | str | BinaryIO, tile_dir: os.PathLike | str = DEFAULT_TILE_DIR
+) -> dict[str, Any] | None:
+    """
+    Get the TileJSON of a (completely exported) tileset of a GeoJSON file.
+
+    Parameters
+    ----------
+    source
+      The path to the GeoJSON file, or an uploaded GeoJSON file.
+    tile_dir
+      The directory with all tilesets.
+
+    Returns
+    -------
+    dict[str, Any] | None
+      The TileJSON, or None if the file has not been exported (yet).
+    """
+    tilejson_path = os.path.join(tile_dir, get_tileset_name(source), TILEJSON_NAME)
+    try:
+        with open(tilejson_path) as rf:
+            return json.load(rf)
+    except FileNotFoundError:
+        return None
+
+
+def export_tiles(
+    source: os.PathLike | str,
+    tile_dir: os.PathLike | str = DEFAULT_TILE_DIR,
+    min_zoom: int = 8,
+    max_zoom: int = 14,
+    layer_name: str | None = None,
+    max_workers: int | None = None,
+) -> dict[str, Any]:
+    """
+    Cut a GeoJSON file into a z/x/y pyramid of Mapbox vector tiles (`{z}/{x}/{y}.pbf`).
+
+    The tiles of each file are stored in a directory named after its content hash,
+    and a TileJSON file is written once all tiles are done. Existing tilesets are reused.
+
+    Parameters
+    ----------
+    source
+      The path to the GeoJSON file, e.g. `network.geojson` or `traffic_analysis_zones.geojson`.
+    tile_dir
+      The directory with all tilesets. Use the default to let Streamlit serve the tiles.
+    min_zoom
+      The lowest zoom level to create tiles for.
+    max_zoom
+      The highest zoom level to create tiles for. Maps zoom in further by scaling these tiles.
+    layer_name
+      The name of the layer in the tiles. Defaults to the file name (without extension).
+    max_workers
+      The amount of processes that create tiles. Defaults to the amount of CPUs.
+
+    Returns
+    -------
+    dict[str, Any]
+      The TileJSON of the tileset.
+    """
+    tileset = find_tileset(source, tile_dir)
+    if tileset is not None:
+        return tileset
+    name = get_tileset_name(source)
+    tileset_dir = os.path.join(tile_dir, name)
+    if layer_name is None:
+        layer_name = os.path.basename(source).split(".")[0]
+
+    gdf = read_geo_file(source)
+    if gdf.crs is None:
+        gdf = gdf.set_crs(4326)
+    lon_lat_bounds = gdf.to_crs(4326).total_bounds.tolist()
+    geometries = gdf.geometry.to_crs(3857).to_numpy()
+    columns = [col for col in gdf.columns if col != gdf.geometry.name]
+    properties = [
+        {col: _to_property(value) for col, value in zip(columns, row)}
+        for row in gdf[columns].itertuples(index=False)
+    ]
+
+    bounds = shapely.bounds(geometries)
+    bounds = bounds[~np.isnan(bounds).any(axis=1)]  # Empty geometries have no bounds.
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=_init_worker,
+        initargs=(geometries, properties, layer_name, tileset_dir),
+    ) as executor:
+        futures = []
+        for z in range(min_zoom, max_zoom + 1):
+            tiles = list(iter_tiles(bounds, z))
+            for i in range(0, len(tiles), TILES_PER_TASK):
+                futures.append(executor.submit(_write_tiles, z, tiles[i : i + TILES_PER_TASK]))
+        tile_count = sum(future.result() for future in futures)
+
+    west, south, east, north = lon_lat_bounds
+    center_zoom = min(max(min_zoom, math.floor(math.log2(360 / max(east - west, 1e-9)))), max_zoom)
+    tileset = {
+        "tilejson": "3.0.0",
+        "name": name,
+        "tiles": [f"{TILE_URL_PREFIX}/{name}/{{z}}/{{x}}/{{y}}.pbf"],
+        "minzoom": min_zoom,
+        "maxzoom": max_zoom,
+        "bounds": lon_lat_bounds,
+        "center": [(west + east) / 2, (south + north) / 2, center_zoom],
+        "vector_layers": [
+            {
+                "id": layer_name,
+                "fields": {col: str(gdf[col].dtype) for col in columns},
+                "geometry_type": gdf.geom_type.mode().iloc[0] if len(gdf) else None,
+            }
+        ],
+        "tile_count": tile_count,
+    }
+    # Written last, such that an interrupted export is not mistaken for a complete tileset.
+    os.makedirs(tileset_dir, exist_ok=True)
+    temp_path = os.path.join(tileset_dir, f"{TILEJSON_NAME}.tmp")
+    with open(temp_path, "w") as wf:
+        json.dump(tileset, wf)
+    os.replace(temp_path, os.path.join(tileset_dir, TILEJSON_NAME))
+    return tileset
+
+
+def get_mapbox_layer(tileset: dict[str, Any], color: str = "#1f77b4", **layer) -> dict[str, Any]:
+    """
+    Get a plotly mapbox layer (`layout.mapbox.layers`) that shows a tileset.
+
+    The browser loads the TileJSON, and then only fetches the tiles of the visible area.
+
+    Parameters
+    ----------
+    tileset
+      The TileJSON of the tileset, see `find_tileset`.
+    color
+      The colour of the lines (or points).
+    layer
+      Further properties of the plotly layer, e.g. `line={"width": 2}`.
+
+    Returns
+    -------
+    dict[str, Any]
+      The plotly mapbox layer.
+    """
+    vector_layer = tileset["vector_layers"][0]
+    is_point = vector_layer.get("geometry_type") in ("Point", "MultiPoint")
+    tilejson_url = f"{TILE_URL_PREFIX}/{tileset['name']}/{TILEJSON_NAME}"
+    return {
+        "sourcetype": "vector",
+        "source": tilejson_url,  # A URL (rather than a list of tile URLs) is read as TileJSON.
+        "sourcelayer": vector_layer["id"],
+        "type": "circle" if is_point else "line",
+        "color": color,
+        **layer,
+    }
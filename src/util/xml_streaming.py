@@ -0,0 +1,295 @@
+# Standard library.
+import os
+from collections.abc import Collection, Iterator
+from typing import BinaryIO
+
+# Dependencies.
+import pandas as pd
+from lxml import etree
+
+# Local.
+from util.ingest import open_binary
+
+# The amount of elements that are collected into a single DataFrame chunk.
+CHUNK_SIZE = 100_000
+# The only trip attributes that are converted to numbers. All others (e.g. IDs, edge IDs such as
+#  "4472294" and departLane, which can be "0" or "best") stay strings.
+TRIP_NUMERIC_COLUMNS = ("depart", "fromTaz", "toTaz")
+# Edge data columns that always stay strings. All edge data columns are named like the columns
+#  of the CSV files that SUMO's `xml2csv.py` creates, e.g. "interval_begin" and "edge_speed".
+EDGE_DATA_STRING_COLUMNS = ("interval_id", "edge_id")
+# The amount of edges that is inspected to find the measurement columns of an edge data file.
+EDGE_DATA_PEEK_SIZE = 1_000
+
+
+def iter_element_chunks(
+    source: os.PathLike | str | BinaryIO, tag: str, chunk_size: int = CHUNK_SIZE
+) -> Iterator[list[dict[str, str]]]:
+    """
+    Incrementally parse an XML file, and yield the attributes of the `tag` elements in chunks.
+
+    Every element is cleared as soon as its attributes are read, and so are its preceding siblings.
+    That way the parsed tree never grows, and memory usage stays constant regardless of file size.
+
+    Parameters
+    ----------
+    source
+      The path to the XML file, or a binary file-like object (e.g. an UploadedFile).
+    tag
+      The name of the elements to read, e.g. "trip".
+    chunk_size
+      The maximum amount of elements per chunk.
+
+    Yields
+    ------
+    list[dict[str, str]]
+      The attributes of (at most) `chunk_size` consecutive elements.
+    """
+    chunk: list[dict[str, str]] = []
+    with open_binary(source) as rf:
+        for _, element in etree.iterparse(rf, events=("end",), tag=tag):
+            chunk.append(dict(element.attrib))
+            # Free the element, and the (already processed) siblings that precede it.
+            element.clear(keep_tail=True)
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def records_to_frame(
+    records: list[dict[str, str]],
+    string_columns: Collection[str] = (),
+    numeric_columns: Collection[str] | None = None,
+) -> pd.DataFrame:
+    """
+    Convert a chunk of element attributes into a DataFrame with typed columns.
+
+    The types follow from the declared columns only (not from the values in the chunk),
+    so every chunk of a file gets the same column types, and the chunks can be concatenated.
+
+    Parameters
+    ----------
+    records
+      The attributes of each element, as read from the XML file.
+    string_columns
+      Columns that stay strings, if `numeric_columns` is None.
+    numeric_columns
+      Columns that are converted to numbers, while all other columns stay strings.
+      If None, all columns except `string_columns` are converted to numbers.
+
+    Returns
+    -------
+    pd.DataFrame
+      One row per element. Values of numeric columns that are not numbers become NaN.
+    """
+    frame = pd.DataFrame.from_records(records)
+    if numeric_columns is None:
+        numeric_columns = frame.columns.difference(string_columns)
+    for column in frame.columns.intersection(numeric_columns):
+        frame[column] = pd.to_numeric(frame[column], errors="coerce")
+    return frame
+
+
+def iter_trip_chunks(
+    source: os.PathLike | str | BinaryIO, chunk_size: int = CHUNK_SIZE
+) -> Iterator[pd.DataFrame]:
+    """
+    Stream the trips of a SUMO trips file (e.g. `trips.trips.xml`) as DataFrame chunks.
+
+    Parameters
+    ----------
+    source
+      The path to the trips file, or a binary file-like object.
+    chunk_size
+      The maximum amount of trips per chunk.
+
+    Yields
+    ------
+    pd.DataFrame
+      A chunk of trips, with one column per trip attribute (id, depart, from, fromTaz, ...).
+    """
+    for records in iter_element_chunks(source, "trip", chunk_size):
+        yield records_to_frame(records, numeric_columns=TRIP_NUMERIC_COLUMNS)
+
+
+def read_trips_dataframe(
+    source: os.PathLike | str | BinaryIO, chunk_size: int = CHUNK_SIZE
+) -> pd.DataFrame:
+    """
+    Read all trips of a SUMO trips file into a single DataFrame, parsing it as a stream.
+
+    Parameters
+    ----------
+    source
+      The path to the trips file, or a binary file-like object.
+    chunk_size
+      The amount of trips that are parsed before they are converted into a chunk.
+
+    Returns
+    -------
+    pd.DataFrame
+      One row per trip, with one column per trip attribute.
+
+    Raises
+    ------
+    ValueError
+      If the file has no `<trip>` elements (e.g. because it is another kind of SUMO file).
+    """
+    chunks = list(iter_trip_chunks(source, chunk_size))
+    if not chunks:
+        raise ValueError("The trips file has no <trip> elements!")
+    return pd.concat(chunks, ignore_index=True)
+
+
+def _iter_edge_data_records(
+    source: os.PathLike | str | BinaryIO, columns: Collection[str] | None = None
+) -> Iterator[dict[str, str | None]]:
+    """
+    Incrementally parse a SUMO edge data file (`<meandata><interval><edge/>...`),
+    and yield the attributes of each edge, together with those of its interval.
+
+    Every interval and edge is cleared as soon as it is read, so memory usage stays constant.
+
+    Parameters
+    ----------
+    source
+      The path to the edge data file, or a binary file-like object.
+    columns
+      The measurement columns to read (e.g. "edge_speed"). If None, all attributes are read.
+
+    Yields
+    ------
+    dict[str, str | None]
+      The attributes of an edge, named like the columns of a converted CSV file.
+    """
+    attributes = None if columns is None else [col.removeprefix("edge_") for col in columns]
+    interval: dict[str, str] = {}
+    with open_binary(source) as rf:
+        for event, element in etree.iterparse(
+            rf, events=("start", "end"), tag=("interval", "edge")
+        ):
+            if element.tag == "interval":
+                if event == "start":
+                    interval = {f"interval_{key}": value for key, value in element.attrib.items()}
+                    continue
+            elif event == "end":
+                record: dict[str, str | None] = dict(interval)
+                record["edge_id"] = element.get("id")
+                if attributes is None:
+                    record.update(
+                        (f"edge_{key}", value)
+                        for key, value in element.attrib.items()
+                        if key != "id"
+                    )
+                else:  # Missing attributes (e.g. on edges without any vehicles) become NaN.
+                    record.update((f"edge_{key}", element.get(key)) for key in attributes)
+                yield record
+            else:
+                continue  # The attributes are read on the end of the edge, so it can be cleared.
+            # Free the element, and the (already processed) siblings that precede it.
+            element.clear(keep_tail=True)
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
+
+def iter_edge_data_chunks(
+    source: os.PathLike | str | BinaryIO,
+    columns: Collection[str] | None = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> Iterator[pd.DataFrame]:
+    """
+    Stream a SUMO edge data file as DataFrame chunks.
+
+    Parameters
+    ----------
+    source
+      The path to the edge data file, or a binary file-like object.
+    columns
+      The measurement columns to read (e.g. "edge_speed"). If None, all attributes are read.
+    chunk_size
+      The maximum amount of edges per chunk.
+
+    Yields
+    ------
+    pd.DataFrame
+      A chunk of edge data, with the columns interval_begin, interval_end, interval_id, edge_id
+      and one (numeric) column per measurement.
+    """
+    chunk: list[dict[str, str | None]] = []
+    for record in _iter_edge_data_records(source, columns):
+        chunk.append(record)
+        if len(chunk) == chunk_size:
+            yield records_to_frame(chunk, EDGE_DATA_STRING_COLUMNS)
+            chunk = []
+    if chunk:
+        yield records_to_frame(chunk, EDGE_DATA_STRING_COLUMNS)
+
+
+def read_edge_data_dataframe(
+    source: os.PathLike | str | BinaryIO,
+    columns: Collection[str] | None = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> pd.DataFrame:
+    """
+    Read a SUMO edge data file into a single DataFrame, parsing it as a stream.
+
+    Parameters
+    ----------
+    source
+      The path to the edge data file, or a binary file-like object.
+    columns
+      The measurement columns to read (e.g. "edge_speed"). If None, all attributes are read.
+    chunk_size
+      The amount of edges that are parsed before they are converted into a chunk.
+
+    Returns
+    -------
+    pd.DataFrame
+      One row per (interval, edge) pair, laid out like a converted CSV file.
+
+    Raises
+    ------
+    ValueError
+      If the file has no `<edge>` elements within `<interval>` elements.
+    """
+    chunks = list(iter_edge_data_chunks(source, columns, chunk_size))
+    if not chunks:
+        raise ValueError("The edge data file has no <edge> elements!")
+    return pd.concat(chunks, ignore_index=True)
+
+
+def read_edge_data_columns(
+    source: os.PathLike | str | BinaryIO, peek_size: int = EDGE_DATA_PEEK_SIZE
+) -> list[str]:
+    """
+    Get the measurement columns of a SUMO edge data file, by parsing only its first edges.
+
+    Parameters
+    ----------
+    source
+      The path to the edge data file, or a binary file-like object.
+      The position of a file-like object is restored afterwards.
+    peek_size
+      The amount of edges to inspect.
+
+    Returns
+    -------
+    list[str]
+      The measurement columns (e.g. "edge_speed"), in order of appearance.
+    """
+    position = None if isinstance(source, (str, os.PathLike)) else source.tell()
+    columns: dict[str, None] = {}  # An ordered set.
+    try:
+        for i, record in enumerate(_iter_edge_data_records(source)):
+            columns.update((key, None) for key in record if key.startswith("edge_"))
+            if i + 1 == peek_size:
+                break
+    finally:
+        if position is not None:
+            source.seek(position)
+    columns.pop("edge_id", None)
+    return list(columns)
@@ -0,0 +1,100 @@
+# Standard library.
+import hashlib
+import os
+from functools import cached_property
+from typing import BinaryIO
+
+# Dependencies.
+import geopandas as gpd
+import numpy as np
+import shapely
+
+# Local.
+from util.ingest import read_geo_file
+
+# The property of each zone (TAZ) that holds its ID, as in `fromTaz` and `toTaz` of the trips.
+ZONE_ID_PROPERTY = "NO"
+# The amount of decimals of the coordinates in the GeoJSON dict for plotly, 5 is about 1m.
+ZONE_COORDINATE_DECIMALS = 5
+
+
+class ZoneLayer:
+    """
+    The traffic analysis zones (TAZs) of a GeoJSON file, parsed once.
+
+    The GeoDataFrame is the only copy of the zones. The (much smaller) GeoJSON dict that plotly
+    needs is derived from it on first use, with only the zone ID as property and with its
+    coordinates quantised to `ZONE_COORDINATE_DECIMALS`.
+    """
+
+    def __init__(self, geo_df: gpd.GeoDataFrame, id_property: str = ZONE_ID_PROPERTY):
+        """
+        Parameters
+        ----------
+        geo_df
+          The zones, with one row per zone.
+        id_property
+          The column with the zone IDs.
+        """
+        assert id_property in geo_df.columns, f"The zones have no '{id_property}' property!"
+        self.geo_df = geo_df
+        self.id_property = id_property
+        self._content_hash: str | None = None
+
+    @classmethod
+    def from_file(
+        cls, source: os.PathLike | str | BinaryIO, id_property: str = ZONE_ID_PROPERTY
+    ) -> "ZoneLayer":
+        """
+        Parse a GeoJSON file with zones.
+
+        Parameters
+        ----------
+        source
+          The path to the GeoJSON file, or an uploaded GeoJSON file.
+        id_property
+          The property with the zone IDs.
+
+        Returns
+        -------
+        ZoneLayer
+          The zones in the file.
+        """
+        return cls(read_geo_file(source), id_property)
+
+    def __len__(self) -> int:
+        return len(self.geo_df)
+
+    @property
+    def featureidkey(self) -> str:
+        """The path to the zone ID in each feature, as plotly's `featureidkey` expects it."""
+        return f"properties.{self.id_property}"
+
+    def content_hash(self) -> str:
+        """
+        Get a hash of the zone IDs and geometries, e.g. to use in `st.cache_data(hash_funcs=...)`.
+
+        Returns
+        -------
+        str
+          A hexadecimal BLAKE2b digest, computed once per ZoneLayer.
+        """
+        if self._content_hash is None:
+            hasher = hashlib.blake2b(digest_size=20)
+            hasher.update(self.id_property.encode("utf-8"))
+            hasher.update(self.geo_df[self.id_property].astype(str).str.cat(sep="\n").encode())
+            for wkb in shapely.to_wkb(self.geo_df.geometry.to_numpy()):
+                hasher.update(wkb)
+            self._content_hash = hasher.hexdigest()
+        return self._content_hash
+
+    @cached_property
+    def geojson(self) -> dict:
+        """The zones as a GeoJSON dict (in WGS84), with the zone ID as only property."""
+        zones = self.geo_df[[self.id_property, self.geo_df.geometry.name]]
+        if zones.crs is not None and not zones.crs == 4326:
+            zones = zones.to_crs(4326)
+        quantised = shapely.transform(
+            zones.geometry.to_numpy(), lambda coords: np.round(coords, ZONE_COORDINATE_DECIMALS)
+        )
+        return zones.set_geometry(quantised, crs=zones.crs).to_geo_dict(drop_id=True)
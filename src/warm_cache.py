@@ -0,0 +1,58 @@
+"""
+Pre-warm the on-disk cache of parsed SUMO files for a scenario directory.
+
+This only parses the files, in a single process. To also build everything that the pages derive
+from them (in parallel), use `precompute.py` instead.
+
+Usage (from the root folder of this project):
+    python ./src/warm_cache.py ./demo_data
+"""
+
+# Standard library.
+import argparse
+import os
+import time
+
+# Local.
+from precompute import check_cache_dir, parse_file
+from util.disk_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, DiskCache, guess_kind
+
+
+def warm_cache(scenario_dir: os.PathLike | str, cache: DiskCache):
+    """
+    Parse every known SUMO file in a directory (recursively), and store it in the cache.
+    The files are parsed like the pages parse them by default (see `precompute.parse_file`).
+
+    Parameters
+    ----------
+    scenario_dir
+      The directory with SUMO output files, laid out like `demo_data`.
+    cache
+      The cache to store the parsed files in.
+    """
+    for dir_path, _, filenames in os.walk(scenario_dir):
+        for filename in sorted(filenames):
+            kind = guess_kind(filename)
+            if kind is None:
+                continue
+            filepath = os.path.join(dir_path, filename)
+            start = time.perf_counter()
+            frame = parse_file(filepath, cache)
+            print(f"{filepath} ({kind}): {len(frame)} rows in {time.perf_counter() - start:.2f}s")
+    print(f"Cache size: {cache.get_size() / 1024**2:.1f}MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("scenario_dir", help="The directory with SUMO output files.")
+    parser.add_argument(
+        "--cache-dir",
+        default=DEFAULT_CACHE_DIR,
+        help="Where to store the cache (by default, where the dashboard reads it from).",
+    )
+    parser.add_argument(
+        "--max-bytes", type=int, default=DEFAULT_MAX_BYTES, help="The maximum cache size in bytes."
+    )
+    args = parser.parse_args()
+    check_cache_dir(args.cache_dir)
+    warm_cache(args.scenario_dir, DiskCache(args.cache_dir, args.max_bytes))
@@ -0,0 +1,23 @@
+# Standard library.
+import io
+import os
+import sys
+import tempfile
+
+# The modules are imported like the dashboard imports them (`from util.x import ...`).
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC_DIR)
+# The demo data, which some tests compare against (they are skipped if it is not available).
+DEMO_DATA_DIR = os.path.join(os.path.dirname(SRC_DIR), "demo_data")
+# Loaders that use the default DiskCache (also in worker processes) get a fresh cache directory.
+os.environ["SUMO_DASHBOARD_CACHE_DIR"] = tempfile.mkdtemp(prefix="sumo-dashboard-tests-")
+
+# Local (after `SRC_DIR` is importable).
+from util.sumo_conversions import ODMatrix  # noqa: E402
+
+
+def read_od(text: str) -> ODMatrix:
+    """Parse the text of an O/D matrix file (header included)."""
+    od_matrix = ODMatrix()
+    od_matrix.read_matrix(io.StringIO(text))
+    return od_matrix
@@ -0,0 +1,40 @@
+# Standard library.
+import threading
+
+# Dependencies.
+import pandas as pd
+import pytest
+
+# Local.
+from util.disk_cache import DiskCache
+
+FRAME = pd.DataFrame({"id": ["a", "b"], "value": [1.5, 2.0]})
+
+
+@pytest.mark.parametrize("content", [b"", b"not a cache file", b"\x80\x05\x95truncated"])
+def test_unreadable_files_are_misses(tmp_path, content: bytes):
+    cache = DiskCache(tmp_path)
+    cache.store_object("artefact-v1", "key", {"a": 1})
+    cache.store_frame("frame-v1", "key", FRAME)
+    for path in tmp_path.iterdir():
+        path.write_bytes(content)  # E.g. an older format, or a file that another tool truncated.
+    assert cache.load_object("artefact-v1", "key") is None
+    assert cache.load_frame("frame-v1", "key") is None
+    assert list(tmp_path.iterdir()) == []  # Removed, such that the next store replaces them.
+    assert cache.load_or_build("artefact-v1", "key", lambda: {"a": 2}) == {"a": 2}
+    assert cache.load_object("artefact-v1", "key") == {"a": 2}
+
+
+def test_failed_store_leaves_no_file(tmp_path):
+    cache = DiskCache(tmp_path)
+    with pytest.raises(TypeError):
+        cache.store_object("artefact-v1", "key", threading.Lock())  # Cannot be pickled.
+    assert list(tmp_path.iterdir()) == []
+    assert cache.load_object("artefact-v1", "key") is None
+
+
+def test_frame_round_trip(tmp_path):
+    cache = DiskCache(tmp_path)
+    cache.store_frame("frame-v1", "key", FRAME)
+    pd.testing.assert_frame_equal(cache.load_frame("frame-v1", "key"), FRAME)
+    assert cache.load_frame("frame-v1", "other") is None
@@ -0,0 +1,60 @@
+# Standard library.
+import io
+import pickle
+
+# Dependencies.
+import geopandas as gpd
+import numpy as np
+from shapely.geometry import LineString
+
+# Local.
+from test_xml_streaming import EDGE_DATA_XML
+from util.disk_cache import DiskCache
+from util.edge_data import EdgeDataCube
+from util.xml_streaming import read_edge_data_dataframe
+
+# Edge "e3" has no data, and edge "1" is a numeric ID in the GeoJSON but a string in the XML.
+NETWORK = gpd.GeoDataFrame(
+    {"id": ["e3", "e2", 1]},
+    geometry=[
+        LineString([(0, 0), (1, 1)]),
+        LineString([(1, 1), (2, 2)]),
+        LineString([(2, 2), (3, 3)]),
+    ],
+    crs=4326,
+)
+
+
+def make_cube() -> EdgeDataCube:
+    return EdgeDataCube(read_edge_data_dataframe(io.BytesIO(EDGE_DATA_XML)), NETWORK)
+
+
+def test_cube_aligns_values_to_network():
+    cube = make_cube()
+    assert cube.row_count == 4
+    assert cube.interval_count == 2
+    assert cube.get_interval(30.0) == 0
+    assert cube.get_interval(90.0) == 1
+    assert cube.get_interval(130.0) is None
+    np.testing.assert_array_equal(cube.get_values("edge_speed", 0), [np.nan, 7.0, 10.5])
+    np.testing.assert_array_equal(cube.get_values("edge_entered", 1), [np.nan, 1.0, 2.0])
+    frame = cube.get_frame(NETWORK, "edge_speed", 1)
+    assert frame["edge_speed"].tolist()[1:] == [8.25, 11.0]
+    assert "edge_speed" not in NETWORK.columns
+
+
+def test_cube_pickle_round_trip(tmp_path):
+    cube = make_cube()
+    copy = pickle.loads(pickle.dumps(cube))
+    assert copy.columns == cube.columns
+    assert copy.row_count == cube.row_count
+    for column in cube.columns:
+        np.testing.assert_array_equal(copy.arrays[column], cube.arrays[column])
+    # As precompute stores it, and the Congestion page loads it.
+    cache = DiskCache(tmp_path / "cache")
+    stored = cache.load_or_build("edge_data_cube-test", "key", make_cube)
+    loaded = cache.load_or_build("edge_data_cube-test", "key", lambda: None)
+    assert loaded is not stored
+    assert list(loaded.edge_ids) == ["e3", "e2", 1]
+    assert not any(isinstance(value, gpd.GeoSeries) for value in vars(loaded).values())
+    np.testing.assert_array_equal(loaded.arrays["edge_speed"], stored.arrays["edge_speed"])
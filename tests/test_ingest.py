@@ -0,0 +1,129 @@
+# Standard library.
+import bz2
+import gzip
+import io
+import json
+import lzma
+import tempfile
+
+# Dependencies.
+import pandas as pd
+import pytest
+
+# Local.
+from test_od_matrix import OD_TEXT
+from test_xml_streaming import MIXED_TRIPS_XML
+from util.disk_cache import DiskCache
+from util.ingest import detect_compression, open_local_path, open_text, read_geo_file
+from util.routes_index import RoutesIndex
+from util.sumo_conversions import ODMatrix
+from util.xml_streaming import read_trips_dataframe
+
+ROUTES_XML = b"""<?xml version="1.0" encoding="UTF-8"?>
+<routes>
+    <vehicle id="veh_0" depart="0.00">
+        <route edges="e1 e2"/>
+    </vehicle>
+    <vehicle id="veh_1" depart="5.00"><route edges="e2 e3"/></vehicle>
+</routes>
+"""
+NETWORK_GEOJSON = json.dumps(
+    {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "properties": {"id": "e1"},
+                "geometry": {"type": "LineString", "coordinates": [[4.0, 52.0], [4.1, 52.1]]},
+            }
+        ],
+    }
+).encode()
+COMPRESSORS = {
+    "gzip": (gzip.compress, "gz"),
+    "bz2": (bz2.compress, "bz2"),
+    "xz": (lzma.compress, "xz"),
+}
+
+
+@pytest.fixture(params=list(COMPRESSORS))
+def compression(request) -> str:
+    return request.param
+
+
+def write_compressed(tmp_path, name: str, data: bytes, compression: str) -> tuple[str, str]:
+    """Write the data both as is and compressed, and return the plain and compressed paths."""
+    compress, extension = COMPRESSORS[compression]
+    plain_path = tmp_path / name
+    plain_path.write_bytes(data)
+    compressed_path = tmp_path / f"{name}.{extension}"
+    compressed_path.write_bytes(compress(data))
+    return str(plain_path), str(compressed_path)
+
+
+def test_detect_compression(tmp_path, compression: str):
+    plain_path, compressed_path = write_compressed(
+        tmp_path, "od.txt", OD_TEXT.encode(), compression
+    )
+    assert detect_compression(plain_path) is None
+    assert detect_compression(compressed_path) == compression
+    # Uploads are recognised by their contents too.
+    with open(compressed_path, "rb") as rf:
+        assert detect_compression(io.BytesIO(rf.read())) == compression
+
+
+def test_compressed_od_matrix(tmp_path, compression: str):
+    plain_path, compressed_path = write_compressed(
+        tmp_path, "od.txt", OD_TEXT.encode(), compression
+    )
+    with open_text(compressed_path) as rf:
+        assert rf.read() == OD_TEXT
+    plain, compressed = ODMatrix(), ODMatrix()
+    plain.load_from_filepath(plain_path)
+    compressed.load_from_filepath(compressed_path)
+    assert compressed == plain
+
+
+def test_compressed_trips(tmp_path, compression: str):
+    plain_path, compressed_path = write_compressed(
+        tmp_path, "trips.trips.xml", MIXED_TRIPS_XML, compression
+    )
+    plain = read_trips_dataframe(plain_path)
+    pd.testing.assert_frame_equal(read_trips_dataframe(compressed_path), plain)
+    with open(compressed_path, "rb") as rf:
+        upload = io.BytesIO(rf.read())
+    cache = DiskCache(tmp_path / "cache")
+    pd.testing.assert_frame_equal(cache.load_or_parse(upload, "trips-v2"), plain)
+    pd.testing.assert_frame_equal(cache.load_or_parse(upload, "trips-v2"), plain)  # Cached.
+
+
+def test_compressed_routes_index(tmp_path, compression: str):
+    plain_path, compressed_path = write_compressed(
+        tmp_path, "routes.rou.xml", ROUTES_XML, compression
+    )
+    plain, compressed = RoutesIndex(plain_path), RoutesIndex(compressed_path)
+    assert list(compressed.vehicle_ids) == list(plain.vehicle_ids) == ["veh_0", "veh_1"]
+    for vehicle_id in ("veh_0", "veh_1"):
+        fragment = compressed.get_fragment(compressed_path, vehicle_id)
+        assert fragment == plain.get_fragment(plain_path, vehicle_id)
+    assert b'edges="e2 e3"' in compressed.get_fragment(compressed_path, "veh_1")
+
+
+def test_compressed_geojson(tmp_path, compression: str):
+    plain_path, compressed_path = write_compressed(
+        tmp_path, "network.geojson", NETWORK_GEOJSON, compression
+    )
+    plain = read_geo_file(plain_path)
+    compressed = read_geo_file(compressed_path)
+    assert compressed["id"].tolist() == plain["id"].tolist() == ["e1"]
+    assert compressed.geometry.equals(plain.geometry)
+
+
+def test_corrupt_upload_leaves_no_temporary_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    upload = io.BytesIO(gzip.compress(NETWORK_GEOJSON)[:-12])  # Truncated.
+    upload.name = "network.geojson.gz"
+    with pytest.raises(EOFError):
+        with open_local_path(upload):
+            pass
+    assert list(tmp_path.iterdir()) == []
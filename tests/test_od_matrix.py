@@ -0,0 +1,97 @@
+# Standard library.
+import glob
+import io
+import os
+import pickle
+
+# Dependencies.
+import pytest
+
+# Local.
+from conftest import DEMO_DATA_DIR, read_od
+from util.caching import hash_source
+from util.disk_cache import DiskCache
+from util.od_timeseries import load_cached_od_matrix
+from util.sumo_conversions import ODMatrix, parse_od_rows
+
+OD_TEXT = "$OR;D2\n* From-Time  To-Time\n5.00 6.00\n* Factor\n1.00\n1 2 4\n1 3 1\n2 1 1\n"
+DEMO_OD_PATHS = sorted(glob.glob(os.path.join(DEMO_DATA_DIR, "od_matrix", "*.txt")))
+
+
+def test_parse_rows_skips_empty_lines():
+    origins, destinations, counts = parse_od_rows(io.StringIO("1 2 3\n\n  \n4 5 6"))
+    assert origins.tolist() == [1, 4]
+    assert destinations.tolist() == [2, 5]
+    assert counts.tolist() == [3, 6]
+
+
+def test_parse_rows_across_blocks():
+    rows = "".join(f"{i} {i + 1} {i * 10}\n" for i in range(100))
+    origins, destinations, counts = parse_od_rows(io.StringIO(rows), block_size=7)
+    assert origins.tolist() == list(range(100))
+    assert counts.tolist() == [i * 10 for i in range(100)]
+
+
+@pytest.mark.parametrize(
+    "rows",
+    [
+        "1 2\n3 4 5\n6\n",  # 6 values, but not 3 per line.
+        "1 2\n3 4\n5 6\n",
+        "1 2 3\n4 5\n",
+        "1 2 3 4\n",
+        "1 2 x\n",
+        "1 2 3.5\n",
+    ],
+)
+def test_parse_rows_rejects_invalid_rows(rows: str):
+    with pytest.raises(ValueError):
+        parse_od_rows(io.StringIO(rows))
+
+
+def test_file_hash_identifies_loaded_matrix(tmp_path):
+    od_path = tmp_path / "od.txt"
+    od_path.write_text(OD_TEXT)
+    cache = DiskCache(tmp_path / "cache")
+    parsed = load_cached_od_matrix(od_path, cache)
+    assert parsed.content_hash() == hash_source(od_path)
+    cached = load_cached_od_matrix(od_path, cache)  # Unpickled from the DiskCache.
+    assert cached.content_hash() == hash_source(od_path)
+    assert cached.get_row_count() == 3
+
+
+def test_pickled_matrix_keeps_file_hash(tmp_path):
+    od_path = tmp_path / "od.txt"
+    od_path.write_text(OD_TEXT)
+    od_matrix = load_cached_od_matrix(od_path, DiskCache(tmp_path / "cache"))
+    copy = pickle.loads(pickle.dumps(od_matrix))
+    assert copy.content_hash() == hash_source(od_path)
+    assert copy == od_matrix
+
+
+def test_pickle_round_trip():
+    od_matrix = read_od(OD_TEXT)
+    copy = pickle.loads(pickle.dumps(od_matrix))
+    assert copy == od_matrix
+    assert hash(copy) == hash(od_matrix)
+    assert (copy.start, copy.end, copy.factor) == (5.0, 6.0, 1.0)
+    assert dict(copy.counts) == {(1, 2): 4, (1, 3): 1, (2, 1): 1}
+
+
+def test_content_hash_changes_with_counts():
+    assert read_od(OD_TEXT) != read_od(OD_TEXT.replace("1 3 1", "1 3 2"))
+
+
+@pytest.mark.skipif(not DEMO_OD_PATHS, reason="The demo O/D matrices are not available.")
+@pytest.mark.parametrize("od_path", DEMO_OD_PATHS, ids=os.path.basename)
+def test_loop_and_bulk_parsers_agree(od_path: str):
+    loop, bulk = ODMatrix(), ODMatrix()
+    loop.load_from_filepath(od_path, bulk=False)
+    bulk.load_from_filepath(od_path, bulk=True)
+    assert (loop.file_header, loop.start, loop.end, loop.factor) == (
+        bulk.file_header,
+        bulk.start,
+        bulk.end,
+        bulk.factor,
+    )
+    assert dict(loop.counts) == dict(bulk.counts)
+    assert loop.content_hash() == bulk.content_hash()
@@ -0,0 +1,52 @@
+# Standard library.
+import os
+
+# Dependencies.
+import pytest
+
+# Local.
+from conftest import DEMO_DATA_DIR
+from util import od_timeseries
+from util.od_timeseries import ODTimeSeries, load_od_file
+
+DEMO_OD_DIR = os.path.join(DEMO_DATA_DIR, "od_matrix")
+
+
+def write_od_dir(tmp_path) -> str:
+    od_dir = tmp_path / "od_matrix"
+    od_dir.mkdir()
+    for start, rows in ((6, "1 2 5\n2 1 1\n"), (5, "1 2 3\n1 3 2\n")):
+        header = f"$OR;D2 period {start}\n* From-Time  To-Time\n{start}.00 {start + 1}.00\n"
+        (od_dir / f"MR_{start}.0_{start + 1}.0.txt").write_text(f"{header}* Factor\n1.00\n{rows}")
+    return str(od_dir)
+
+
+def test_period_matrices_match_their_files(tmp_path):
+    od_dir = write_od_dir(tmp_path)
+    series = ODTimeSeries.from_directory(od_dir)
+    assert series.names == ["MR_5.0_6.0.txt", "MR_6.0_7.0.txt"]  # Ordered by start time.
+    for period, name in enumerate(series.names):
+        od_matrix = load_od_file(os.path.join(od_dir, name))
+        period_matrix = series.get_period_matrix(period)
+        assert period_matrix.file_header == od_matrix.file_header
+        assert (period_matrix.start, period_matrix.end) == (od_matrix.start, od_matrix.end)
+        assert dict(period_matrix.counts) == dict(od_matrix.counts)
+
+
+def test_parallel_loading_spawns_workers(tmp_path, monkeypatch):
+    od_dir = write_od_dir(tmp_path)
+    monkeypatch.setattr(od_timeseries, "OD_PARALLEL_MIN_BYTES", 0)
+    parallel = ODTimeSeries.from_directory(od_dir, max_workers=2)
+    serial = ODTimeSeries.from_directory(od_dir, max_workers=1)
+    assert parallel.file_headers == serial.file_headers == ["$OR;D2 period 5", "$OR;D2 period 6"]
+    assert parallel.get_period_totals().tolist() == serial.get_period_totals().tolist() == [5, 6]
+
+
+@pytest.mark.skipif(
+    not os.path.isdir(DEMO_OD_DIR), reason="The demo O/D matrices are not available."
+)
+def test_demo_period_headers():
+    series = ODTimeSeries.from_directory(DEMO_OD_DIR)
+    for period, name in enumerate(series.names):
+        expected = load_od_file(os.path.join(DEMO_OD_DIR, name)).file_header
+        assert series.get_period_matrix(period).file_header == expected
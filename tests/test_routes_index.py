@@ -0,0 +1,45 @@
+# Standard library.
+import io
+
+# Dependencies.
+import pytest
+
+# Local.
+from util.routes_index import RoutesIndex
+
+ROUTES_XML = b"""<?xml version="1.0" encoding="UTF-8"?>
+<routes>
+    <vehicle id="veh_0" depart="0.00"><route edges="e1 e2"/></vehicle>
+    <vehicle depart='5.00' id='veh_1'><route edges="e2 e3"/></vehicle>
+    <vehicle type="a>b" id="veh_2" depart="6.00"/>
+    <vehicle id="veh&amp;&quot;3&#39;" depart="7.00">
+        <routeDistribution last="0"><route cost="2.5" edges="e3 e4"/></routeDistribution>
+    </vehicle>
+    <vehicle id="veh_0" depart="9.00"><route edges="e9"/></vehicle>
+</routes>
+"""
+
+
+def test_index_recognises_all_start_tags():
+    index = RoutesIndex(io.BytesIO(ROUTES_XML))
+    assert list(index.vehicle_ids) == ["veh_0", "veh_1", "veh_2", "veh&\"3'"]
+    assert index.get_fragment(io.BytesIO(ROUTES_XML), "veh_1").startswith(b"<vehicle depart='5.00'")
+    assert index.get_fragment(io.BytesIO(ROUTES_XML), "veh_2").endswith(b'depart="6.00"/>')
+    routes = index.get_routes(io.BytesIO(ROUTES_XML), "veh&\"3'")
+    assert routes["edges"].tolist() == ["e3 e4"]
+    assert routes["cost"].tolist() == [2.5]
+
+
+def test_duplicate_ids_keep_the_first_vehicle():
+    index = RoutesIndex(io.BytesIO(ROUTES_XML))
+    assert len(index) == 4
+    routes = index.get_routes(io.BytesIO(ROUTES_XML), "veh_0")
+    assert routes["edges"].tolist() == ["e1 e2"]
+
+
+def test_unknown_vehicles_are_parsed_from_the_file():
+    stale_index = RoutesIndex(io.BytesIO(b"<routes/>"))
+    fragment = stale_index.get_fragment(io.BytesIO(ROUTES_XML), "veh_1")
+    assert fragment == b"""<vehicle depart="5.00" id="veh_1"><route edges="e2 e3"/></vehicle>"""
+    with pytest.raises(KeyError):
+        stale_index.get_fragment(io.BytesIO(ROUTES_XML), "veh_9")
@@ -0,0 +1,24 @@
+# Dependencies.
+import pytest
+from lxml import etree
+
+# Local.
+from util.sumo_conversions import Trip
+
+TRIP_XML = b'<trip id="veh_1" depart="20.50" from="e2" to="e3" fromTaz="2" toTaz="3"/>'
+
+
+def test_from_xml_element():
+    trip = Trip.from_xml_element(etree.fromstring(TRIP_XML))
+    assert trip.id == "veh_1"
+    assert trip.depart_stamp == 20.5
+    assert (trip.source_str, trip.target_str) == ("e2", "e3")
+    assert (trip.source_taz, trip.target_taz) == (2, 3)
+    assert trip.to_dict()["from_taz"] == 2
+
+
+def test_trip_has_no_instance_dict():
+    trip = Trip.from_xml_element(etree.fromstring(TRIP_XML))
+    assert not hasattr(trip, "__dict__")
+    with pytest.raises(AttributeError):
+        trip.colour = "red"
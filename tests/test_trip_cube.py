@@ -0,0 +1,69 @@
+# Standard library.
+import pickle
+
+# Dependencies.
+import pandas as pd
+
+# Local.
+from conftest import read_od
+from util.sumo_conversions import ODMatrix
+from util.trip_cube import TripCube
+
+# Trips between 05:00 and 06:30, in 15 minute bins: three in 05:00-05:15, one in 05:15-05:30,
+#  two in 06:00-06:15, and one in 06:15-06:30.
+TRIPS_DF = pd.DataFrame(
+    {
+        "depart": [18_000.0, 18_100.0, 18_899.0, 18_900.0, 21_600.0, 22_000.0, 22_600.0],
+        "fromTaz": [1, 1, 2, 1, 1, 2, 2],
+        "toTaz": [2, 2, 1, 3, 2, 3, 3],
+    }
+)
+
+
+def make_od(start: str, end: str, rows: str) -> ODMatrix:
+    return read_od(f"$OR;D2\n* From-Time  To-Time\n{start} {end}\n* Factor\n1.00\n{rows}")
+
+
+def test_counts():
+    cube = TripCube(TRIPS_DF)
+    assert cube.trip_count == 7
+    assert cube.get_origin_counts().to_dict() == {1: 4, 2: 3}
+    assert cube.get_destination_counts().to_dict() == {2: 3, 3: 3, 1: 1}
+    assert cube.get_origin_counts(18_000, 19_800).to_dict() == {1: 3, 2: 1}
+    assert cube.get_bin_totals().tolist() == [3, 1, 0, 0, 2, 1]
+
+
+def test_reconcile_aligned_period():
+    cube = TripCube(TRIPS_DF)
+    od_matrix = make_od("05.00", "6.00", "1 2 4\n1 3 1\n2 1 1\n")
+    assert cube.is_aligned(od_matrix.start * 3600, od_matrix.end * 3600)
+    comparison = cube.reconcile(od_matrix).set_index(["Origin TAZ", "Destination TAZ"])
+    assert comparison["Trip count"].to_dict() == {(1, 2): 2, (1, 3): 1, (2, 1): 1}
+    assert comparison["Matrix count"].to_dict() == {(1, 2): 4, (1, 3): 1, (2, 1): 1}
+    assert comparison["Difference"].tolist() == [-2, 0, 0]  # The largest difference first.
+
+
+def test_reconcile_unaligned_period():
+    cube = TripCube(TRIPS_DF)
+    # 06:00-06:06 covers only part of the 06:00-06:15 bin, which is compared as a whole.
+    start, end = 6.0 * 3600, 6.1 * 3600
+    assert not cube.is_aligned(start, end)
+    assert cube.get_covering_period(start, end) == (21_600.0, 22_500.0)
+    comparison = cube.reconcile(make_od("06.00", "6.10", "1 2 1\n"))
+    assert comparison["Trip count"].sum() == 2
+    assert cube.get_origin_counts(start, end).to_dict() == {1: 1, 2: 1}
+
+
+def test_aligned_period_with_rounding():
+    cube = TripCube(TRIPS_DF)
+    assert cube.is_aligned(1.25 * 3600, 1.5 * 3600)
+    assert cube.get_covering_period(0.0, 0.1 * 3600) == (0.0, 900.0)
+
+
+def test_pickle_round_trip():
+    cube = TripCube(TRIPS_DF)
+    copy = pickle.loads(pickle.dumps(cube))
+    assert copy.trip_count == cube.trip_count
+    assert copy.get_bin_totals().tolist() == cube.get_bin_totals().tolist()
+    od_matrix = make_od("05.00", "6.00", "1 2 4\n1 3 1\n2 1 1\n")
+    assert copy.reconcile(od_matrix).equals(cube.reconcile(od_matrix))
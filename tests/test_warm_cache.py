@@ -0,0 +1,24 @@
+# Standard library.
+import os
+
+# Local.
+from test_xml_streaming import EDGE_DATA_XML
+from util.disk_cache import DiskCache
+from util.xml_streaming import read_edge_data_columns
+from warm_cache import warm_cache
+
+
+def test_warm_cache_parses_edge_data_like_the_page(tmp_path):
+    scenario_dir = tmp_path / "scenario"
+    scenario_dir.mkdir()
+    edge_path = scenario_dir / "edge_data.xml"
+    edge_path.write_bytes(EDGE_DATA_XML)
+    cache = DiskCache(tmp_path / "cache")
+    warm_cache(scenario_dir, cache)
+    cached_files = sorted(os.listdir(cache.cache_dir))
+
+    # The Congestion page loads all measurements of an XML file by default.
+    columns = tuple(read_edge_data_columns(edge_path))
+    frame = cache.load_or_parse(edge_path, "edge_xml-v2", columns)
+    assert sorted(os.listdir(cache.cache_dir)) == cached_files  # A cache hit.
+    assert set(columns) <= set(frame.columns)
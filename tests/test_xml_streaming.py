@@ -0,0 +1,88 @@
+# Standard library.
+import io
+
+# Dependencies.
+import pandas as pd
+import pytest
+
+# Local.
+from util.disk_cache import DiskCache
+from util.xml_streaming import read_edge_data_dataframe, read_trips_dataframe
+
+# Six trips, of which the first three only have numeric departLanes (so a chunk of three looks
+#  numeric), and the others have "best" and string IDs.
+MIXED_TRIPS_XML = b"""<?xml version="1.0" encoding="UTF-8"?>
+<routes>
+    <trip id="0" depart="10.00" from="e1" to="e2" fromTaz="1" toTaz="2" departLane="0"/>
+    <trip id="1" depart="11.00" from="4472294" to="e2" fromTaz="1" toTaz="3" departLane="1"/>
+    <trip id="2" depart="12.00" from="e1" to="e3" fromTaz="2" toTaz="3" departLane="0"/>
+    <trip id="veh_3" depart="13.00" from="e1" to="e2" fromTaz="3" toTaz="1" departLane="best"/>
+    <trip id="veh_4" depart="14.00" from="e2" to="e1" fromTaz="2" toTaz="1" departLane="best"/>
+    <trip id="veh_5" depart="15.00" from="e3" to="e1" fromTaz="1" toTaz="1" departLane="free"/>
+</routes>
+"""
+
+EDGE_DATA_XML = b"""<?xml version="1.0" encoding="UTF-8"?>
+<meandata>
+    <interval begin="0.00" end="60.00" id="edgedata">
+        <edge id="1" speed="10.5" entered="3"/>
+        <edge id="e2" speed="7"/>
+    </interval>
+    <interval begin="60.00" end="120.00" id="edgedata">
+        <edge id="1" speed="11" entered="2"/>
+        <edge id="e2" speed="8.25" entered="1"/>
+    </interval>
+</meandata>
+"""
+
+
+def test_trip_chunks_have_the_same_types():
+    chunked = read_trips_dataframe(io.BytesIO(MIXED_TRIPS_XML), chunk_size=3)
+    whole = read_trips_dataframe(io.BytesIO(MIXED_TRIPS_XML), chunk_size=100)
+    pd.testing.assert_frame_equal(chunked, whole)
+    assert chunked["departLane"].tolist() == ["0", "1", "0", "best", "best", "free"]
+    assert chunked["id"].tolist() == ["0", "1", "2", "veh_3", "veh_4", "veh_5"]
+    assert chunked["from"].tolist()[1] == "4472294"
+    assert pd.api.types.is_numeric_dtype(chunked["depart"])
+    assert chunked["fromTaz"].tolist() == [1, 1, 2, 3, 2, 1]
+
+
+def test_mixed_trip_chunks_can_be_cached(tmp_path):
+    cache = DiskCache(tmp_path)
+    frame = read_trips_dataframe(io.BytesIO(MIXED_TRIPS_XML), chunk_size=3)
+    cache.store_frame("trips-test", "mixed", frame)
+    pd.testing.assert_frame_equal(cache.load_frame("trips-test", "mixed"), frame)
+
+
+def test_edge_data_chunks_equal_whole_file():
+    chunked = read_edge_data_dataframe(io.BytesIO(EDGE_DATA_XML), chunk_size=1)
+    whole = read_edge_data_dataframe(io.BytesIO(EDGE_DATA_XML))
+    pd.testing.assert_frame_equal(chunked, whole)
+    assert whole["edge_id"].tolist() == ["1", "e2", "1", "e2"]
+    assert whole["edge_speed"].tolist() == [10.5, 7.0, 11.0, 8.25]
+    assert whole["edge_entered"].isna().tolist() == [False, True, False, False]
+
+
+def test_edge_data_column_selection():
+    frame = read_edge_data_dataframe(io.BytesIO(EDGE_DATA_XML), columns=["edge_entered"])
+    assert list(frame.columns) == [
+        "interval_begin",
+        "interval_end",
+        "interval_id",
+        "edge_id",
+        "edge_entered",
+    ]
+    assert frame["interval_begin"].tolist() == [0.0, 0.0, 60.0, 60.0]
+
+
+@pytest.mark.parametrize(
+    "read, xml",
+    [
+        (read_trips_dataframe, b"<routes/>"),
+        (read_trips_dataframe, b'<routes><vehicle id="0" depart="0"/></routes>'),
+        (read_edge_data_dataframe, b'<meandata><interval begin="0" end="60"/></meandata>'),
+    ],
+)
+def test_files_without_elements_are_rejected(read, xml: bytes):
+    with pytest.raises(ValueError, match="has no"):
+        read(io.BytesIO(xml))